@@ -1,5 +1,7 @@
 from commands_proto import *
+import packet_handler
 
+@packet_handler.transactions
 class I2C():
 	"""
 	Methods to interact with the I2C port. An instance of Labtools.Packet_Handler must be passed to the init function
@@ -55,11 +57,9 @@ class I2C():
 		freq			I2C frequency
 		================	============================================================================================
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_CONFIG)
 		#freq=1/((BRGVAL+1.0)/64e6+1.0/1e7)
 		BRGVAL=int( (1./freq-1./1e7)*64e6-1 )
-		self.H.__sendInt__(BRGVAL) 
+		self.H.__sendCommand__(I2C_HEADER,I2C_CONFIG,'H',BRGVAL)
 		self.H.__get_ack__()
 
 	def start(self,address,rw):
@@ -75,9 +75,7 @@ class I2C():
 							* 1 for reading.
 		================	============================================================================================
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_START)
-		self.H.__sendByte__(((address<<1)|rw)&0xFF) # address
+		self.H.__sendCommand__(I2C_HEADER,I2C_START,'B',((address<<1)|rw)&0xFF)	# address
 		return self.H.__get_ack__()>>4
 
 	def stop(self):
@@ -86,8 +84,7 @@ class I2C():
 		
 		:return: Nothing
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_STOP)
+		self.H.__sendCommand__(I2C_HEADER,I2C_STOP)
 		self.H.__get_ack__()
 
 	def wait(self):
@@ -96,8 +93,7 @@ class I2C():
 
 		:return: Nothing
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_WAIT)
+		self.H.__sendCommand__(I2C_HEADER,I2C_WAIT)
 		self.H.__get_ack__()
 
 	def send(self,data):
@@ -114,9 +110,7 @@ class I2C():
 
 		:return: Nothing
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_SEND)
-		self.H.__sendByte__(data)		 #data byte
+		self.H.__sendCommand__(I2C_HEADER,I2C_SEND,'B',data)	#data byte
 		return self.H.__get_ack__()>>4
 		
 	def send_burst(self,data):
@@ -134,9 +128,7 @@ class I2C():
 
 		:return: Nothing
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_SEND_BURST)
-		self.H.__sendByte__(data)		 #data byte
+		self.H.__sendCommand__(I2C_HEADER,I2C_SEND_BURST,'B',data)	#data byte
 		#No handshake. for the sake of speed. e.g. loading a frame buffer onto an I2C display such as ssd1306
 
 	def restart(self,address,rw):
@@ -153,9 +145,7 @@ class I2C():
 		================	============================================================================================
 
 		"""
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_RESTART)
-		self.H.__sendByte__(((address<<1)|rw)&0xFF) # address
+		self.H.__sendCommand__(I2C_HEADER,I2C_RESTART,'B',((address<<1)|rw)&0xFF)	# address
 		return self.H.__get_ack__()>>4
 
 	def read(self,length):
@@ -169,36 +159,27 @@ class I2C():
 		length				number of bytes to read from I2C bus
 		================	============================================================================================
 		"""
-		data=[]
-		for a in range(length-1):
-			self.H.__sendByte__(I2C_HEADER)
-			self.H.__sendByte__(I2C_READ_MORE)
-			data.append(self.H.__getByte__())
-			self.H.__get_ack__()
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_READ_END)
-		data.append(self.H.__getByte__())
-		self.H.__get_ack__()
-		return data
+		P = self.H.pipeline()
+		data = [P.command(I2C_HEADER,I2C_READ_MORE,reply='B') for a in range(length-1)]
+		data.append(P.command(I2C_HEADER,I2C_READ_END,reply='B'))
+		P.flush()
+		return [a.value for a in data]
 
 	def read_repeat(self):
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_READ_MORE)
+		self.H.__sendCommand__(I2C_HEADER,I2C_READ_MORE)
 		val=self.H.__getByte__()
 		self.H.__get_ack__()
 		return val
 
 	def read_end(self):
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_READ_END)
+		self.H.__sendCommand__(I2C_HEADER,I2C_READ_END)
 		val=self.H.__getByte__()
 		self.H.__get_ack__()
 		return val
 
 
 	def read_status(self):
-		self.H.__sendByte__(I2C_HEADER)
-		self.H.__sendByte__(I2C_STATUS)
+		self.H.__sendCommand__(I2C_HEADER,I2C_STATUS)
 		val=self.H.__getInt__()
 		self.H.__get_ack__()
 		return val
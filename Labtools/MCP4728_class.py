@@ -1,6 +1,8 @@
 from commands_proto import *
+import packet_handler
 import I2C_class
 
+@packet_handler.transactions
 class MCP4728:
 	defaultVDD =3300
 	RESET =6
@@ -36,11 +38,7 @@ class MCP4728:
 		self.I2C.send(v&0xFF)
 		self.I2C.stop()
 		'''
-		self.H.__sendByte__(DAC) #DAC write coming through.(MCP4922)
-		self.H.__sendByte__(SET_DAC)
-		self.H.__sendByte__(self.addr<<1)	#I2C address
-		self.H.__sendByte__(chan)		#DAC channel
-		self.H.__sendInt__((self.VREFS[chan] << 15) | (self.SWITCHEDOFF[chan] << 13) | (1 << 12) | v )
+		self.H.__sendCommand__(DAC,SET_DAC,'BBH',self.addr<<1,chan,(self.VREFS[chan] << 15) | (self.SWITCHEDOFF[chan] << 13) | (1 << 12) | v)	#DAC write coming through.(MCP4922)
 		#print chan,hex((self.VREFS[chan] << 15) | (self.SWITCHEDOFF[chan] << 13) | (1 << 12) | v )
 		self.H.__get_ack__()
 		R=self.VRANGES[chan]
@@ -1,5 +1,7 @@
 from commands_proto import *
+import packet_handler
 
+@packet_handler.transactions
 class NRF24L01():
 	#Commands
 	R_REG = 0x00
@@ -50,8 +52,7 @@ class NRF24L01():
 	routines for the NRFL01 radio
 	"""
 	def init(self):
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_SETUP)
+		self.H.__sendCommand__(NRFL01,NRF_SETUP)
 		self.H.__get_ack__()
 		time.sleep(0.15) #15 mS settling time
 		
@@ -59,29 +60,25 @@ class NRF24L01():
 		'''
 		Puts the radio into listening mode.
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_RXMODE)
+		self.H.__sendCommand__(NRFL01,NRF_RXMODE)
 		self.H.__get_ack__()
 		
 	def txmode(self):
 		'''
 		Puts the radio into transmit mode.
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_TXMODE)
+		self.H.__sendCommand__(NRFL01,NRF_TXMODE)
 		self.H.__get_ack__()
 		
 	def power_down(self):
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_POWERDOWN)
+		self.H.__sendCommand__(NRFL01,NRF_POWER_DOWN)
 		self.H.__get_ack__()
 		
 	def rxchar(self):
 		'''
 		Receives a 1 Byte payload
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_RXCHAR)
+		self.H.__sendCommand__(NRFL01,NRF_RXCHAR)
 		value = self.H.__getByte__()
 		self.H.__get_ack__()
 		return value
@@ -91,17 +88,14 @@ class NRF24L01():
 		Transmits a single character
 		'''
 	
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_TXCHAR)
-		self.H.__sendByte__(char)
+		self.H.__sendCommand__(NRFL01,NRF_TXCHAR,'B',char)
 		return self.H.__get_ack__()>>4
 		
 	def hasData(self):
 		'''
 		Check if the RX FIFO contains data
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_HASDATA)
+		self.H.__sendCommand__(NRFL01,NRF_HASDATA)
 		value = self.H.__getByte__()
 		self.H.__get_ack__()
 		return value
@@ -111,8 +105,7 @@ class NRF24L01():
 		Flushes the TX and RX FIFOs
 		'''
 
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_FLUSH)
+		self.H.__sendCommand__(NRFL01,NRF_FLUSH)
 		self.H.__get_ack__()
 
 	def write_register(self,address,value):
@@ -121,10 +114,7 @@ class NRF24L01():
 		address byte can either be located in the NRF24L01+ manual, or chosen
 		from some of the constants defined in this module.
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_WRITEREG)
-		self.H.__sendByte__(address)
-		self.H.__sendByte__(value)
+		self.H.__sendCommand__(NRFL01,NRF_WRITEREG,'BB',address,value)
 		self.H.__get_ack__()
 
 	def read_register(self,address):
@@ -132,9 +122,7 @@ class NRF24L01():
 		Read the value of any of the configuration registers on the radio module.
 		
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_READREG)
-		self.H.__sendByte__(address)
+		self.H.__sendCommand__(NRFL01,NRF_READREG,'B',address)
 		val=self.H.__getByte__()
 		self.H.__get_ack__()
 		return val
@@ -144,16 +132,13 @@ class NRF24L01():
 		Returns a byte representing the STATUS register on the radio.
 		Refer to NRF24L01+ documentation for further details
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_GETSTATUS)
+		self.H.__sendCommand__(NRFL01,NRF_GETSTATUS)
 		val=self.H.__getByte__()
 		self.H.__get_ack__()
 		return val
 
 	def write_command(self,cmd):
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_WRITECOMMAND)
-		self.H.__sendByte__(cmd)
+		self.H.__sendCommand__(NRFL01,NRF_WRITECOMMAND,'B',cmd)
 		self.H.__get_ack__()
 
 	def write_address(self,register,address):
@@ -164,11 +149,7 @@ class NRF24L01():
 		from P2 to P5, then RX_ADDR_P1 must be updated last.
 		Addresses from P1-P5 must share the first two bytes.
 		'''
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_WRITEADDRESS)
-		self.H.__sendByte__(register)
-		self.H.__sendByte__(address&0xFF);self.H.__sendByte__((address>>8)&0xFF);
-		self.H.__sendByte__((address>>16)&0xFF);
+		self.H.__sendCommand__(NRFL01,NRF_WRITEADDRESS,'BBBB',register,address&0xFF,(address>>8)&0xFF,(address>>16)&0xFF)
 		self.H.__get_ack__()
 
 	def init_shockburst_transmitter(self,**args):
@@ -289,21 +270,15 @@ class NRF24L01():
 		self.flush()
 
 	def read_payload(self,numbytes):
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_READPAYLOAD)
-		self.H.__sendByte__(numbytes)
+		self.H.__sendCommand__(NRFL01,NRF_READPAYLOAD,'B',numbytes)
 		data=self.H.fd.read(numbytes)
 		self.H.__get_ack__()
 		return [ord(a) for a in data]
 
 
 	def write_payload(self,data,verbose=False): 
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_WRITEPAYLOAD)
-		self.H.__sendByte__(len(data)|0x80)  #0x80 implies transmit immediately. Otherwise it will simply load the TX FIFO ( used by ACK_payload)
-		self.H.__sendByte__(self.TX_PAYLOAD)
-		for a in data:
-			self.H.__sendByte__(a)
+		#0x80 implies transmit immediately. Otherwise it will simply load the TX FIFO ( used by ACK_payload)
+		self.H.__sendCommand__(NRFL01,NRF_WRITEPAYLOAD,'BB%dB'%len(data),len(data)|0x80,self.TX_PAYLOAD,*data)
 		val=self.H.__get_ack__()>>4
 		if(verbose):
 			if val&0x2: print ' NRF radio not found. Connect one to the add-on port'
@@ -313,13 +288,8 @@ class NRF24L01():
 	
 
 	def transaction(self,data,timeout=100,verbose=True): 
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_TRANSACTION)
-		self.H.__sendByte__(len(data)) #total Data bytes coming through
-		self.H.__sendInt__(timeout) #timeout.  
-		
-		for a in data:
-			self.H.__sendByte__(a)
+		#total Data bytes coming through, timeout, data
+		self.H.__sendCommand__(NRFL01,NRF_TRANSACTION,'BH%dB'%len(data),len(data),timeout,*data)
 
 		bytes=self.H.__getByte__()
 		if bytes: data = self.H.fd.read(bytes)
@@ -346,9 +316,7 @@ class NRF24L01():
 			else:
 				self.write_register(self.RX_PW_P0,self.READ_PAYLOAD_SIZE)
 				print 'read payload size:',self.READ_PAYLOAD_SIZE
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_READPAYLOAD)
-		self.H.__sendByte__(numbytes)
+		self.H.__sendCommand__(NRFL01,NRF_READPAYLOAD,'B',numbytes)
 		data=self.H.fd.read(numbytes)
 		self.H.__get_ack__()
 		return [ord(a) for a in data]
@@ -364,12 +332,8 @@ class NRF24L01():
 			else:
 				self.write_register(self.RX_PW_P0,self.PAYLOAD_SIZE)
 				print 'tx payload size:',self.PAYLOAD_SIZE
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_WRITEPAYLOAD)
-		self.H.__sendByte__(len(data)|0x80)  #0x80 implies transmit immediately. Otherwise it will simply load the TX FIFO ( used by ACK_payload)
-		self.H.__sendByte__(self.TX_PAYLOAD)
-		for a in data:
-			self.H.__sendByte__(a)
+		#0x80 implies transmit immediately. Otherwise it will simply load the TX FIFO ( used by ACK_payload)
+		self.H.__sendCommand__(NRFL01,NRF_WRITEPAYLOAD,'BB%dB'%len(data),len(data)|0x80,self.TX_PAYLOAD,*data)
 		val=self.H.__get_ack__()>>4
 		if(verbose):
 			if val&0x1: print ' Node probably dead/out of range. It failed to acknowledge'
@@ -386,12 +350,7 @@ class NRF24L01():
 				data=data[:15]
 			else:
 				print 'ack payload size:',self.ACK_PAYLOAD_SIZE
-		self.H.__sendByte__(NRFL01)
-		self.H.__sendByte__(NRF_WRITEPAYLOAD)
-		self.H.__sendByte__(len(data))
-		self.H.__sendByte__(self.ACK_PAYLOAD|pipe)
-		for a in data:
-			self.H.__sendByte__(a)
+		self.H.__sendCommand__(NRFL01,NRF_WRITEPAYLOAD,'BB%dB'%len(data),len(data),self.ACK_PAYLOAD|pipe,*data)
 		return self.H.__get_ack__()>>4
 	
 	
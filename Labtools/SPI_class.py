@@ -1,5 +1,7 @@
 from commands_proto import *
+import packet_handler
 
+@packet_handler.transactions
 class SPI():
 	"""
 	Methods to interact with the SPI port. An instance of Packet_Handler must be passed to the init function
@@ -22,10 +24,8 @@ class SPI():
 		================	============================================================================================
 
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(SET_SPI_PARAMETERS)
 		#0Bhgfedcba - > <g>: modebit CKP,<f>: modebit CKE, <ed>:primary pre,<cba>:secondary pre
-		self.H.__sendByte__(secondary_prescaler|(primary_prescaler<<3)|(CKE<<5)|(CKP<<6)|(SMP<<7)) 
+		self.H.__sendCommand__(SPI_HEADER,SET_SPI_PARAMETERS,'B',secondary_prescaler|(primary_prescaler<<3)|(CKE<<5)|(CKP<<6)|(SMP<<7))
 		self.H.__get_ack__()
 
 	def start(self,channel):
@@ -42,9 +42,7 @@ class SPI():
 		================	============================================================================================
 		
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(START_SPI)
-		self.H.__sendByte__(channel)	#value byte
+		self.H.__sendCommand__(SPI_HEADER,START_SPI,'B',channel)	#value byte
 		#self.H.__get_ack__()
 		
 	def stop(self,channel):
@@ -58,9 +56,7 @@ class SPI():
 		channel				1-7 ->[PGA1 connected to CH1,PGA2,PGA3,PGA4,PGA5,external chip select 1,external chip select 2]
 		================	============================================================================================
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(STOP_SPI)
-		self.H.__sendByte__(channel)	#value byte
+		self.H.__sendCommand__(SPI_HEADER,STOP_SPI,'B',channel)	#value byte
 		#self.H.__get_ack__()
 
 	def send8(self,value):
@@ -75,9 +71,7 @@ class SPI():
 
 		:return: value returned by slave device
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(SEND_SPI8)
-		self.H.__sendByte__(value)	#value byte
+		self.H.__sendCommand__(SPI_HEADER,SEND_SPI8,'B',value)	#value byte
 		v=self.H.__getByte__()
 		self.H.__get_ack__()
 		return v
@@ -95,9 +89,7 @@ class SPI():
 		:return: value returned by slave device
 		:rtype: int
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(SEND_SPI16)
-		self.H.__sendInt__(value)	#value byte
+		self.H.__sendCommand__(SPI_HEADER,SEND_SPI16,'H',value)	#value byte
 		v=self.H.__getInt__()
 		self.H.__get_ack__()
 		return v
@@ -115,9 +107,7 @@ class SPI():
 
 		:return: Nothing
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(SEND_SPI8_BURST)
-		self.H.__sendByte__(value)	#value byte
+		self.H.__sendCommand__(SPI_HEADER,SEND_SPI8_BURST,'B',value)	#value byte
 
 	def send16_burst(self,value):
 		"""
@@ -132,7 +122,5 @@ class SPI():
 
 		:return: nothing
 		"""
-		self.H.__sendByte__(SPI_HEADER)
-		self.H.__sendByte__(SEND_SPI16_BURST)
-		self.H.__sendInt__(value)	#value byte
+		self.H.__sendCommand__(SPI_HEADER,SEND_SPI16_BURST,'H',value)	#value byte
 
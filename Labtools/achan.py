@@ -1,28 +1,226 @@
 import numpy as np
+import time
 TEN_BIT=10
 TWELVE_BIT=12
+SUMMED=16	#sum of 16 twelve bit conversions, as returned by GET_VOLTAGE_SUMMED
 
 gains=[1,2,4,5,8,10,16,32]
-calfacs={}
-try:			#Try and load data from a calibration file
-	from calib_data import calibs
-	for A in calibs.calibs:
-		calfacs[A] = [np.poly1d(B) for B in calibs.calibs[A]]
-except:			#Give up and use default calibration instead
-	print 'Loading default calibration values'
-	for n in range(4):
-		calfacs['CH'+str(n+1)]=[np.poly1d([ 0,-33/1023./gains[a],16.5/gains[a]]) for a in range(8)] #calibrations for all gains , inv channel
-	for n in ['CH5','CH6','CH7','CH8','CH9']:
-		calfacs[n] = [np.poly1d([0, 3.3/1023./gains[a], 0]) for a in range(8)]
-
-calfacs['5V'] = [np.poly1d([0, 2*3.3/1023./gains[a], 0]) for a in range(8)] 
-calfacs['PCS'] = [np.poly1d([0, 3.3/1023./gains[a], 0]) for a in range(8)]
-calfacs['9V'] = [np.poly1d([0, 33/1023./gains[a], 0]) for a in range(8)] 
-
-calfacs['IN1']=[np.poly1d([0, 3.3/1023., 0])] #1 gain. normal channels
-calfacs['SEN']=[np.poly1d([0, 3.3/1023., 0])] #1 gain. normal channels
-calfacs['TEMP']=[np.poly1d([0, 3.3/1023., 0])] #1 gain. normal channels
 
+class calibration_table(dict):
+	"""
+	Calibration polynomials for each channel, indexed by gain. These are built when a channel
+	is first looked up, so that importing this module stays cheap.
+	"""
+	calibs=None
+	def __setitem__(self,name,polynomials):
+		dict.__setitem__(self,name,polynomials)
+		luts.invalidate(name)
+
+	def __missing__(self,name):
+		if calibration_table.calibs is None:
+			try:			#Try and load data from a calibration file
+				from calib_data import calibs
+				calibration_table.calibs = calibs.calibs
+			except:			#Give up and use default calibration instead
+				print 'Loading default calibration values'
+				calibration_table.calibs = {}
+
+		if name in ['5V','PCS','9V','IN1','SEN','TEMP']:pass
+		elif name in calibration_table.calibs:
+			self[name] = [np.poly1d(B) for B in calibration_table.calibs[name]]
+			return self[name]
+
+		if name in ['CH1','CH2','CH3','CH4']:
+			self[name] = [np.poly1d([ 0,-33/1023./gains[a],16.5/gains[a]]) for a in range(8)] #calibrations for all gains , inv channel
+		elif name in ['CH5','CH6','CH7','CH8','CH9','PCS']:
+			self[name] = [np.poly1d([0, 3.3/1023./gains[a], 0]) for a in range(8)]
+		elif name=='5V':
+			self[name] = [np.poly1d([0, 2*3.3/1023./gains[a], 0]) for a in range(8)] 
+		elif name=='9V':
+			self[name] = [np.poly1d([0, 33/1023./gains[a], 0]) for a in range(8)] 
+		elif name in ['IN1','SEN','TEMP']:
+			self[name] = [np.poly1d([0, 3.3/1023., 0])] #1 gain. normal channels
+		else:
+			raise KeyError(name)
+		return self[name]
+
+calfacs=calibration_table()
+
+class lookup_tables(dict):
+	"""
+	Voltage for every possible raw code, keyed by (channel name, gain, resolution, reference factor).
+	Raw codes are converted with np.take instead of evaluating the calibration polynomial for each sample.
+	A table is built the first time its combination is used. Only the limit most recently used tables are kept,
+	since each reference factor has tables of its own.
+	A table is built again if the coefficients of its polynomial have changed, so that calibrations edited
+	in place (calfacs[name][gain] = polynomial) are picked up. Call :func:`invalidate` after changing them by other means.
+	"""
+	limit = 32
+	def __init__(self):
+		dict.__init__(self)
+		self.used = 0
+
+	def __getitem__(self,key):
+		name,gain,resolution,ref = key
+		coeffs = tuple(calfacs[name][gain].coeffs)
+		entry = self.get(key)	#[coefficients,table,last use]
+		self.used+=1
+		if entry is None or entry[0]!=coeffs:
+			if resolution==TWELVE_BIT: x = np.arange(4096)/4.
+			elif resolution==SUMMED: x = 1023*np.arange(16*4095+1)/16./4095
+			else: x = np.arange(1024)
+			entry = [coeffs,ref*calfacs[name][gain](x),self.used]
+			dict.__setitem__(self,key,entry)
+			if len(self)>self.limit:self.pop(min(self,key=lambda k:self.get(k,[0,0,0])[2]),None)	#the least recently used
+		entry[2] = self.used
+		return entry[1]
+
+	def invalidate(self,name=None):
+		"""
+		discards the tables of a channel, or all of them
+		"""
+		for key in [a for a in self.keys() if name is None or a[0]==name]:self.pop(key,None)
+
+luts=lookup_tables()
+
+def lookup_table(name,gain,resolution=TEN_BIT,ref=1.):
+	return luts[(name,gain,resolution,ref)]
+
+def fix_values(chans,codes,y=None):
+	'''
+	Converts a 2-D array of raw codes to voltages, one row per analog_channel in chans, using
+	their lookup tables. Equivalent to np.array([a.fix_value(b) for a,b in zip(chans,codes)])
+	The voltages are written to y if it is given
+	'''
+	if y is None:y = np.empty(codes.shape)
+	for a,row,out in zip(chans,codes,y):np.take(a.lookup_table(),row,out=out,mode='clip')
+	return y
+
+class trace_history(object):
+	"""
+	The last depth traces of a channel in a preallocated ring, along with their timestamps and acquisition settings.
+	The running average, exponential average and min/max envelopes are updated in place as each trace is added,
+	so displaying them costs no more than displaying a single trace. The arrays returned are overwritten by
+	the next trace, and should be copied if they are to be kept.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	depth			number of traces kept. default 16
+	alpha			weight of the latest trace in the exponential average. default 0.25
+	==============	============================================================================================
+
+	>>> I.achans[0].enable_history(depth=32)
+	>>> for a in range(32): x,y = I.capture1('CH1',1000,2)
+	>>> H = I.achans[0].history
+	>>> plot(x,H.average())
+	>>> low,high = H.envelope()
+
+	A trace with a different length or acquisition settings starts a new history, since
+	traces acquired differently cannot be combined.
+	"""
+	def __init__(self,depth=16,alpha=0.25):
+		self.depth = depth
+		self.alpha = alpha
+		self.settings = None
+		self.__allocate__(0)
+
+	def __allocate__(self,length):
+		self.length = length
+		self.ring = np.zeros((self.depth,length))
+		self.times = np.zeros(self.depth)
+		self.total = np.zeros(length)		#sum of the traces in the ring
+		self.mean = np.zeros(length)
+		self.ema = np.zeros(length)
+		self.low,self.high = np.zeros(length),np.zeros(length)					#envelope of the traces in the ring
+		self.persist_low,self.persist_high = np.zeros(length),np.zeros(length)	#envelope since the last reset
+		self.reset()
+
+	def reset(self):
+		"""
+		discards the traces held so far
+		"""
+		self.count = 0		#traces in the ring
+		self.position = 0	#slot for the next trace
+
+	def add(self,y,timestamp=None,**settings):
+		"""
+		adds a trace, and updates the averages and envelopes.
+
+		==============	============================================================================================
+		**Arguments**
+		==============	============================================================================================
+		y				voltage array
+		timestamp		time at which it was acquired. default: now
+		\*\*settings	acquisition settings, e.g. timebase=2,gain=1 . A change of settings resets the history
+		==============	============================================================================================
+		"""
+		if len(y)!=self.length:self.__allocate__(len(y))
+		elif settings!=self.settings:self.reset()
+		self.settings = settings
+		slot = self.position
+		full = self.count==self.depth
+		if full:	#the oldest trace is dropped. The envelope needs fixing wherever it was defined by that trace
+			old = self.ring[slot]
+			stale = np.flatnonzero((old<=self.low)|(old>=self.high))
+			self.total-=old
+		self.ring[slot] = y
+		self.times[slot] = time.time() if timestamp is None else timestamp
+		self.position = (slot+1)%self.depth
+		self.count = min(self.count+1,self.depth)
+		if self.count==1 and not full:
+			for a in [self.total,self.ema,self.low,self.high,self.persist_low,self.persist_high]:a[:] = y
+		else:
+			self.total+=y
+			self.ema+=self.alpha*(y-self.ema)
+			np.minimum(self.low,y,out=self.low)
+			np.maximum(self.high,y,out=self.high)
+			np.minimum(self.persist_low,y,out=self.persist_low)
+			np.maximum(self.persist_high,y,out=self.persist_high)
+		if full:
+			if len(stale):
+				self.low[stale] = self.ring[:,stale].min(axis=0)
+				self.high[stale] = self.ring[:,stale].max(axis=0)
+			if self.position==0:self.total[:] = self.ring.sum(axis=0)	#once per turn of the ring, so that rounding errors do not accumulate
+		np.multiply(self.total,1./self.count,out=self.mean)
+
+	def average(self):
+		"""
+		mean of the traces held
+		"""
+		return self.mean
+
+	def exponential(self):
+		"""
+		exponentially weighted average of all the traces added since the last reset
+		"""
+		return self.ema
+
+	def envelope(self):
+		"""
+		returns the minimum and maximum at each point over the traces held
+		"""
+		return self.low,self.high
+
+	def persistence(self):
+		"""
+		returns the minimum and maximum at each point over all the traces added since the last reset
+		"""
+		return self.persist_low,self.persist_high
+
+	def latest(self,n=0):
+		"""
+		returns the trace added n traces before the latest one
+		"""
+		if n>=self.count:raise IndexError('only %d traces held'%self.count)
+		return self.ring[(self.position-1-n)%self.depth]
+
+	def traces(self):
+		"""
+		returns copies of the traces held and their timestamps, oldest first
+		"""
+		order = (self.position-self.count+np.arange(self.count))%self.depth
+		return self.times[order],self.ring[order]
 
 class analog_channel:
 	def __init__(self,a):
@@ -37,12 +235,46 @@ class analog_channel:
 		self.yaxis=np.zeros(4000)
 		self.length=100
 		self.timebase = 1.
+		self.history = None
 
-	def fix_value(self,val):
+	def calibration(self):
+		'''
+		returns the calibration polynomial, and the factor which scales raw codes to its input
+		'''
+		if self.channel_names.index(self.name)>11: self.gain=0
+		return calfacs[self.name][self.gain],(0.25 if self.resolution==TWELVE_BIT else 1.)
+
+	def lookup_table(self):
+		'''
+		returns the voltages corresponding to each raw code. See :class:`lookup_tables`
+		'''
 		if self.channel_names.index(self.name)>11: self.gain=0
-		if self.resolution==TWELVE_BIT: 
-			return self.calibration_ref196*calfacs[self.name][self.gain](val/4.)
-		else: return self.calibration_ref196*calfacs[self.name][self.gain](val)
+		return luts[(self.name,self.gain,self.resolution,self.calibration_ref196)]
+
+	def fix_value(self,val):
+		if np.asarray(val).dtype.kind in 'iu':	#raw codes
+			return np.take(self.lookup_table(),val,mode='clip')
+		poly,scale = self.calibration()
+		if scale!=1: val = val*scale
+		return self.calibration_ref196*poly(val)
+
+	def set_yaxis(self,y):
+		'''
+		stores a newly fetched trace, and adds it to the history if one is kept
+		'''
+		self.yaxis = y
+		if self.history is not None:
+			self.history.add(y[:self.length],timebase=self.timebase,gain=self.gain,resolution=self.resolution,name=self.name)
+
+	def enable_history(self,depth=16,alpha=0.25):
+		'''
+		keeps the last depth traces. See :class:`trace_history`
+		'''
+		self.history = trace_history(depth,alpha)
+		return self.history
+
+	def disable_history(self):
+		self.history = None
 
 	def set_yval(self,pos,val):
 		self.yaxis[pos] = self.fix_value(val)
@@ -62,7 +294,7 @@ class analog_channel:
 			self.regenerate_xaxis()
 
 	def regenerate_xaxis(self):
-		for a in range(self.length): self.xaxis[a] = self.timebase*a
+		self.xaxis = self.timebase*np.arange(self.length)
 
 	def get_xaxis(self):
 		return self.xaxis[:self.length]
@@ -0,0 +1,197 @@
+'''
+Non-blocking front-end for interface.Interface
+
+Every AsyncInterface owns a worker thread which talks to its device. Calls return immediately with a
+Future, while the worker carries out the command. Waiting for a conversion puts the worker to sleep
+instead of spinning on oscilloscope_progress, so a single process can overlap device I/O with analysis,
+drive several devices at once, or serve a network front-end.
+
+>>> from Labtools import async_interface
+>>> A = async_interface.AsyncInterface()
+>>> trace = A.capture1('CH1',1000,2)		#returns right away
+>>> volts = A.get_average_voltage('CH5')	#queued behind the capture
+>>> x,y = trace.result()			#blocks until the capture has been fetched
+>>> print volts.result()
+
+Callbacks are invoked from the worker thread once a result is ready
+
+>>> A.get_freq('ID1').add_done_callback(lambda f: send_to_client(f.result()))
+
+Calls made through the same AsyncInterface are carried out in order. Do not use the wrapped
+Interface directly while the worker is busy.
+'''
+import threading,Queue,time,sys
+
+class Future(object):
+	"""
+	Result of a call queued in an :class:`AsyncInterface`
+	"""
+	def __init__(self):
+		self.__event = threading.Event()
+		self.__callbacks = []
+		self.__lock = threading.Lock()
+		self.value = None
+		self.error = None
+
+	def done(self):
+		return self.__event.is_set()
+
+	def result(self,timeout=None):
+		"""
+		waits until the call has completed, and returns its value. Exceptions raised by the call are re-raised here
+		"""
+		if not self.__event.wait(timeout):
+			raise RuntimeError('timed out waiting for result')
+		if self.error is not None: raise self.error[0],self.error[1],self.error[2]
+		return self.value
+
+	def exception(self,timeout=None):
+		if not self.__event.wait(timeout):
+			raise RuntimeError('timed out waiting for result')
+		return self.error[1] if self.error else None
+
+	def add_done_callback(self,fn):
+		"""
+		fn(future) is called when the result is ready. Immediately, if it already is.
+		"""
+		with self.__lock:
+			if not self.__event.is_set():
+				self.__callbacks.append(fn)
+				return
+		fn(self)
+
+	def set_result(self,value,error=None):
+		with self.__lock:
+			self.value = value
+			self.error = error
+			self.__event.set()
+			callbacks,self.__callbacks = self.__callbacks,[]
+		for fn in callbacks:
+			try: fn(self)
+			except Exception as e: print 'callback failed:',e
+
+def gather(*futures,**kwargs):
+	"""
+	waits for all the futures, and returns their results as a list
+	"""
+	return [a.result(kwargs.get('timeout',None)) for a in futures]
+
+def wait_any(futures,timeout=None):
+	"""
+	waits until at least one of the futures is done, and returns the list of completed futures
+	"""
+	event = threading.Event()
+	for a in futures: a.add_done_callback(lambda f:event.set())
+	event.wait(timeout)
+	return [a for a in futures if a.done()]
+
+
+class AsyncInterface(object):
+	"""
+	Runs the methods of an Interface on a worker thread, and returns Futures.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	I				an interface.Interface instance. One is created from \*\*kwargs if this is not specified
+	==============	============================================================================================
+
+	Any method of the wrapped Interface that is not overridden here is also available, and returns a Future.
+	"""
+	def __init__(self,I=None,**kwargs):
+		if I is None:
+			import interface
+			I = interface.Interface(**kwargs)
+		self.I = I
+		self.queue = Queue.Queue()
+		self.worker = threading.Thread(target=self.__run__)
+		self.worker.daemon = True
+		self.worker.start()
+
+	def __run__(self):
+		while True:
+			job = self.queue.get()
+			if job is None:break
+			future,fn,args,kwargs = job
+			try:
+				future.set_result(fn(*args,**kwargs))
+			except Exception:
+				future.set_result(None,sys.exc_info())
+
+	def submit(self,fn,*args,**kwargs):
+		"""
+		queues fn(\*args,\*\*kwargs) for the worker thread, and returns a :class:`Future`
+		"""
+		future = Future()
+		self.queue.put((future,fn,args,kwargs))
+		return future
+
+	def close(self):
+		"""
+		stops the worker once the queued calls have completed
+		"""
+		self.queue.put(None)
+		self.worker.join()
+
+	def __getattr__(self,name):
+		attr = getattr(self.I,name)
+		if not callable(attr):return attr
+		return lambda *args,**kwargs: self.submit(attr,*args,**kwargs)
+
+	def __wait_for_capture__(self):
+		"""
+		sleeps through the expected conversion time, and then polls the device.
+		See :func:`interface.Interface.wait_for_capture`
+		"""
+		self.I.wait_for_capture()
+
+	def __capture__(self,num,fetch,*args,**kwargs):
+		self.I.capture_traces(num,*args,**kwargs)
+		self.__wait_for_capture__()
+		x,y = self.I.fetch_traces(fetch)
+		return [(x,a) for a in y]
+
+	def capture1(self,ch,ns,tg):
+		"""
+		non-blocking :func:`interface.Interface.capture1`. The Future returns x,y
+		"""
+		return self.submit(lambda:self.__capture__(1,[1],ns,tg,ch)[0])
+
+	def capture2(self,ns,tg):
+		"""
+		non-blocking :func:`interface.Interface.capture2`. The Future returns x,y1,y2
+		"""
+		def fn():
+			(x,y1),(x,y2) = self.__capture__(2,[1,2],ns,tg)
+			return x,y1,y2
+		return self.submit(fn)
+
+	def capture4(self,ns,tg):
+		"""
+		non-blocking :func:`interface.Interface.capture4`. The Future returns x,y1,y2,y3,y4
+		"""
+		def fn():
+			(x,y1),(x,y2),(x,y3),(x,y4) = self.__capture__(4,[1,2,3,4],ns,tg)
+			return x,y1,y2,y3,y4
+		return self.submit(fn)
+
+	def capture_traces(self,num,samples,tg,channel_one_input='CH1',CH123SA=0,**kwargs):
+		"""
+		starts a capture, and waits (without spinning) until the conversion is complete.
+		The Future returns once the data is ready for :func:`fetch_trace`
+		"""
+		def fn():
+			self.I.capture_traces(num,samples,tg,channel_one_input,CH123SA,**kwargs)
+			self.__wait_for_capture__()
+		return self.submit(fn)
+
+	def fetch_LA_channels(self,delay=0):
+		"""
+		waits delay seconds on the worker thread, and fetches logic analyzer data.
+		The Future returns the list of digital channels
+		"""
+		def fn():
+			if delay:time.sleep(delay)
+			self.I.fetch_LA_channels()
+			return self.I.dchans
+		return self.submit(fn)
@@ -176,6 +176,36 @@ TCD1304_HEADER = 4
 PASSTHROUGHS = 15
 PASS_UART = 1
 
+#/*--------commands of each header, by name. Used to label them, e.g. by wire_stats------*/
+COMMAND_GROUPS = [
+	('FLASH',['READ_FLASH','WRITE_FLASH','WRITE_BULK_FLASH','READ_BULK_FLASH']),
+	('ADC',['CAPTURE_ONE','CAPTURE_TWO','CAPTURE_FOUR','CONFIGURE_TRIGGER','GET_CAPTURE_STATUS',
+		'GET_CAPTURE_CHANNEL','SET_PGA_GAIN','GET_VOLTAGE','GET_VOLTAGE_SUMMED','START_ADC_STREAMING',
+		'SELECT_PGA_CHANNEL','CAPTURE_12BIT']),
+	('SPI_HEADER',['START_SPI','SEND_SPI8','SEND_SPI16','STOP_SPI','SET_SPI_PARAMETERS','SEND_SPI8_BURST',
+		'SEND_SPI16_BURST']),
+	('I2C_HEADER',['I2C_START','I2C_SEND','I2C_STOP','I2C_RESTART','I2C_READ_END','I2C_READ_MORE','I2C_WAIT',
+		'I2C_SEND_BURST','I2C_CONFIG','I2C_STATUS']),
+	('UART_2',['SEND_CHAR','SEND_INT','SEND_ADDRESS','SET_BAUD','SET_MODE']),
+	('DAC',['SET_DAC','SET_PVS2','SET_PVS3','SET_PCS']),
+	('WAVEGEN',['SET_WG1','SET_WG2','SET_SQR1','SET_SQR2','SET_SQRS','TUNE_SINE_OSCILLATOR','SQR4',
+		'MAP_REFERENCE','SET_BOTH_WG','SET_WAVEFORM_TYPE','SELECT_FREQ_REGISTER','DELAY_GENERATOR']),
+	('DOUT',['SET_STATE']),
+	('DIN',['GET_STATE','GET_STATES']),
+	('TIMING',['GET_TIMING','GET_PULSE_TIME','GET_DUTY_CYCLE','START_ONE_CHAN_LA','START_TWO_CHAN_LA',
+		'START_FOUR_CHAN_LA','FETCH_DMA_DATA','FETCH_INT_DMA_DATA','FETCH_LONG_DMA_DATA','GET_LA_PROGRESS',
+		'GET_INITIAL_DIGITAL_STATES','TIMING_MEASUREMENTS','INTERVAL_MEASUREMENTS','CONFIGURE_COMPARATOR',
+		'START_ALTERNATE_ONE_CHAN_LA','START_THREE_CHAN_LA']),
+	('COMMON',['GET_CTMU_VOLTAGE','GET_CAPACITANCE','GET_FREQUENCY','GET_INDUCTANCE','GET_VERSION',
+		'RETRIEVE_BUFFER','GET_HIGH_FREQUENCY','CLEAR_BUFFER','SET_RGB','READ_PROGRAM_ADDRESS',
+		'WRITE_PROGRAM_ADDRESS','READ_DATA_ADDRESS','WRITE_DATA_ADDRESS','GET_CAP_RANGE','SET_ONBOARD_RGB']),
+	('NRFL01',['NRF_SETUP','NRF_RXMODE','NRF_TXMODE','NRF_POWER_DOWN','NRF_RXCHAR','NRF_TXCHAR','NRF_HASDATA',
+		'NRF_FLUSH','NRF_WRITEREG','NRF_READREG','NRF_GETSTATUS','NRF_WRITECOMMAND','NRF_WRITEPAYLOAD',
+		'NRF_READPAYLOAD','NRF_WRITEADDRESS','NRF_TRANSACTION']),
+	('NONSTANDARD_IO',['HX711_HEADER','HCSR04_HEADER','AM2302_HEADER','TCD1304_HEADER']),
+	('PASSTHROUGHS',['PASS_UART']),
+]
+
 #/*--------STOP STREAMING------*/
 STOP_STREAMING =253
 
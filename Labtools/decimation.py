@@ -0,0 +1,85 @@
+'''
+Peak preserving decimation of traces for display
+
+A trace of 10000 points drawn on a plot 800 pixels wide puts a dozen samples in each column of pixels.
+Drawing the smallest and the largest of them looks exactly the same, and costs a fraction of drawing all of them.
+Unlike taking every nth sample, a glitch which lasts a single sample remains visible.
+
+>>> x,y = minmax(x,y,800)		#at most 1600 points
+
+A :class:`Decimator` does this for a plot curve, and only does it again when the data or the visible range changes
+
+>>> D = Decimator(curve)
+>>> D.setData(x,y)			#instead of curve.setData(x,y)
+>>> plot.sigXRangeChanged.connect(lambda *args:D.set_view(plot.viewRange()[0],plot.width()))
+'''
+import numpy as np
+
+def minmax(x,y,width,xrange=None):
+	'''
+	reduces a trace to the minimum and maximum of each of width equal groups of samples, in the order
+	in which they occur. Only the samples within xrange=(start,stop) are kept, along with one on either side.
+	x must be in ascending order. Traces of 2*width samples or less are returned as they are
+	'''
+	if xrange is not None:
+		start = max(np.searchsorted(x,xrange[0])-1,0)
+		stop = np.searchsorted(x,xrange[1],side='right')+1
+		x,y = x[start:stop],y[start:stop]
+	n = len(y)
+	if n<=2*width:return x,y
+	per = -(-n//width)	#samples per group. The last group is padded with the last sample
+	rows = -(-n//per)
+	groups = np.empty(rows*per,dtype=y.dtype)
+	groups[:n] = y
+	groups[n:] = y[-1]
+	groups = groups.reshape(rows,per)
+	first = per*np.arange(rows)
+	low = first+groups.argmin(axis=1)
+	high = first+groups.argmax(axis=1)
+	index = np.empty(2*rows,dtype=int)
+	index[0::2] = np.minimum(low,high)
+	index[1::2] = np.maximum(low,high)
+	index = np.minimum(index,n-1)
+	return x[index],y[index]
+
+class Decimator(object):
+	'''
+	passes decimated copies of a trace to a plot curve. The full trace is kept, so that it can be
+	decimated again when the visible range or the width of the plot changes.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	curve			pyqtgraph PlotDataItem , or anything with setData(x,y) and clear()
+	width			number of groups to reduce traces to. usually the width of the plot in pixels. default 1000
+	==============	============================================================================================
+	'''
+	def __init__(self,curve,width=1000):
+		self.curve = curve
+		self.width = width
+		self.xrange = None
+		self.x = self.y = None
+		self.shown = None	#(xrange,width) of the data passed to the curve
+
+	def setData(self,x,y):
+		self.x,self.y = x,y
+		self.shown = None
+		self.refresh()
+
+	def clear(self):
+		self.x = self.y = None
+		self.shown = None
+		self.curve.clear()
+
+	def set_view(self,xrange,width=None):
+		'''
+		sets the visible range (start,stop) of the x axis, and the width in pixels, and decimates the trace again if they changed
+		'''
+		self.xrange = tuple(xrange) if xrange is not None else None
+		if width is not None:self.width = max(int(width),1)
+		self.refresh()
+
+	def refresh(self):
+		if self.x is None or self.shown==(self.xrange,self.width):return
+		self.curve.setData(*minmax(self.x,self.y,self.width,self.xrange))
+		self.shown = (self.xrange,self.width)
@@ -0,0 +1,275 @@
+'''
+Protocol decoders for logic analyzer captures
+
+The decoders work on the edges recorded by :func:`interface.Interface.fetch_LA_channels` , without
+resampling them to a grid. A line is described by its initial state and the times of its edges in uS.
+The level of a line at any set of times is found with a single searchsorted, and every bit of every frame
+is sampled at once.
+
+>>> I.start_four_channel_LA()
+>>> I.fetch_LA_channels()
+>>> frames = decoders.uart(I.dchans[0],baud=9600)
+>>> print frames['value'],frames['error']
+>>> frames = decoders.i2c(I.dchans[0],I.dchans[1])		#SCL, SDA
+>>> print frames[frames['address']]['value']>>1		#addresses
+
+Each decoder returns a structured array with one record per frame. All of them have start and end times(uS),
+and error , a combination of the flags FRAMING, PARITY, GLITCH and INCOMPLETE.
+Lines may also be given as (initial state, edge times) , for instance from a file saved with :func:`save`.
+The channels must have been captured with every edge recorded (EVERY_EDGE)
+'''
+import numpy as np
+
+FRAMING = 1		#stop bit missing
+PARITY = 2		#parity bit wrong
+GLITCH = 4		#start bit too short
+INCOMPLETE = 8	#frame cut short by the end of the capture, a STOP/START condition, a reset etc.
+
+UART_FRAME = np.dtype([('start','<f8'),('end','<f8'),('value','<i4'),('error','u1')])
+SPI_FRAME = np.dtype([('start','<f8'),('end','<f8'),('mosi','<i4'),('miso','<i4'),('error','u1')])
+I2C_FRAME = np.dtype([('start','<f8'),('end','<f8'),('value','<i4'),('ack','?'),('address','?'),('error','u1')])
+ONEWIRE_FRAME = np.dtype([('start','<f8'),('end','<f8'),('value','<i4'),('reset','?'),('error','u1')])
+
+PRESCALERS = [1.0/64,1.0/8,1.0,4.0]	#uS per timer count
+
+def edges(line):
+	'''
+	returns (initial state, edge times in uS) of a line. line is a digital_channel, or such a tuple
+	'''
+	if isinstance(line,tuple):
+		initial,times = line
+		return int(initial),np.asarray(times,dtype=float)
+	return int(line.initial_state),np.asarray(line.timestamps[:line.dlength],dtype=float)*PRESCALERS[line.prescaler]
+
+def from_samples(t,levels):
+	'''
+	converts a line sampled at times t into (initial state, edge times)
+	'''
+	levels = np.asarray(levels,dtype=int)
+	return int(levels[0]),np.asarray(t,dtype=float)[np.flatnonzero(np.diff(levels))+1]
+
+def level_at(line,t):
+	'''
+	levels (0/1) of a line at the times t
+	'''
+	initial,times = line
+	return initial^(np.searchsorted(times,t,side='right')&1)
+
+def save(filename,**lines):
+	'''
+	saves lines to filename(.npz) by name. save('bus.npz',SCL=I.dchans[0],SDA=I.dchans[1])
+	'''
+	data = {}
+	for name,line in lines.items():
+		initial,times = edges(line)
+		data[name] = np.concatenate(([initial],times))
+	np.savez(filename,**data)
+
+def load(filename):
+	'''
+	returns a dictionary of the lines saved by :func:`save`, as (initial state, edge times)
+	'''
+	data = np.load(filename)
+	return dict([(name,(int(data[name][0]),data[name][1:])) for name in data.files])
+
+def __transitions__(line,level):
+	'''
+	times of the edges of line which change it to level
+	'''
+	initial,times = line
+	new = initial^((np.arange(len(times))+1)&1)
+	return times[new==level]
+
+def __groups__(segment,size):
+	'''
+	splits consecutive items with the same segment number into groups of size.
+	returns the group number of each item, and its position within the group
+	'''
+	n = len(segment)
+	first = np.ones(n,dtype=bool)
+	first[1:] = segment[1:]!=segment[:-1]
+	begins = np.maximum.accumulate(np.where(first,np.arange(n),0))
+	index = np.arange(n)-begins
+	key = np.cumsum(first|(index%size==0))-1
+	return key,index%size
+
+def __assemble__(bits,key,position,size,msb_first,groups):
+	'''
+	combines the bits of each of groups groups into a value
+	'''
+	shift = size-1-position if msb_first else position
+	return np.bincount(key,weights=bits*(1<<shift),minlength=groups).astype(int)
+
+def uart(rx,baud,bits=8,parity=None,stop_bits=1,idle=1):
+	'''
+	decodes an asynchronous serial line
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	rx				line to decode. digital_channel, or (initial state,edge times)
+	baud			baud rate
+	bits			data bits per frame. default 8
+	parity			None, 'even' or 'odd'. default None
+	stop_bits		default 1
+	idle			level of the idle line. 1 , or 0 for inverted signals. default 1
+	==============	============================================================================================
+
+	:return: array of UART_FRAME
+	'''
+	rx = edges(rx)
+	T = 1e6/baud
+	p = 1 if parity else 0
+	starts = __transitions__(rx,1-idle)
+	#a frame begins at a start edge which comes after the middle of the stop bit of the previous frame
+	following = np.searchsorted(starts,starts+(1.5+bits+p)*T,side='right').tolist()
+	chosen,a = [],0
+	while a<len(starts):
+		chosen.append(a)
+		a = following[a]
+	s = starts[chosen]
+	offsets = (np.arange(bits+p+2)+0.5)*T	#middles of the start, data, parity and stop bits
+	levels = level_at(rx,s[:,None]+offsets[None,:])^(1-idle)
+	data = levels[:,1:bits+1]
+	frames = np.zeros(len(s),dtype=UART_FRAME)
+	frames['start'] = s
+	frames['end'] = s+(1+bits+p+stop_bits)*T
+	frames['value'] = np.dot(data,1<<np.arange(bits))
+	frames['error'] = np.where(levels[:,-1]==0,FRAMING,0)|np.where(levels[:,0]!=0,GLITCH,0)
+	if parity:
+		odd = (data.sum(axis=1)+levels[:,bits+1])&1
+		frames['error'] = frames['error']|np.where(odd!=(1 if parity=='odd' else 0),PARITY,0)
+	return frames
+
+def spi(clk,mosi,miso=None,cs=None,cpol=0,cpha=0,bits=8,msb_first=True,gap=None):
+	'''
+	decodes a synchronous serial bus
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	clk,mosi,miso	lines to decode. digital_channel, or (initial state,edge times). miso is optional
+	cs				active low chip select line. optional. Words start afresh whenever it goes low
+	cpol,cpha		SPI mode. default 0,0
+	bits			bits per word. default 8
+	msb_first		default True
+	gap				without cs, words start afresh after a pause of gap uS in the clock. default: 8 times the median clock period
+	==============	============================================================================================
+
+	:return: array of SPI_FRAME. Words with fewer bits are marked INCOMPLETE
+	'''
+	clk,mosi = edges(clk),edges(mosi)
+	sample = __transitions__(clk,1-cpol if cpha==0 else cpol)	#the leading edge for cpha=0 , trailing edge otherwise
+	if cs is not None:
+		cs = edges(cs)
+		sample = sample[level_at(cs,sample)==0]
+		segment = np.searchsorted(__transitions__(cs,0),sample,side='right')
+	else:
+		if gap is None:gap = 8*np.median(np.diff(sample)) if len(sample)>1 else 0
+		segment = np.concatenate(([0],np.cumsum(np.diff(sample)>gap)))
+	frames = np.zeros(0,dtype=SPI_FRAME)
+	if not len(sample):return frames
+	key,position = __groups__(segment,bits)
+	count = np.bincount(key)
+	frames = np.zeros(len(count),dtype=SPI_FRAME)
+	frames['mosi'] = __assemble__(level_at(mosi,sample),key,position,bits,msb_first,len(count))
+	if miso is not None:frames['miso'] = __assemble__(level_at(edges(miso),sample),key,position,bits,msb_first,len(count))
+	frames['start'] = sample[np.searchsorted(key,np.arange(len(count)))]
+	frames['end'] = sample[np.searchsorted(key,np.arange(len(count)),side='right')-1]
+	frames['error'] = np.where(count<bits,INCOMPLETE,0)
+	return frames
+
+def i2c(scl,sda):
+	'''
+	decodes an I2C bus. Each record is a byte, along with the acknowledge bit which follows it.
+	The first byte after each START(or repeated START) is marked as an address.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	scl,sda			lines to decode. digital_channel, or (initial state,edge times)
+	==============	============================================================================================
+
+	:return: array of I2C_FRAME
+	'''
+	scl,sda = edges(scl),edges(sda)
+	high = level_at(scl,sda[1])==1
+	new = sda[0]^((np.arange(len(sda[1]))+1)&1)
+	starts = sda[1][high&(new==0)]
+	stops = sda[1][high&(new==1)]
+	conditions = np.concatenate((starts,stops))
+	kind = np.concatenate((np.ones(len(starts),dtype=bool),np.zeros(len(stops),dtype=bool)))
+	order = np.argsort(conditions,kind='mergesort')
+	conditions,kind = conditions[order],kind[order]
+	rising = __transitions__(scl,1)
+	falling = __transitions__(scl,0)
+	falls = np.searchsorted(falling,rising,side='right')
+	falls = np.append(falling,np.inf)[falls]	#the end of each clock pulse. Still high at the end of the capture if there is none
+	segment = np.searchsorted(conditions,rising,side='right')
+	bit = (segment>0)&(np.searchsorted(conditions,falls)==segment)	#SDA did not change while the clock was high. Otherwise it is a START or STOP
+	rising,segment = rising[bit],segment[bit]
+	keep = kind[segment-1]	#clocked after a START, rather than a STOP
+	rising,segment = rising[keep],segment[keep]
+	frames = np.zeros(0,dtype=I2C_FRAME)
+	if not len(rising):return frames
+	key,position = __groups__(segment,9)
+	count = np.bincount(key)
+	bits = level_at(sda,rising)
+	data = position<8	#the 9th bit is the acknowledge
+	frames = np.zeros(len(count),dtype=I2C_FRAME)
+	first = np.searchsorted(key,np.arange(len(count)))
+	frames['value'] = __assemble__(bits[data],key[data],position[data],8,True,len(count))
+	frames['ack'] = np.bincount(key,weights=(position==8)&(bits==0),minlength=len(count))>0
+	frames['address'] = np.concatenate(([True],segment[first][1:]!=segment[first][:-1]))
+	frames['start'] = rising[first]
+	frames['end'] = rising[np.searchsorted(key,np.arange(len(count)),side='right')-1]
+	frames['error'] = np.where(count<9,INCOMPLETE,0)
+	return frames
+
+def onewire(line,threshold=15.,reset=480.):
+	'''
+	decodes a 1-wire bus from the widths of the low pulses. Pulses longer than reset uS are reset pulses,
+	and are reported as records with reset=True and value 1 if a device answered with a presence pulse.
+	Slots in which the line was low for less than threshold uS are 1s, and longer ones are 0s.
+	Bytes are sent LSB first.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	line			line to decode. digital_channel, or (initial state,edge times)
+	threshold		pulse width which separates 1s from 0s. default 15uS
+	reset			minimum width of a reset pulse. default 480uS , less a margin of 10%
+	==============	============================================================================================
+
+	:return: array of ONEWIRE_FRAME
+	'''
+	line = edges(line)
+	falls = __transitions__(line,0)
+	if line[0]==0:falls = np.concatenate(([0.],falls))
+	rises = __transitions__(line,1)
+	ends = rises[np.minimum(np.searchsorted(rises,falls,side='right'),len(rises)-1)] if len(rises) else falls
+	complete = ends>falls
+	falls,width = falls[complete],(ends-falls)[complete]
+	resets = width>=0.9*reset
+	presence = np.zeros(len(falls),dtype=bool)
+	presence[1:] = resets[:-1]&(falls[1:]-falls[:-1]-width[:-1]<60)&(width[1:]>=60)	#device pulls low within 60uS of the reset
+	slots = ~(resets|presence)
+	segment = np.cumsum(resets)
+	frames = np.zeros(0,dtype=ONEWIRE_FRAME)
+	if slots.any():
+		key,position = __groups__(segment[slots],8)
+		count = np.bincount(key)
+		t = falls[slots]
+		frames = np.zeros(len(count),dtype=ONEWIRE_FRAME)
+		frames['value'] = __assemble__(width[slots]<threshold,key,position,8,False,len(count))
+		frames['start'] = t[np.searchsorted(key,np.arange(len(count)))]
+		last = np.searchsorted(key,np.arange(len(count)),side='right')-1
+		frames['end'] = t[last]+width[slots][last]
+		frames['error'] = np.where(count<8,INCOMPLETE,0)
+	r = np.zeros(resets.sum(),dtype=ONEWIRE_FRAME)
+	r['start'] = falls[resets]
+	r['end'] = falls[resets]+width[resets]
+	r['reset'] = True
+	r['value'] = np.concatenate((presence[1:],[False]))[resets]
+	frames = np.concatenate((frames,r))
+	return frames[np.argsort(frames['start'],kind='mergesort')]
@@ -0,0 +1,110 @@
+'''
+Drive several devices at once
+
+A DevicePool opens every attached board, and gives each of them an
+:class:`Labtools.async_interface.AsyncInterface` worker. Calls made on the pool are carried out on all
+the devices in parallel, and return a single batch of results, keyed by (port, version string).
+
+>>> from Labtools import device_pool
+>>> P = device_pool.DevicePool()
+>>> print P.keys()
+[('/dev/ttyACM0', 'LTS-......'), ('/dev/ttyACM1', 'LTS-......')]
+>>> traces = P.capture1('CH1',1000,2)	#one capture per device, all running at the same time
+>>> for key,(x,y) in traces.items(): print key,y.max()
+>>> volts = P.get_average_voltage('CH5')
+
+Individual devices remain accessible via P[key], which returns the AsyncInterface for that board.
+'''
+import glob,collections,os
+import async_interface
+
+class DevicePool(object):
+	"""
+	Opens a set of devices, and runs calls on all of them in parallel.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	ports			list of serial port names, or transport objects (e.g. simulator.SimulatedDevice).
+					All the /dev/ttyACM* ports that respond with an LTS version string are opened if
+					this is not specified.
+	timeout			serial port read timeout
+	\*\*kwargs		passed on to each :class:`Labtools.async_interface.AsyncInterface`
+	==============	============================================================================================
+
+	Any Interface method called on the pool returns an OrderedDict of results, keyed by (port, version string).
+	If the call fails on a device, the exception is re-raised once the other devices have finished.
+	"""
+	def __init__(self,ports=None,timeout=1.0,**kwargs):
+		import interface,packet_handler
+		if ports is None:ports = self.scan()
+		self.devices = collections.OrderedDict()
+		for a in ports:
+			args = {'port':a} if isinstance(a,basestring) else {'transport':a}
+			try:
+				H = packet_handler.Handler(timeout,**args)	#Interface picks up this Handler, since it is keyed by the same port
+			except IOError:
+				print a,'is taken'
+				continue
+			if H.version_string[:3]!='LTS':
+				print 'no device found at',H.portname
+				H.close()
+				continue
+			I = interface.Interface(timeout,**args)
+			self.devices[(H.portname,H.version_string.strip())] = async_interface.AsyncInterface(I,**kwargs)
+
+	@staticmethod
+	def scan():
+		"""
+		returns the list of serial ports which may have a device connected to them
+		"""
+		return sorted([a for a in glob.glob('/dev/ttyACM*') if os.access(a,os.R_OK|os.W_OK)])
+
+	def keys(self):
+		return self.devices.keys()
+
+	def __len__(self):
+		return len(self.devices)
+
+	def __getitem__(self,key):
+		return self.devices[key]
+
+	def submit(self,fn,*args,**kwargs):
+		"""
+		queues fn(I,\*args,\*\*kwargs) on each device's worker, where I is the device's Interface.
+		Returns an OrderedDict of Futures
+		"""
+		return collections.OrderedDict([(key,A.submit(fn,A.I,*args,**kwargs)) for key,A in self.devices.items()])
+
+	def map(self,name,*args,**kwargs):
+		"""
+		calls the method called name on all the devices at once, and waits for them to finish.
+
+		:return: OrderedDict of results, keyed by (port, version string)
+		"""
+		futures = collections.OrderedDict([(key,getattr(A,name)(*args,**kwargs)) for key,A in self.devices.items()])
+		return self.gather(futures)
+
+	@staticmethod
+	def gather(futures):
+		"""
+		waits for an OrderedDict of Futures, and returns an OrderedDict of their results
+		"""
+		errors = [a for a in futures.values() if a.exception() is not None]
+		if errors:errors[0].result()
+		return collections.OrderedDict([(key,a.result()) for key,a in futures.items()])
+
+	def __getattr__(self,name):
+		if name.startswith('__'):raise AttributeError(name)
+		return lambda *args,**kwargs: self.map(name,*args,**kwargs)
+
+	def close(self):
+		"""
+		stops the workers, and closes all the devices
+		"""
+		import interface
+		for A in self.devices.values():
+			A.close()
+			A.I.H.close()
+			interface.Interface.forget(A.I)
+		self.devices.clear()
@@ -2,6 +2,23 @@ import numpy as np
 from commands_proto import *
 digital_channel_names=['ID1','ID2','ID3','ID4']
 
+def unwrap_timestamps(raw,period=65535):
+	'''
+	Converts timestamps read from a 16-bit timer into an increasing sequence, in linear time.
+	Unused entries (leading and trailing zeros) are removed first, as np.trim_zeros does.
+	A timestamp smaller than the one before it marks a rollover, and period is added to it and to all that follow.
+	A zero inside the sequence is only treated as a rollover once an earlier rollover has been found.
+	'''
+	nonzero = np.flatnonzero(raw)
+	if not len(nonzero):return np.zeros(0)
+	t = np.array(raw[nonzero[0]:nonzero[-1]+1],dtype=float)
+	rolled = t[1:]<t[:-1]
+	first = np.flatnonzero(rolled&(t[1:]!=0))
+	if not len(first):return t
+	rolled[:first[0]] = False
+	t[1:]+=period*np.cumsum(rolled)
+	return t
+
 
 class digital_channel:
 	def __init__(self,a):
@@ -22,6 +39,8 @@ class digital_channel:
 		self.maximum_time =0
 		self.initial_state_override = False
 		self.mode=EVERY_EDGE
+		self.emit_connect = False	#see generate_axes
+		self.connect = None
 
 	def set_params(self,**keys):
 		self.channel_number = keys.get('channel_number',self.channel_number)	
@@ -36,8 +55,17 @@ class digital_channel:
 		self.dlength = len(self.timestamps)
 		#print self.channel_number,self.dlength,len(self.timestamps),timestamps
 		
-	def generate_axes(self):
+	def generate_axes(self,connect=None):
+		"""
+		builds the step plot of the timestamps in xaxis and yaxis. Each edge becomes a vertical step for EVERY_EDGE,
+		and a pulse for the other modes. The arrays are sized to fit the data.
+
+		If connect (default: self.emit_connect) is True, self.connect is also set to an array for the connect
+		argument of pyqtgraph's setData , and the pulses are drawn as separate ticks over a single baseline.
+		This takes two points per edge instead of three.
+		"""
 		#print self.channel_number,self.dlength
+		if connect is None:connect = self.emit_connect
 		HIGH = (4-self.channel_number)*(3)
 		LOW = HIGH - 2.5
 		state = HIGH if self.initial_state else LOW
@@ -47,59 +75,38 @@ class digital_channel:
 		elif(self.prescaler==2): prescale = 1.0/1
 		elif(self.prescaler==3): prescale = 4.0/1
 
+		t = np.asarray(self.timestamps[:self.dlength],dtype=float)*prescale
+		n = len(t)
+		connection = None
 		if self.mode==DISABLED:
-			self.xaxis[0]=0; self.yaxis[0]=state
-			n=1
-			self.plot_length = n
+			x,y = np.zeros(1),np.array([state],dtype=float)
 
-		if self.mode==EVERY_EDGE:
-			self.xaxis[0]=0; self.yaxis[0]=state
-			n=1
-			for a in range(self.dlength):
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = state
-				state = LOW if state==HIGH else HIGH
-				n+=1
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = state
-				n+=1
-				#if(self.timestamps[a]*prescale > self.maximum_time):break
+		elif self.mode==EVERY_EDGE:
+			other = LOW if state==HIGH else HIGH
+			before = np.where(np.arange(n)%2,other,state)	#level before each edge
+			x = np.concatenate(([0],np.repeat(t,2)))
+			y = np.empty(2*n+1)
+			y[0] = state
+			y[1::2] = before
+			y[2::2] = state+other-before
 
-			self.plot_length = n
+		elif self.mode in [EVERY_FALLING_EDGE,EVERY_RISING_EDGE,EVERY_FOURTH_RISING_EDGE,EVERY_SIXTEENTH_RISING_EDGE]:
+			base,peak = (HIGH,LOW) if self.mode==EVERY_FALLING_EDGE else (LOW,HIGH)
+			if connect:	#baseline, followed by a tick for each edge
+				x = np.concatenate(([0,t[-1] if n else 0],np.repeat(t,2)))
+				y = np.tile(np.array([base,peak],dtype=float),n+1)
+				y[1] = base
+				connection = np.tile(np.array([1,0],dtype=np.int32),n+1)
+			else:
+				x = np.concatenate(([0],np.repeat(t,3)))
+				y = np.concatenate(([base],np.tile(np.array([base,peak,base],dtype=float),n)))
+		else:
+			return
 
-		elif self.mode==EVERY_FALLING_EDGE:
-			self.xaxis[0]=0; self.yaxis[0]=HIGH
-			n=1
-			for a in range(self.dlength):
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = HIGH
-				n+=1
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = LOW
-				n+=1
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = HIGH
-				n+=1
-				#if(self.timestamps[a]*prescale > self.maximum_time):break
-			state=HIGH
-			self.plot_length = n
-		
-		elif self.mode==EVERY_RISING_EDGE or self.mode==EVERY_FOURTH_RISING_EDGE or self.mode==EVERY_SIXTEENTH_RISING_EDGE:
-			self.xaxis[0]=0; self.yaxis[0]=LOW
-			n=1
-			for a in range(self.dlength):
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = LOW
-				n+=1
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = HIGH
-				n+=1
-				self.xaxis[n] = self.timestamps[a]*prescale
-				self.yaxis[n] = LOW
-				n+=1
-				#if(self.timestamps[a]*prescale > self.maximum_time):break
-			state = LOW
-			self.plot_length = n
+		self.xaxis,self.yaxis = x,y
+		self.plot_length = len(x)
+		if connect and connection is None:connection = np.ones(len(x),dtype=np.int32)
+		self.connect = connection
 
 	def get_xaxis(self):
 		return self.xaxis[:self.plot_length]
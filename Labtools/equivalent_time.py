@@ -0,0 +1,78 @@
+'''
+Equivalent-time sampling of repetitive signals
+
+A signal faster than the ADC can follow is still sampled correctly, a few points per period, if it repeats exactly.
+The captures of a repetitive signal start at random points of its cycle, because the sampling clock is not
+synchronised to it. The offset of each capture is measured from the phase of the fundamental in its samples,
+and the samples of all captures are folded onto a single period, which is filled in far more finely than the
+timegap of the captures.
+
+>>> x,y = I.capture_equivalent_time('CH1',1.2e6,count=20)	#a 1.2MHz signal, with 256 points per period
+>>> plot(x,y)
+
+The frequency of the signal must be known to within a fraction of a percent. For instance, from :func:`interface.Interface.get_freq`
+if it is also connected to ID1. It is refined from the samples.
+'''
+import numpy as np
+
+def fundamental(t,y,frequency):
+	'''
+	complex amplitude of the component of each row of y at frequency. t are the sample times in seconds
+	'''
+	return np.dot(y-y.mean(axis=-1)[...,None],np.exp(-2j*np.pi*frequency*t))
+
+def refine_frequency(t,y,frequency,passes=3,steps=41):
+	'''
+	returns the frequency close to the given one at which the rows of y have the most power.
+	Searches within two DFT bins of frequency, and narrows the search tenfold with each pass.
+	Frequencies which differ by a multiple of the sampling rate cannot be told apart, so frequency must already be
+	closer than half the sampling rate.
+	'''
+	width = 2./(t[-1]-t[0])
+	y = np.atleast_2d(y)
+	y = y-y.mean(axis=-1)[:,None]
+	for a in range(passes):
+		candidates = frequency+np.linspace(-width,width,steps)
+		power = np.abs(np.dot(y,np.exp(-2j*np.pi*np.outer(t,candidates))))**2
+		frequency = candidates[np.argmax(power.sum(axis=0))]
+		width/=10.
+	return frequency
+
+def interleave(t,y,frequency,bins=256,periods=1,reference=0,refine=True):
+	'''
+	folds a set of captures of a repetitive signal onto one period.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	t				sample times of a capture, in seconds from its start
+	y				voltages. 2-D (capture,sample) or 3-D (capture,channel,sample)
+	frequency		frequency of the signal (Hz)
+	bins			points per period in the result. default 256
+	periods			number of periods to return. default 1
+	reference		channel whose phase is used to align the captures. default 0
+	refine			improve the frequency with :func:`refine_frequency`. default True
+	==============	============================================================================================
+
+	:return: time array (uS), voltage array with one row per channel (1-D for 2-D y).
+		Time 0 is the start of the first capture. Bins which received no samples are interpolated.
+	'''
+	t = np.asarray(t,dtype=float)
+	y3 = y if y.ndim==3 else y[:,None]
+	count,channels = y3.shape[:2]
+	if refine:frequency = refine_frequency(t,y3[:,reference],frequency)
+	a = fundamental(t,y3[:,reference],frequency)
+	offset = np.angle(a*np.conj(a[0]))/(2*np.pi*frequency)	#seconds by which each capture lags the first
+	phase = ((t[None,:]+offset[:,None])*frequency)%1.
+	index = np.rint(phase*bins).astype(int)%bins	#bin k is centred on phase k/bins
+	index = (index[:,None,:]+bins*np.arange(channels)[None,:,None]).ravel()	#a separate set of bins for each channel
+	counts = np.bincount(index,minlength=bins*channels).reshape(channels,bins)
+	sums = np.bincount(index,weights=y3.ravel(),minlength=bins*channels).reshape(channels,bins)
+	filled = counts>0
+	centres = np.arange(bins)
+	composite = np.empty((channels,bins))
+	for c in range(channels):
+		composite[c] = np.interp(centres,centres[filled[c]],sums[c][filled[c]]/counts[c][filled[c]],period=bins)
+	x = 1e6*np.arange(bins*periods)/(bins*frequency)
+	composite = np.tile(composite,periods)
+	return x,composite if y.ndim==3 else composite[0]
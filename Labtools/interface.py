@@ -1,13 +1,16 @@
 import os
 os.environ['QT_API'] = 'pyqt'
-import sip
-sip.setapi("QString", 2)
-sip.setapi("QVariant", 2)
+try:	#The GUIs need v2 of these APIs, and it has to be set before PyQt4 is imported
+	import sip
+	sip.setapi("QString", 2)
+	sip.setapi("QVariant", 2)
+except ImportError:	#headless. I2C_class etc. are also imported only when used.
+	pass
 
 from commands_proto import *
 
 import packet_handler
-import I2C_class,SPI_class,NRF24L01_class,MCP4728_class
+from wait_scheduler import WaitScheduler
 
 from achan import *
 from digital_channel import *
@@ -18,13 +21,22 @@ import sys
 import numpy as np
 import math
 
-class Singleton(type):
-    _instances = {}
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
+Singleton = packet_handler.Singleton
 
+class subsystem(object):
+	"""
+	Creates a sub-instance such as Interface.I2C the first time it is accessed, and stores it in the instance
+	"""
+	def __init__(self,fn):
+		self.fn = fn
+		self.__doc__ = fn.__doc__
+
+	def __get__(self,obj,cls):
+		if obj is None:return self
+		value = obj.__dict__[self.fn.__name__] = self.fn(obj)
+		return value
+
+@packet_handler.transactions
 class Interface(object):
 	"""
 	**Communications library.**
@@ -41,12 +53,20 @@ class Interface(object):
 	+==========+=================================================================+
 	|timeout   | serial port read timeout. default = 1s                          |
 	+----------+-----------------------------------------------------------------+
+	|port      | serial port to use. Ports /dev/ttyACM0-9 are scanned otherwise  |
+	+----------+-----------------------------------------------------------------+
+	|devnum    | pick the n'th free device found while scanning. default = 1     |
+	+----------+-----------------------------------------------------------------+
 
 	>>> from Labtools import interface
 	>>> I = interface.Interface(2.0)
 	>>> print I
 	<interface.Interface instance at 0xb6c0cac>
 
+	There is one instance per device. Interface() without a port or devnum returns the device
+	opened first, and a second board can be opened with Interface(devnum=2) .
+	:mod:`Labtools.device_pool` drives all the attached boards in parallel.
+
 
 	Once you have instantiated this class,  its various methods will allow access to all the features built
 	into the device.
@@ -68,7 +88,7 @@ class Interface(object):
 		self.error_count=0
 		self.channels_in_buffer=0
 		self.digital_channels_in_buffer=0
-		self.data_splitting = kwargs.get('data_splitting',2500)
+		self.data_splitting = kwargs.get('data_splitting',2500)	#initial chunk size for bulk transfers. Adjusted automatically. See packet_handler.ChunkTuner
 
 		self.digital_channel_names=['ID1','ID2','ID3','ID4','LMETER','CH4']
 		self.dchans=[digital_channel(a) for a in range(4)]
@@ -86,11 +106,28 @@ class Interface(object):
 		self.gain_values=[1,2,4,5,8,10,16,32]
 		self.sensor_multiplex_channel=0
 		self.sensor_multiplex_gain=0
-		self.buff=np.zeros(4000)
+		self.raw_buffer=bytearray(4*self.MAX_SAMPLES)			#preallocated receive buffer for bulk transfers
+		self.buff=np.frombuffer(self.raw_buffer,dtype=np.dtype('<u2'))	#little-endian 16-bit view of raw_buffer. shares memory
+		self.capture_wait=WaitScheduler()	#predicts when captures started by capture_traces will be complete
+		self.samples_acquired=0		#progress of the running capture, as of the last call to fetch_partial_traces
+		self.samples_fetched=0
+		self.capture_done=False
 
 		#--------------------------Initialize communication handler, and subclasses-----------------
 		self.H = packet_handler.Handler(**kwargs)
-		self.I2C = I2C_class.I2C(self.H)
+		self.H.chunks.size = self.data_splitting
+		self.DDS_MAX_FREQ = 0xFFFFFFFL-1	#28 bit resolution
+		self.DDS_CLOCK = 8e6			# MHz clock
+		with self.H.pipeline() as P:	#start-up configuration goes out in a single exchange
+			self.map_reference_clock(4,'wavegen',pipeline=P)
+			#print self.DDS_CLOCK
+
+			for a in ['CH1','CH2','CH3','CH4','CH5']: self.set_gain(a,0,P)
+		time.sleep(0.01)
+
+	#Sub-instances are created on first use
+	@subsystem
+	def I2C(self):
 		"""
 		Sub-Instance I2C of the Interface library contains methods to access devices
 		connected to the I2C port.
@@ -102,8 +139,11 @@ class Interface(object):
 		
 		.. seealso::  :py:meth:`~I2C_class.I2C` for complete documentation
 		"""
-		
-		self.SPI = SPI_class.SPI(self.H)
+		import I2C_class
+		return I2C_class.I2C(self.H)
+
+	@subsystem
+	def SPI(self):
 		"""
 		Sub-Instance SPI of the Interface library contains methods to access devices
 		connected to the SPI port.
@@ -117,10 +157,21 @@ class Interface(object):
 		
 		.. seealso:: :py:meth:`~SPI_class.SPI` for complete documentation
 		"""
-		
-		self.DAC = MCP4728_class.MCP4728(self.H,3.3,0)
-		
-		self.NRF = NRF24L01_class.NRF24L01(self.H)
+		import SPI_class
+		return SPI_class.SPI(self.H)
+
+	@subsystem
+	def DAC(self):
+		"""
+		Sub-Instance DAC of the Interface library controls the MCP4728 DAC that drives PV1-PV4
+
+		.. seealso:: :py:meth:`~MCP4728_class.MCP4728` for complete documentation
+		"""
+		import MCP4728_class
+		return MCP4728_class.MCP4728(self.H,3.3,0)
+
+	@subsystem
+	def NRF(self):
 		"""
 		Sub-Instance NRF of the Interface library contains methods to access wireless sensor nodes
 		via an NRF24L01+ module connnected to the SPI port
@@ -139,14 +190,8 @@ class Interface(object):
 		
 		.. seealso:: :py:meth:`~NRF24L01_class.NRF24L01` for complete documentation
 		"""
-
-		self.DDS_MAX_FREQ = 0xFFFFFFFL-1	#28 bit resolution
-		self.DDS_CLOCK = 8e6			# MHz clock
-		self.map_reference_clock(4,'wavegen')
-		#print self.DDS_CLOCK
-
-		for a in ['CH1','CH2','CH3','CH4','CH5']: self.set_gain(a,0)
-		time.sleep(0.01)
+		import NRF24L01_class
+		return NRF24L01_class.NRF24L01(self.H)
 
 
 	
@@ -210,9 +255,7 @@ class Interface(object):
 		
 		"""
 		self.capture_traces(1,ns,tg,ch)
-		time.sleep(1e-6*self.samples*self.timebase+.01)
-		while not self.oscilloscope_progress()[0]:
-			pass
+		self.wait_for_capture()
 		return self.fetch_trace(1)
 
 	def capture2(self,ns,tg):
@@ -248,12 +291,9 @@ class Interface(object):
 		
 		"""
 		self.capture_traces(2,ns,tg)
-		time.sleep(1e-6*self.samples*self.timebase+.01)
-		while not self.oscilloscope_progress()[0]:
-			pass
-		x,y=self.fetch_trace(1)
-		x,y2=self.fetch_trace(2)
-		return x,y,y2		
+		self.wait_for_capture()
+		x,y=self.fetch_traces()
+		return x,y[0],y[1]
 
 	def capture4(self,ns,tg):
 		"""
@@ -289,14 +329,9 @@ class Interface(object):
 		
 		"""
 		self.capture_traces(4,ns,tg)
-		time.sleep(1e-6*self.samples*self.timebase+.01)
-		while not self.oscilloscope_progress()[0]:
-			pass
-		x,y=self.fetch_trace(1)
-		x,y2=self.fetch_trace(2)
-		x,y3=self.fetch_trace(3)
-		x,y4=self.fetch_trace(4)
-		return x,y,y2,y3,y4		
+		self.wait_for_capture()
+		x,y=self.fetch_traces()
+		return x,y[0],y[1],y[2],y[3]
 
 	def capture_traces(self,num,samples,tg,channel_one_input='CH1',CH123SA=0,**kwargs):
 		"""
@@ -361,7 +396,6 @@ class Interface(object):
 		"""
 		triggerornot=0x80 if kwargs.get('trigger',True) else 0
 		self.timebase=tg
-		self.H.__sendByte__(ADC)
 		if channel_one_input in self.analog_gains:
 			self.achans[0].gain = self.analog_gains[channel_one_input]
 		elif channel_one_input in self.sensor_list:
@@ -378,8 +412,7 @@ class Interface(object):
 
 			self.achans[0].set_params(channel=channel_one_input,length=samples,timebase=self.timebase,resolution=TEN_BIT)
 
-			self.H.__sendByte__(CAPTURE_ONE)			#read 1 channel
-			self.H.__sendByte__(CHOSA|triggerornot)		#channelk number
+			command,chosa = CAPTURE_ONE,CHOSA|triggerornot			#read 1 channel
 
 		elif(num==2):
 			if(self.timebase<1.25):self.timebase=1.25
@@ -388,8 +421,7 @@ class Interface(object):
 			self.achans[0].set_params(channel=channel_one_input,length=samples,timebase=self.timebase,resolution=TEN_BIT)
 			self.achans[1].set_params(channel='CH2',length=samples,timebase=self.timebase,resolution=TEN_BIT)
 			
-			self.H.__sendByte__(CAPTURE_TWO)			#ccapture 2 channels
-			self.H.__sendByte__(CHOSA|triggerornot)				#channel 0 number
+			command,chosa = CAPTURE_TWO,CHOSA|triggerornot			#ccapture 2 channels
 
 
 		elif(num==3 or num==4):
@@ -399,14 +431,130 @@ class Interface(object):
 			for a in range(1,4):
 				self.achans[a].set_params(channel=['NONE','CH2','CH3','CH4'][a],length=samples,timebase=self.timebase,resolution=TEN_BIT)
 			
-			self.H.__sendByte__(CAPTURE_FOUR)			#read 4 channels
-			self.H.__sendByte__(CHOSA|(CH123SA<<4)|triggerornot)		#channel number
+			command,chosa = CAPTURE_FOUR,CHOSA|(CH123SA<<4)|triggerornot			#read 4 channels
 
 		self.samples=samples
-		self.H.__sendInt__(samples)			#number of samples to read
-		self.H.__sendInt__(int(self.timebase*8))		#Timegap between samples.  8MHz timer clock
-		self.H.__get_ack__()
 		self.channels_in_buffer=num
+		#channel number, number of samples to read, Timegap between samples.  8MHz timer clock
+		self.capture_command=(ADC,command,'BHH',chosa,samples,int(self.timebase*8))
+		self.__rearm__()
+
+	def __rearm__(self):
+		'''
+		starts another capture with the settings of the previous call to :func:`capture_traces` or :func:`capture_highres_traces`
+		'''
+		self.H.__sendCommand__(*self.capture_command)
+		self.H.__get_ack__()
+		self.__capture_started__()
+
+	def __capture_started__(self):
+		self.capture_wait.start(1e-6*self.samples*self.timebase,(self.capture_command[3]&0x80)!=0)
+		self.samples_acquired,self.samples_fetched,self.capture_done=0,0,False
+
+	def capture_batch(self,count,num,samples,tg,channel_one_input='CH1',**kwargs):
+		"""
+		Makes count captures in a row with the same settings, and returns all of them in a single array.
+		The device is configured once. The command which starts each capture is sent in the same write as the requests which fetch
+		the previous one, and the previous one is calibrated while the next is acquired. Much faster than calling :func:`capture_traces` ,
+		:func:`wait_for_capture` and :func:`fetch_traces` in a loop, and the voltages are identical.
+
+		===================	============================================================================================
+		**Arguments** 
+		===================	============================================================================================
+		count				number of captures
+		num					Channels to acquire. 1/2/4
+		samples				points to store per channel. See :func:`capture_traces`
+		tg					Timegap between two successive samples (in uSec)
+		channel_one_input	map channel 1 to 'CH1' ... 'CH9'
+		\*\*kwargs        
+		
+		* trigger			Whether or not to trigger each capture. default True
+		* out				preallocated float array of shape (count,num,samples) to fill. Reused between calls, it avoids an allocation
+		* timeout			seconds to wait for each capture. default: indefinitely
+		===================	============================================================================================
+
+		:return: time array, voltage array of shape (count,num,samples), and a structured array with one record per capture.
+			Its fields are 'started' , the time the capture was started(host clock), and 'completed' , the time it was
+			found to be complete. The delay before the trigger is the difference, less samples*tg
+
+		>>> x,y,info = I.capture_batch(500,2,1000,2)
+		>>> plot(x,y[:,0].mean(axis=0))			#average of 500 captures of channel 1
+		>>> print np.diff(info['started']).mean()	#seconds per capture
+
+		The last capture is also stored in achans[n].yaxis , as :func:`fetch_traces` does.
+		Raises packet_handler.CommunicationError if a capture could not be fetched
+		"""
+		self.capture_traces(num,samples,tg,channel_one_input,trigger=kwargs.get('trigger',True))
+		info = np.zeros(count,dtype=[('started','<f8'),('completed','<f8')])
+		info['started'][0] = time.time()
+		num,samples = self.channels_in_buffer,self.samples
+		y = kwargs.get('out',None)
+		if y is None:y = np.empty((count,num,samples))
+		chans = self.achans[:num]
+		codes = self.buff[:num*samples].reshape(num,samples)
+		a,failures = 0,0
+		while a<count:
+			if not self.wait_for_capture(kwargs.get('timeout',None)):
+				raise packet_handler.CommunicationError('capture %d of %d did not complete'%(a+1,count))
+			info['completed'][a] = time.time()
+			chunks = []
+			with self.H.pipeline(max_pending=None) as P:	#the next capture is started right behind the requests for this one, in the same write
+				for row in range(num):
+					for offset in range(0,samples,self.H.chunks.size):
+						n = min(self.H.chunks.size,samples-offset)
+						chunks.append((row,offset,n,P.command(ADC,GET_CAPTURE_CHANNEL,'BHH',row,n,offset,reply='%dH'%n)))
+				armed = P.command(*self.capture_command) if a+1<count else None
+			self.H.__accountChunks__([(n,reply) for row,offset,n,reply in chunks],P.elapsed)
+			if any([reply.value is None for row,offset,n,reply in chunks]) or (armed is not None and armed.ack is None):
+				failures+=1
+				if failures>3:raise packet_handler.CommunicationError('capture %d of %d could not be fetched'%(a+1,count))
+				print 'communication error. capturing again'	#the samples may already have been overwritten by the next capture
+				self.H.__drain__()
+				self.__rearm__()
+				info['started'][a] = time.time()
+				continue
+			for row,offset,n,reply in chunks:
+				values = np.atleast_1d(reply.value)
+				codes[row,offset:offset+len(values)] = values
+			if armed is not None:
+				self.__capture_started__()
+				info['started'][a+1] = time.time()
+			fix_values(chans,codes,y[a])	#while the next capture is acquired
+			a+=1
+		for a,row in zip(chans,y[-1]):a.set_yaxis(row)
+		return chans[0].get_xaxis(),y,info
+
+	def capture_equivalent_time(self,channel_one_input,frequency,count=20,num=1,samples=1000,tg=1,**kwargs):
+		"""
+		Captures a repetitive signal with a far finer time resolution than the ADC timegap allows, by
+		interleaving the samples of several triggered captures. Their offsets are measured from the phase
+		of the signal in each of them. See :mod:`equivalent_time`
+
+		===================	============================================================================================
+		**Arguments** 
+		===================	============================================================================================
+		channel_one_input	channel 'CH1' ... 'CH9'. Captures with num=2 or 4 also include CH2... and are aligned using this channel
+		frequency			frequency of the signal in Hz. It is refined from the samples, but must be correct to a fraction of a percent
+		count				number of captures. default 20
+		num					Channels to acquire. 1/2/4 . default 1
+		samples				points to store per channel and capture. default 1000
+		tg					timegap of the captures (in uSec). default 1
+		\*\*kwargs        
+		
+		* bins				points per period in the result. default 256
+		* periods			periods to return. default 1
+		* trigger			Whether or not to trigger each capture. The trigger level set by :func:`configure_trigger` aligns the result with the signal. default True
+		===================	============================================================================================
+
+		:return: time array (uS) , voltage array for num=1 , or 2-D array with one row per channel
+
+		>>> x,y = I.capture_equivalent_time('CH1',2.5e6,bins=100,periods=3)	#a 2.5MHz signal sampled every 1.6nS
+		>>> plot(x,y)
+		"""
+		from equivalent_time import interleave
+		x,y,info = self.capture_batch(count,num,samples,tg,channel_one_input,trigger=kwargs.get('trigger',True))
+		x,y = interleave(1e-6*self.timebase*np.arange(self.samples),y,frequency,kwargs.get('bins',256),kwargs.get('periods',1))
+		return x,(y[0] if num==1 else y)
 
 	def capture_highres_traces(self,channel,samples,tg,**kwargs):
 		"""
@@ -433,7 +581,6 @@ class Interface(object):
 		"""
 		triggerornot=0x80 if kwargs.get('trigger',True) else 0
 		self.timebase=tg
-		self.H.__sendByte__(ADC)
 		if channel in self.analog_gains:
 			self.achans[0].gain = self.analog_gains[channel]
 		elif channel in self.sensor_list:
@@ -445,14 +592,11 @@ class Interface(object):
 		if(samples>self.MAX_SAMPLES):samples=self.MAX_SAMPLES
 		self.achans[0].set_params(channel=channel,length=samples,timebase=self.timebase,resolution=TWELVE_BIT)
 
-		self.H.__sendByte__(CAPTURE_12BIT)			#read 1 channel
-		self.H.__sendByte__(CHOSA|triggerornot)		#channelk number
-
 		self.samples=samples
-		self.H.__sendInt__(samples)			#number of samples to read
-		self.H.__sendInt__(int(self.timebase*8))		#Timegap between samples.  8MHz timer clock
-		self.H.__get_ack__()
 		self.channels_in_buffer=1
+		#channel number, number of samples to read, Timegap between samples.  8MHz timer clock
+		self.capture_command=(ADC,CAPTURE_12BIT,'BHH',CHOSA|triggerornot,samples,int(self.timebase*8))
+		self.__rearm__()
 
 
 	
@@ -475,6 +619,40 @@ class Interface(object):
 		"""
 		self.__fetch_channel__(channel_number)
 		return self.achans[channel_number-1].get_xaxis(),self.achans[channel_number-1].get_yaxis()
+
+	def fetch_traces(self,channels=None):
+		"""
+		fetches several channels captured by :func:`capture_traces` in a single pipelined transfer, and
+		calibrates them together. Faster than calling :func:`fetch_trace` for each channel.
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		channels		list of channel numbers(1/2/3/4). default: all the channels that were captured
+		==============	============================================================================================
+
+		:return: time array, 2-D voltage array with one row per channel
+
+		>>> I.capture_traces(4,800,1.75)
+		>>> I.wait_for_capture()
+		>>> x,y = I.fetch_traces()
+		>>> plot(x,y[0]);plot(x,y[3])
+
+		The rows are also stored in achans[n].yaxis , as :func:`fetch_trace` does.
+		Raises packet_handler.CommunicationError if the data could not be fetched
+		"""
+		if channels is None:channels = range(1,self.channels_in_buffer+1)
+		if max(channels)>self.channels_in_buffer:
+			print 'Channel unavailable'
+			return None
+		samples = self.achans[channels[0]-1].length
+		view = memoryview(self.raw_buffer)
+		request = lambda channel:lambda offset,n:(ADC,GET_CAPTURE_CHANNEL,'BHH',channel-1,n,offset)
+		self.H.__fetchChunked__([(view[2*samples*row:2*samples*(row+1)],samples,request(a)) for row,a in enumerate(channels)])
+		chans = [self.achans[a-1] for a in channels]
+		y = fix_values(chans,self.buff[:len(channels)*samples].reshape(len(channels),samples))
+		for a,row in zip(chans,y):a.set_yaxis(row)
+		return chans[0].get_xaxis(),y
 		
 	def oscilloscope_progress(self):
 		"""
@@ -497,8 +675,7 @@ class Interface(object):
 		conversion_done=0
 		samples=0
 		try:
-			self.H.__sendByte__(ADC)
-			self.H.__sendByte__(GET_CAPTURE_STATUS)
+			self.H.__sendCommand__(ADC,GET_CAPTURE_STATUS)
 			conversion_done = self.H.__getByte__()
 			samples = self.H.__getInt__()
 			self.H.__get_ack__()
@@ -507,6 +684,88 @@ class Interface(object):
 			#sys.exit(1)
 		return conversion_done,samples
 
+	def wait_for_capture(self,timeout=None):
+		"""
+		Waits until the capture started by :func:`capture_traces` or :func:`capture_highres_traces` is complete.
+		Sleeps until the predicted completion time, and then polls :func:`oscilloscope_progress` with
+		increasing intervals. The prediction improves with each capture. See :class:`wait_scheduler.WaitScheduler`
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		timeout			give up after this many seconds. default: wait indefinitely
+		==============	============================================================================================
+
+		:return: True if the capture is complete
+		"""
+		return self.capture_wait.wait(lambda:self.oscilloscope_progress()[0],timeout)
+
+	def fetch_partial_traces(self):
+		"""
+		Fetches the samples converted since the previous call, while a capture started by :func:`capture_traces`
+		or :func:`capture_highres_traces` is still running. Each call is a single exchange with the device which
+		retrieves the samples reported as acquired by the previous call, along with the current progress.
+		Partial traces can be displayed while slow captures are in progress, and only the last few samples remain
+		to be fetched once the capture is complete.
+
+		:return: conversion done(bool), number of samples fetched so far
+
+		The samples fetched so far are in achans[n].get_yaxis()[:fetched] . Done is True only once all of them have been fetched.
+
+		>>> I.capture_traces(1,3200,1000)	#takes 3.2 seconds
+		>>> while True:
+		... 	done,n = I.fetch_partial_traces()
+		... 	plot(I.achans[0].get_xaxis()[:n],I.achans[0].get_yaxis()[:n])
+		... 	if done:break
+		... 	time.sleep(0.1)
+
+		.. seealso:: :func:`progressive_fetch`
+		"""
+		if self.samples_fetched==0:
+			for a in range(self.channels_in_buffer):self.achans[a].yaxis = np.zeros(self.samples)
+		while True:
+			start,stop = self.samples_fetched,self.samples_acquired
+			chunks=[]
+			with self.H.pipeline(max_pending=None) as P:	#no window, so that the status request goes out with the fetches
+				for n in range(self.channels_in_buffer):
+					for a in range(start,stop,self.H.chunks.size):
+						count = min(self.H.chunks.size,stop-a)
+						chunks.append((n,a,count,P.command(ADC,GET_CAPTURE_CHANNEL,'BHH',n,count,a,reply='%dH'%count)))
+				status = None if self.capture_done else P.command(ADC,GET_CAPTURE_STATUS,reply='BH')
+			self.H.__accountChunks__([(count,reply) for n,a,count,reply in chunks],P.elapsed)
+			for n,a,count,reply in chunks:
+				if reply.value is None:
+					print 'communication error. will retry'
+					return False,self.samples_fetched
+				values = np.atleast_1d(reply.value)
+				self.achans[n].yaxis[a:a+len(values)] = self.achans[n].fix_value(values)
+			self.samples_fetched = stop
+			if status is not None and status.value is not None:
+				self.capture_done = status.value[0]!=0
+				self.samples_acquired = max(self.samples_acquired,min(status.value[1],self.samples))
+				if self.capture_done:self.samples_acquired = self.samples
+			if not self.capture_done or self.samples_fetched>=self.samples_acquired:break	#the rest is fetched right away once done
+		done = self.capture_done and self.samples_fetched>=self.samples
+		if done and start<self.samples:	#completed by this call
+			for a in range(self.channels_in_buffer):self.achans[a].set_yaxis(self.achans[a].yaxis)
+		return done,self.samples_fetched
+
+	def progressive_fetch(self,interval=0.1):
+		"""
+		generator which fetches a running capture piece by piece using :func:`fetch_partial_traces`.
+		Yields the number of samples fetched so far every interval seconds, and stops once the
+		capture has been fetched entirely.
+
+		>>> I.capture_traces(2,2000,500)
+		>>> for n in I.progressive_fetch():
+		... 	curve.setData(I.achans[0].get_xaxis()[:n],I.achans[0].get_yaxis()[:n])
+		"""
+		while True:
+			done,fetched = self.fetch_partial_traces()
+			yield fetched
+			if done:return
+			time.sleep(interval)
+
 	def __fetch_channel__(self,channel_number):
 		"""
 		Fetches a section of data from any channel and stores it in the relevant instance of achan()
@@ -517,33 +776,15 @@ class Interface(object):
 		channel_number	channel number (1,2,3,4)
 		==============	============================================================================================
 		
-		:return: True if successful
+		:return: True if successful. Raises packet_handler.CommunicationError if the data could not be fetched
 		"""
 		samples = self.achans[channel_number-1].length
 		if(channel_number>self.channels_in_buffer):
 			print 'Channel unavailable'
 			return False
-		data=''
-		for i in range(int(samples/self.data_splitting)):
-			self.H.__sendByte__(ADC)
-			self.H.__sendByte__(GET_CAPTURE_CHANNEL)
-			self.H.__sendByte__(channel_number-1)	#starts with A0 on PIC
-			self.H.__sendInt__(self.data_splitting)
-			self.H.__sendInt__(i*self.data_splitting)
-			data+= self.H.fd.read(self.data_splitting*2)		#reading int by int sometimes causes a communication error. this works better.
-			self.H.__get_ack__()
-
-		if samples%self.data_splitting:
-			self.H.__sendByte__(ADC)
-			self.H.__sendByte__(GET_CAPTURE_CHANNEL)
-			self.H.__sendByte__(channel_number-1)	#starts with A0 on PIC
-			self.H.__sendInt__(samples%self.data_splitting)
-			self.H.__sendInt__(samples-samples%self.data_splitting)
-			data += self.H.fd.read(2*(samples%self.data_splitting)) 		#reading int by int sometimes causes a communication error. this works better.
-			self.H.__get_ack__()
-
-		for a in range(samples): self.buff[a] = ord(data[a*2])|(ord(data[a*2+1])<<8)
-		self.achans[channel_number-1].yaxis = self.achans[channel_number-1].fix_value(self.buff[:samples])
+		request = lambda offset,n:(ADC,GET_CAPTURE_CHANNEL,'BHH',channel_number-1,n,offset)	#starts with A0 on PIC
+		self.H.__fetchChunked__([(memoryview(self.raw_buffer),samples,request)])
+		self.achans[channel_number-1].set_yaxis(self.achans[channel_number-1].fix_value(self.buff[:samples]))
 		return True
 
 
@@ -564,15 +805,13 @@ class Interface(object):
 		if(channel_number>self.channels_in_buffer):
 			print 'Channel unavailable'
 			return False
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(GET_CAPTURE_CHANNEL)
-		self.H.__sendByte__(channel_number-1)	#starts with A0 on PIC
-		self.H.__sendInt__(samples)
-		self.H.__sendInt__(offset)
-		data = self.H.fd.read(samples*2)		#reading int by int sometimes causes a communication error. this works better.
+		self.H.__sendCommand__(ADC,GET_CAPTURE_CHANNEL,'BHH',channel_number-1,samples,offset)	#starts with A0 on PIC
+		received = self.H.__readInto__(memoryview(self.raw_buffer)[:samples*2])		#reading int by int sometimes causes a communication error. this works better.
 		self.H.__get_ack__()
-		for a in range(samples): self.buff[a] = ord(data[a*2])|(ord(data[a*2+1])<<8)
-		self.achans[channel_number-1].yaxis = self.achans[channel_number-1].fix_value(self.buff[:samples])
+		if received<2*samples:
+			print 'communication error. received %d of %d bytes'%(received,2*samples)
+			return False
+		self.achans[channel_number-1].set_yaxis(self.achans[channel_number-1].fix_value(self.buff[:samples]))
 		return True
 
 
@@ -604,21 +843,18 @@ class Interface(object):
 			:func:`capture_traces` , adc_example_
 
 		"""
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(CONFIGURE_TRIGGER)
-		self.H.__sendByte__(1<<chan)	#Trigger channel
 		if resolution==12:level = 2047-31*level*self.gain_values[self.achans[chan].gain]*4.
 		else:level = 511-31*level*self.gain_values[self.achans[chan].gain]
 
 		if level>(2**resolution - 1):level=(2**resolution - 1)
 		elif level<0:level=0
 
-		self.H.__sendInt__(int(level))	#Trigger
+		self.H.__sendCommand__(ADC,CONFIGURE_TRIGGER,'BH',1<<chan,int(level))	#Trigger channel, Trigger level
 		self.H.__get_ack__()
 
 	
 				
-	def set_gain(self,channel,gain):
+	def set_gain(self,channel,gain,pipeline=None):
 		"""
 		set the gain of the selected PGA
 		
@@ -627,6 +863,7 @@ class Interface(object):
 		==============	============================================================================================
 		channel			'CH1','CH2','CH3','CH4','CH5','CH6','CH7','CH8','CH9','5V','PCS','9V'
 		gain			(0-7) -> (1x,2x,4x,5x,8x,10x,16x,32x)
+		pipeline		queue the command in this packet_handler.Pipeline instead of sending it right away
 		==============	============================================================================================
 		
 		.. note::
@@ -651,15 +888,15 @@ class Interface(object):
 		else:
 			print "No such channel ",channel,"\n try 'CH1','CH2','CH3','CH4','CH5','CH6','CH7','CH8','CH9','5V','PCS','9V' "
 			return
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(SET_PGA_GAIN)
-		self.H.__sendByte__(chan) #send the channel
-		self.H.__sendByte__(gain) #send the gain
+		if pipeline is not None:
+			pipeline.command(ADC,SET_PGA_GAIN,'BB',chan,gain)
+			return self.gain_values[gain]
+		self.H.__sendCommand__(ADC,SET_PGA_GAIN,'BB',chan,gain)	#send the channel
 		self.H.__get_ack__()
 		return self.gain_values[gain]
 
 
-	def __selectSensorChannel__(self,channel):
+	def __selectSensorChannel__(self,channel,pipeline=None):
 		"""
 		set the channel of PGA 5
 		
@@ -667,16 +904,18 @@ class Interface(object):
 		**Arguments** 
 		==============	============================================================================================
 		channel			channel number. 0-7
+		pipeline		queue the command in this packet_handler.Pipeline instead of sending it right away
 		==============	============================================================================================
 		
 		"""
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(SELECT_PGA_CHANNEL)
-		self.H.__sendByte__(channel) #send the channel
+		if pipeline is not None:
+			pipeline.command(ADC,SELECT_PGA_CHANNEL,'B',channel)
+			return
+		self.H.__sendCommand__(ADC,SELECT_PGA_CHANNEL,'B',channel)	#send the channel
 		self.H.__get_ack__()
 
 	
-	def __calcCHOSA__(self,name):
+	def __calcCHOSA__(self,name,pipeline=None):
 		bipolars=['CH2','CH3','CH4','CH1']
 		unipolars=['CH5','CH6','CH7','CH8','CH9','5V','PCS','9V']
 		others=['IN1','CHIP SELECT. IGNORE','SEN','TEMP']
@@ -686,7 +925,7 @@ class Interface(object):
 		elif name in unipolars:
 			if self.sensor_multiplex_channel != unipolars.index(name):
 				self.sensor_multiplex_channel = unipolars.index(name)
-				self.__selectSensorChannel__(self.sensor_multiplex_channel)
+				self.__selectSensorChannel__(self.sensor_multiplex_channel,pipeline)
 			return 4
 		elif name in others:
 			return others.index(name)+5
@@ -714,24 +953,52 @@ class Interface(object):
 		
 		"""
 		chosa = self.__calcCHOSA__(channel_name)
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(GET_VOLTAGE_SUMMED)
-		if(sleep):self.H.__sendByte__(chosa|0x80)#sleep mode conversion. buggy
-		else:self.H.__sendByte__(chosa) 
+		if(sleep):self.H.__sendCommand__(ADC,GET_VOLTAGE_SUMMED,'B',chosa|0x80)#sleep mode conversion. buggy
+		else:self.H.__sendCommand__(ADC,GET_VOLTAGE_SUMMED,'B',chosa) 
 		self.H.__getInt__() #2 leading Zeroes sent by UART. sleep or no sleep :p
 		V_sum = self.H.__getInt__()
 		#V = [self.H.__getInt__() for a in range(16)]
 		#print V
 		self.H.__get_ack__()
-		V=1023*V_sum/16./4095
+		return self.__summedToVoltage__(channel_name,V_sum) #sum(V)/16.0	#
+
+	def get_average_voltages(self,channel_names,sleep=0):
+		""" 
+		Return the voltages on a list of channels. The readings are pipelined, so scanning several
+		channels costs about as much as a single call to :func:`get_average_voltage`
+		
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		channel_names	list of channels. 'CH1','CH2','CH3','CH4','CH5','CH6','CH7','CH8','CH9','5V','PCS','9V','IN1','SEN','TEMP'
+		sleep			read voltage in CPU sleep mode. not particularly useful. Also, Buggy.
+		==============	============================================================================================
+
+		>>> print I.get_average_voltages(['CH1','CH2','CH5','9V'])
+		[1.002, 0.0, 3.29, 8.97]
+		
+		"""
+		P = self.H.pipeline()
+		replies = []
+		for channel_name in channel_names:
+			chosa = self.__calcCHOSA__(channel_name,P)
+			replies.append(P.command(ADC,GET_VOLTAGE_SUMMED,'B',chosa|0x80 if sleep else chosa,reply='HH'))	#2 leading zeroes , sum
+		P.flush()
+		return [self.__summedToVoltage__(a,b.value[1]) if b.value else None for a,b in zip(channel_names,replies)]
+
+	def __channelGain__(self,channel_name):
+		"""
+		returns the gain setting in effect for a channel
+		"""
 		if channel_name in self.analog_gains:
-			gain = self.analog_gains[channel_name]
+			return self.analog_gains[channel_name]
 		elif channel_name in self.sensor_list:
-			gain = self.sensor_gain
-		else:
-			gain = 0
-		V=calfacs[channel_name][gain](V)
-		return  V #sum(V)/16.0	#
+			return self.sensor_gain
+		return 0
+
+	def __summedToVoltage__(self,channel_name,V_sum):
+		gain = self.__channelGain__(channel_name)
+		return float(np.take(lookup_table(channel_name,gain,SUMMED),V_sum,mode='clip'))	#same as calfacs[channel_name][gain](1023*V_sum/16./4095)
 
 
 
@@ -748,10 +1015,8 @@ class Interface(object):
 
 		"""
 		chosa = self.__calcCHOSA__(channel_name)
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(GET_VOLTAGE_SUMMED)
-		if(sleep):self.H.__sendByte__(chosa|0x80)#sleep mode conversion. buggy
-		else:self.H.__sendByte__(chosa) 
+		if(sleep):self.H.__sendCommand__(ADC,GET_VOLTAGE_SUMMED,'B',chosa|0x80)#sleep mode conversion. buggy
+		else:self.H.__sendCommand__(ADC,GET_VOLTAGE_SUMMED,'B',chosa) 
 		self.H.__getInt__() #2 Zeroes sent by UART. sleep or no sleep :p
 		V_sum = self.H.__getInt__()
 		self.H.__get_ack__()
@@ -799,9 +1064,7 @@ class Interface(object):
 
 		:return: frequency
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(GET_HIGH_FREQUENCY)
-		self.H.__sendByte__(self.__calcDChan__(pin))
+		self.H.__sendCommand__(COMMON,GET_HIGH_FREQUENCY,'B',self.__calcDChan__(pin))
 		scale=self.H.__getByte__()
 		val = self.H.__getLong__()
 		self.H.__get_ack__()
@@ -843,11 +1106,8 @@ class Interface(object):
 			(0.00025,6.25e-05)			
 		
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(GET_FREQUENCY)
 		timeout_msb = int((timeout*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
-		self.H.__sendByte__(self.__calcDChan__(channel))
+		self.H.__sendCommand__(COMMON,GET_FREQUENCY,'HB',timeout_msb,self.__calcDChan__(channel))
 		tmt = self.H.__getInt__()
 		x=[self.H.__getLong__() for a in range(2)]
 		self.H.__get_ack__()
@@ -874,12 +1134,8 @@ class Interface(object):
 		.. seealso:: timing_example_
 
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(GET_TIMING)
 		timeout_msb = int((timeout*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
-		self.H.__sendByte__( EVERY_RISING_EDGE<<2 | 2)
-		self.H.__sendByte__(self.__calcDChan__(channel))
+		self.H.__sendCommand__(TIMING,GET_TIMING,'HBB',timeout_msb,EVERY_RISING_EDGE<<2 | 2,self.__calcDChan__(channel))
 		tmt = self.H.__getInt__()
 		x=[self.H.__getLong__() for a in range(2)]
 		self.H.__get_ack__()
@@ -906,12 +1162,8 @@ class Interface(object):
 		.. seealso:: timing_example_
 
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(GET_TIMING)
 		timeout_msb = int((timeout*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
-		self.H.__sendByte__( EVERY_FALLING_EDGE<<2 | 2)
-		self.H.__sendByte__(self.__calcDChan__(channel))
+		self.H.__sendCommand__(TIMING,GET_TIMING,'HBB',timeout_msb,EVERY_FALLING_EDGE<<2 | 2,self.__calcDChan__(channel))
 
 		tmt = self.H.__getInt__()
 		x=[self.H.__getLong__() for a in range(2)]
@@ -942,11 +1194,8 @@ class Interface(object):
 		.. seealso:: timing_example_
 
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(GET_DUTY_CYCLE)
 		timeout_msb = int((timeout*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
-		self.H.__sendByte__(self.__calcDChan__(channel)|(self.__calcDChan__(channel)<<4))
+		self.H.__sendCommand__(TIMING,GET_DUTY_CYCLE,'HB',timeout_msb,self.__calcDChan__(channel)|(self.__calcDChan__(channel)<<4))
 		x=[self.H.__getLong__() for a in range(3)]
 		edge = self.H.__getByte__()
 		tmt = self.H.__getInt__()
@@ -998,13 +1247,7 @@ class Interface(object):
 		
 		
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(INTERVAL_MEASUREMENTS)
 		timeout_msb = int((timeout*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
-
-		self.H.__sendByte__(self.__calcDChan__(channel1)|(self.__calcDChan__(channel2)<<4))
-
 		params =0
 		if edge1  == 'rising': params |= 3 
 		elif edge1=='falling': params |= 2
@@ -1014,7 +1257,7 @@ class Interface(object):
 		elif edge2=='falling': params |= 2<<3
 		else: 		       params |= 4<<3
 
-		self.H.__sendByte__(params)
+		self.H.__sendCommand__(TIMING,INTERVAL_MEASUREMENTS,'HBB',timeout_msb,self.__calcDChan__(channel1)|(self.__calcDChan__(channel2)<<4),params)
 		A=self.H.__getLong__()
 		B=self.H.__getLong__()
 		tmt = self.H.__getInt__()
@@ -1043,11 +1286,8 @@ class Interface(object):
 		.. seealso:: timing_example_
 
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(GET_PULSE_TIME)
 		timeout_msb = int((timeout*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
-		self.H.__sendByte__(self.__calcDChan__(channel))
+		self.H.__sendCommand__(TIMING,GET_PULSE_TIME,'HB',timeout_msb,self.__calcDChan__(channel))
 		x=[self.H.__getLong__() for a in range(2)]
 		tmt = self.H.__getInt__()
 		self.H.__get_ack__()
@@ -1073,9 +1313,7 @@ class Interface(object):
 
 		"""
 		print (1./4)*(3.3) + (level/32.)*(3.3) 
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(CONFIGURE_COMPARATOR)
-		self.H.__sendByte__(level | (digital_filter<<4) )
+		self.H.__sendCommand__(TIMING,CONFIGURE_COMPARATOR,'B',level | (digital_filter<<4))
 		self.H.__get_ack__()
 
 	def LA_capture1(self,waiting_time=0.1,trigger=0):
@@ -1138,10 +1376,6 @@ class Interface(object):
 		:return: Nothing
 
 		"""
-		self.clear_buffer(0,self.MAX_SAMPLES/2);
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(START_ONE_CHAN_LA)
-		self.H.__sendInt__(self.MAX_SAMPLES/4)
 		#trigchan bit functions
 			# b0 - trigger or not
 			# b1 - trigger edge . 1 => rising. 0 => falling
@@ -1161,8 +1395,7 @@ class Interface(object):
 		trigger |= 2 if args.get('edge',0)=='rising' else 0
 		trigger |= self.__calcDChan__(channel)<<2
 
-		self.H.__sendByte__(trigger)
-		self.H.__get_ack__()
+		self.__start_LA__(self.MAX_SAMPLES/2,(TIMING,START_ONE_CHAN_LA,'HB',self.MAX_SAMPLES/4,trigger))
 		self.digital_channels_in_buffer = 1
 		for a in self.dchans:
 			a.prescaler = 0
@@ -1201,19 +1434,12 @@ class Interface(object):
 		:return: Nothing
 
 		"""
-		self.clear_buffer(0,self.MAX_SAMPLES/2);
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(START_ALTERNATE_ONE_CHAN_LA)
-		self.H.__sendInt__(self.MAX_SAMPLES/4)
 		aqchan = self.__calcDChan__(args.get('channel','ID1'))
 		aqmode = args.get('channel_mode',1)
 		trchan = self.__calcDChan__(args.get('trigger_channel','ID1'))
 		trmode = args.get('trigger_mode',3)
 		
-		self.H.__sendByte__((aqchan<<4)|aqmode)
-		self.H.__sendByte__((trchan<<4)|trmode)
-		
-		self.H.__get_ack__()
+		self.__start_LA__(self.MAX_SAMPLES/2,(TIMING,START_ALTERNATE_ONE_CHAN_LA,'HBB',self.MAX_SAMPLES/4,(aqchan<<4)|aqmode,(trchan<<4)|trmode))
 		self.digital_channels_in_buffer = 1
 
 		a = self.dchans[0]
@@ -1246,13 +1472,7 @@ class Interface(object):
 			"fetch_long_data_from_dma(points to read,2)" to get data acquired from channel 2
 			The read data can be accessed from self.dchans[0 or 1]
 		"""
-		self.clear_buffer(0,self.MAX_SAMPLES);
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(START_TWO_CHAN_LA)
-		self.H.__sendInt__(self.MAX_SAMPLES/4)
-		self.H.__sendByte__(trigger)
-		self.H.__sendByte__((1<<4)|1) #Modes. four bits each
-		self.H.__get_ack__()
+		self.__start_LA__(self.MAX_SAMPLES,(TIMING,START_TWO_CHAN_LA,'HBB',self.MAX_SAMPLES/4,trigger,(1<<4)|1))	#Modes. four bits each
 		for a in self.dchans:
 			a.prescaler = 0
 			a.length = self.MAX_SAMPLES/4
@@ -1289,18 +1509,11 @@ class Interface(object):
 		:return: Nothing
 
 		"""
-		self.clear_buffer(0,self.MAX_SAMPLES);
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(START_THREE_CHAN_LA)
-		self.H.__sendInt__(self.MAX_SAMPLES/4)
 		modes = args.get('modes',[1,1,1,1])
 		trchan = self.__calcDChan__(args.get('trigger_channel','ID1'))
 		trmode = args.get('trigger_mode',3)
 		
-		self.H.__sendInt__(modes[0]|(modes[1]<<4)|(modes[2]<<8))
-		self.H.__sendByte__((trchan<<4)|trmode)
-		
-		self.H.__get_ack__()
+		self.__start_LA__(self.MAX_SAMPLES,(TIMING,START_THREE_CHAN_LA,'HHB',self.MAX_SAMPLES/4,modes[0]|(modes[1]<<4)|(modes[2]<<8),(trchan<<4)|trmode))
 		self.digital_channels_in_buffer = 3
 
 		n=0
@@ -1354,7 +1567,6 @@ class Interface(object):
 			Use :func:`fetch_long_data_from_LA` (points to read,x) to get data acquired from channel x.
 			The read data can be accessed from :class:`~Interface.dchans` [x-1]
 		"""
-		self.clear_buffer(0,self.MAX_SAMPLES);
 		prescale = 0
 		"""
 		if(maximum_time > 0.26):
@@ -1367,11 +1579,6 @@ class Interface(object):
 		elif(maximum_time > 0.0010239):
 			prescale = 1
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(START_FOUR_CHAN_LA)
-		self.H.__sendInt__(self.MAX_SAMPLES/4)
-		self.H.__sendInt__(mode[0]|(mode[1]<<4)|(mode[2]<<8)|(mode[3]<<12))
-		self.H.__sendByte__(prescale) #prescaler
 		trigopts=0
 		trigopts |= 4 if args.get('trigger_ID1',0) else 0
 		trigopts |= 8 if args.get('trigger_ID2',0) else 0
@@ -1379,8 +1586,7 @@ class Interface(object):
 		if (trigopts==0): trigger|=4	#select one trigger channel(ID1) if none selected
 		trigopts |= 2 if args.get('edge',0)=='rising' else 0
 		trigger|=trigopts
-		self.H.__sendByte__(trigger)
-		self.H.__get_ack__()
+		self.__start_LA__(self.MAX_SAMPLES,(TIMING,START_FOUR_CHAN_LA,'HHBB',self.MAX_SAMPLES/4,mode[0]|(mode[1]<<4)|(mode[2]<<8)|(mode[3]<<12),prescale,trigger))	#modes, prescaler, trigger
 		self.digital_channels_in_buffer = 4
 		n=0
 		for a in self.dchans:
@@ -1393,14 +1599,37 @@ class Interface(object):
 
 
 
+	def __start_LA__(self,clear,command):
+		'''
+		clears clear points of the buffer, and starts the logic analyzer with command (header,command,fmt,\*args).
+		Both are kept in LA_start , so that :func:`fetch_LA_rearm` can start it again with the same settings
+		'''
+		self.LA_start = (clear,command)
+		self.clear_buffer(0,clear)
+		self.H.__sendCommand__(*command)
+		self.H.__get_ack__()
+
 	def get_LA_initial_states(self):
 		""" 
 		fetches the initial states before the logic analyser started
 
 		:return: chan1 progress,chan2 progress,chan3 progress,chan4 progress,[ID1,ID2,ID3,ID4]. eg. [1,0,1,1]
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(GET_INITIAL_DIGITAL_STATES)
+		A,B,C,D,s = self.get_LA_progress()
+		if A==0: A=self.MAX_SAMPLES/4
+		if B==0: B=self.MAX_SAMPLES/4
+		if C==0: C=self.MAX_SAMPLES/4
+		if D==0: D=self.MAX_SAMPLES/4
+		return A,B,C,D,s
+
+	def get_LA_progress(self):
+		""" 
+		same as :func:`get_LA_initial_states` , but a channel which has not recorded any edges yet reports 0
+		instead of a full buffer, so that empty and full channels can be told apart.
+
+		:return: chan1 progress,chan2 progress,chan3 progress,chan4 progress,[ID1,ID2,ID3,ID4]. eg. [1,0,1,1]
+		"""
+		self.H.__sendCommand__(TIMING,GET_INITIAL_DIGITAL_STATES)
 		initial=self.H.__getInt__()
 		A=(self.H.__getInt__()-initial)/2
 		B=(self.H.__getInt__()-initial)/2-self.MAX_SAMPLES/4
@@ -1408,17 +1637,7 @@ class Interface(object):
 		D=(self.H.__getInt__()-initial)/2-3*self.MAX_SAMPLES/4
 		s=self.H.__getByte__()
 		self.H.__get_ack__()
-		
-		if A==0: A=self.MAX_SAMPLES/4
-		if B==0: B=self.MAX_SAMPLES/4
-		if C==0: C=self.MAX_SAMPLES/4
-		if D==0: D=self.MAX_SAMPLES/4
-		
-		if A<0: A=0
-		if B<0: B=0
-		if C<0: C=0
-		if D<0: D=0
-
+		A,B,C,D = [min(max(a,0),self.MAX_SAMPLES/4) for a in (A,B,C,D)]
 		return A,B,C,D,[(s&1!=0),(s&2!=0),(s&4!=0),(s&8!=0)]
 
 		
@@ -1433,25 +1652,11 @@ class Interface(object):
 		chan:			channel number (1-4)
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(FETCH_INT_DMA_DATA)
-		self.H.__sendInt__(bytes)
-		self.H.__sendByte__(chan-1)
-
-		ss = self.H.fd.read(bytes*2)
-		t = np.zeros(bytes*2)
-		for a in range(bytes):
-			t[a] = ord(ss[0+a*2]) |(ord(ss[1+a*2])<<8)
+		self.H.__sendCommand__(TIMING,FETCH_INT_DMA_DATA,'HB',bytes,chan-1)
 
+		received = self.H.__readInto__(memoryview(self.raw_buffer)[:bytes*2])
 		self.H.__get_ack__()
-		t=np.trim_zeros(t)
-		b=1;rollovers=0
-		while b<len(t):
-			if(t[b]<t[b-1] and t[b]!=0):
-				rollovers+=1
-				t[b:]+=65535
-			b+=1
-		return  t
+		return unwrap_timestamps(self.buff[:received/2])	#entries which were not received count as unused zeros
 
 	def fetch_long_data_from_LA(self,bytes,chan=1):
 		""" 
@@ -1464,19 +1669,50 @@ class Interface(object):
 		chan:			channel number (1,2)
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(TIMING)
-		self.H.__sendByte__(FETCH_LONG_DMA_DATA)
-		self.H.__sendInt__(bytes)
-		self.H.__sendByte__(chan-1)
-		ss = self.H.fd.read(bytes*4)
+		self.H.__sendCommand__(TIMING,FETCH_LONG_DMA_DATA,'HB',bytes,chan-1)
+		received = self.H.__readInto__(memoryview(self.raw_buffer)[:bytes*4])
 		tmp = np.zeros(bytes)
-		for a in range(bytes):
-			tmp[a] = ord(ss[0+a*4])|(ord(ss[1+a*4])<<8)|(ord(ss[2+a*4])<<16)|(ord(ss[3+a*4])<<24)
+		tmp[:received/4] = np.frombuffer(self.raw_buffer,dtype=np.dtype('<u4'),count=received/4)
 		self.H.__get_ack__()
 		tmp = np.trim_zeros(tmp) 
 		return tmp
 
 
+	def fetch_LA_rearm(self,data,rearm=True):
+		"""
+		fetches the timestamps logged by the logic analyzer, and starts it again with the same settings.
+		The restart is sent in the same write as the requests for the data, so that the logic analyzer is
+		idle for no longer than the transfer takes, however many edges there are. Used by :func:`Labtools.recorder.record_LA` for chained captures
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		data			progress of each channel, as returned by :func:`get_LA_progress`
+		rearm			restart the logic analyzer. default True
+		==============	============================================================================================
+
+		:return: list with an array of timestamps for each channel in the buffer, in counts of its clock (see prescaler).
+			16-bit timestamps are unwrapped with :func:`unwrap_timestamps`.
+			Raises packet_handler.CommunicationError if they could not be fetched
+		"""
+		clear,command = self.LA_start
+		replies = []
+		with self.H.pipeline(max_pending=None) as P:	#no window, so that the restart is not held back until the data has been read
+			for a in self.dchans[:self.digital_channels_in_buffer]:
+				if a.datatype=='int':n,cmd,fmt = data[a.channel_number],FETCH_INT_DMA_DATA,'H'
+				else:n,cmd,fmt = data[a.channel_number*2],FETCH_LONG_DMA_DATA,'I'
+				replies.append(P.command(TIMING,cmd,'HB',n,a.channel_number,reply='%d%s'%(n,fmt)) if n else None)
+			if rearm:
+				P.command(COMMON,CLEAR_BUFFER,'HH',0,clear)
+				P.command(*command)
+		timestamps = []
+		for a,r in zip(self.dchans,replies):
+			if r is not None and r.value is None:raise packet_handler.CommunicationError('logic analyzer data could not be fetched')
+			raw = np.atleast_1d(r.value) if r is not None else np.zeros(0)
+			if a.datatype=='int':timestamps.append(unwrap_timestamps(raw))
+			else:timestamps.append(np.trim_zeros(raw.astype(float)))
+		return timestamps
+
 	def fetch_LA_channels(self,trigchan=1):
 		"""
 		reads and stores the channels in self.dchans.
@@ -1520,8 +1756,7 @@ class Interface(object):
 		{'ID1': True, 'ID2': True, 'ID3': True, 'ID4': False}
 		
 		"""
-		self.H.__sendByte__(DIN)
-		self.H.__sendByte__(GET_STATES)
+		self.H.__sendCommand__(DIN,GET_STATES)
 		s=self.H.__getByte__()
 		self.H.__get_ack__()
 		return {'ID1':(s&1!=0),'ID2':(s&2!=0),'ID3':(s&4!=0),'ID4':(s&8!=0)}
@@ -1574,9 +1809,7 @@ class Interface(object):
 			data|= 0x10|(kwargs.get('SQR1'))
 		if kwargs.has_key('SQR2'):
 			data|= 0x20|(kwargs.get('SQR2')<<1)
-		self.H.__sendByte__(DOUT)
-		self.H.__sendByte__(SET_STATE)
-		self.H.__sendByte__(data)
+		self.H.__sendCommand__(DOUT,SET_STATE,'B',data)
 		self.H.__get_ack__()
 
 
@@ -1611,9 +1844,7 @@ class Interface(object):
 	'''
 
 	def __get_capacitor_range__(self,ctime):
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(GET_CAP_RANGE)
-		self.H.__sendInt__(ctime) 
+		self.H.__sendCommand__(COMMON,GET_CAP_RANGE,'H',ctime)
 		V_sum = self.H.__getInt__()
 		self.H.__get_ack__()
 		V=V_sum*3.3/16/4095
@@ -1661,15 +1892,12 @@ class Interface(object):
 			C = I_{constant}*time/V_{measured}
 
 		"""
-		self.H.__sendByte__(COMMON)
 		currents=[0.5775e-3,0.53e-6,0.5775e-5,0.5775e-4]
-		self.H.__sendByte__(GET_CAPACITANCE)
-		self.H.__sendByte__(current_range)
 		if(trim<0):
-			self.H.__sendByte__( int(31-abs(trim)/2)|32)
+			trimval = int(31-abs(trim)/2)|32
 		else:
-			self.H.__sendByte__(int(trim/2))
-		self.H.__sendInt__(Charge_Time)
+			trimval = int(trim/2)
+		self.H.__sendCommand__(COMMON,GET_CAPACITANCE,'BBH',current_range,trimval,Charge_Time)
 		time.sleep(Charge_Time*1e-6+.02)
 		V = 3.3*self.H.__getInt__()/4095
 		self.H.__get_ack__()
@@ -1707,9 +1935,7 @@ class Interface(object):
 
 		:return: a string of 16 characters read from the location
 		"""
-		self.H.__sendByte__(FLASH)
-		self.H.__sendByte__(READ_FLASH)
-		self.H.__sendByte__(location) 	#send the location
+		self.H.__sendCommand__(FLASH,READ_FLASH,'B',location)	#send the location
 		ss=self.H.fd.read(16)
 		self.H.__get_ack__()
 		return ss
@@ -1726,9 +1952,7 @@ class Interface(object):
 
 		:return: a string of 16 characters read from the location
 		"""
-		self.H.__sendByte__(FLASH)
-		self.H.__sendByte__(READ_BULK_FLASH)
-		self.H.__sendInt__(bytes) 	#send the location
+		self.H.__sendCommand__(FLASH,READ_BULK_FLASH,'H',bytes)	#send the location
 		ss=self.H.fd.read(bytes)
 		self.H.__get_ack__()
 		return ss
@@ -1747,10 +1971,7 @@ class Interface(object):
 
 		"""
 		while(len(string_to_write)<16):string_to_write+='.'
-		self.H.__sendByte__(FLASH)
-		self.H.__sendByte__(WRITE_FLASH) 	#indicate a flash write coming through
-		self.H.__sendByte__(location) 	#send the location
-		self.H.fd.write(string_to_write)
+		self.H.__sendCommand__(FLASH,WRITE_FLASH,'B16s',location,string_to_write[:16])	#indicate a flash write coming through
 		time.sleep(0.1)
 		self.H.__get_ack__()
 
@@ -1766,12 +1987,8 @@ class Interface(object):
 
 		"""
 		print 'Dumping ',len(bytearray),' bytes into flash'
-		self.H.__sendByte__(FLASH)
-		self.H.__sendByte__(WRITE_BULK_FLASH) 	#indicate a flash write coming through
-		self.H.__sendInt__(len(bytearray)) 	#send the location
-		for n in range(len(bytearray)):
-			self.H.__sendByte__(bytearray[n])
-			Printer('Bytes written: %d'%(n+1))
+		data = ''.join([chr(a) if type(a)==int else a for a in bytearray])
+		self.H.__sendCommand__(FLASH,WRITE_BULK_FLASH,'H%ds'%len(data),len(data),data) 	#indicate a flash write coming through
 		time.sleep(0.2)
 		self.H.__get_ack__()
 
@@ -1792,9 +2009,7 @@ class Interface(object):
 		
 		:return: Voltage
 		"""	
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(GET_CTMU_VOLTAGE)
-		self.H.__sendByte__((channel)|(Crange<<5)|(tgen<<7))
+		self.H.__sendCommand__(COMMON,GET_CTMU_VOLTAGE,'B',(channel)|(Crange<<5)|(tgen<<7))
 		time.sleep(0.001)
 		self.H.__getByte__()	#junk byte '0' sent since UART was in IDLE mode and needs to recover.
 		#V = [self.H.__getInt__() for a in range(16)]
@@ -1833,9 +2048,7 @@ class Interface(object):
 		:return: nothing
 
 		"""
-		self.H.__sendByte__(UART_2)
-		self.H.__sendByte__(SEND_ADDRESS)
-		self.H.__sendByte__(c)
+		self.H.__sendCommand__(UART_2,SEND_ADDRESS,'B',c)
 		self.H.__get_ack__()
 
 
@@ -1855,11 +2068,7 @@ class Interface(object):
 		:return: frequency
 		"""
 		freq_setting = int(round(1.* frequency * self.DDS_MAX_FREQ / self.DDS_CLOCK))
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_WG1)
-		self.H.__sendByte__(14+register)
-		self.H.__sendInt__((freq_setting)&0x3FFF)
-		self.H.__sendInt__((freq_setting>>14)&0x3FFF)
+		self.H.__sendCommand__(WAVEGEN,SET_WG1,'BHH',14+register,(freq_setting)&0x3FFF,(freq_setting>>14)&0x3FFF)
 		
 		self.H.__get_ack__()
 		return frequency
@@ -1880,11 +2089,7 @@ class Interface(object):
 		:return: frequency
 		"""
 		freq_setting = int(round(1.*frequency * self.DDS_MAX_FREQ / self.DDS_CLOCK))
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_WG2)
-		self.H.__sendByte__(14+register)
-		self.H.__sendInt__((freq_setting)&0x3FFF)
-		self.H.__sendInt__((freq_setting>>14)&0x3FFF)
+		self.H.__sendCommand__(WAVEGEN,SET_WG2,'BHH',14+register,(freq_setting)&0x3FFF,(freq_setting>>14)&0x3FFF)
 		
 		self.H.__get_ack__()
 		return frequency
@@ -1900,27 +2105,21 @@ class Interface(object):
 		==============	============================================================================================
 		
 		"""
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_BOTH_WG)
-		self.H.__sendInt__(int(4095*phase/360.)&0x3FFF)		
+		self.H.__sendCommand__(WAVEGEN,SET_BOTH_WG,'H',int(4095*phase/360.)&0x3FFF)
 		self.H.__get_ack__()
 
 	def set_waveform_type(self,channel,waveform='sine'):
 		"""
 		"""
 		wave={'sine':0,'triangle':1,'square':2}
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_WAVEFORM_TYPE)
-		self.H.__sendByte__((1<<wave.get(waveform,0))|(0x10<<channel))		
+		self.H.__sendCommand__(WAVEGEN,SET_WAVEFORM_TYPE,'B',(1<<wave.get(waveform,0))|(0x10<<channel))
 		self.H.__get_ack__()
 
 	def select_freq(self,channel,register):
 		"""
 		"""
 		wave={'sine':0,'triangle':1,'square':2}
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SELECT_FREQ_REGISTER)
-		self.H.__sendByte__((1<<register)|(0x10<<channel))		
+		self.H.__sendCommand__(WAVEGEN,SELECT_FREQ_REGISTER,'B',(1<<register)|(0x10<<channel))
 		self.H.__get_ack__()
 
 
@@ -1983,10 +2182,8 @@ class Interface(object):
 
 				
 		"""		
-		self.H.__sendByte__(DAC) #DAC write coming through.(MCP4922)
-		self.H.__sendByte__(SET_DAC)
 		val=(channel<<15)|(1<<14)|(1<<13)|(1<<12)|n #channel-15,buf-14,g-13,on/off-12,value 0-11
-		self.H.__sendInt__(val)
+		self.H.__sendCommand__(DAC,SET_DAC,'H',val) #DAC write coming through.(MCP4922)
 		self.H.__get_ack__()
 
 	def set_pvs1(self,val):
@@ -2058,12 +2255,8 @@ class Interface(object):
 		B				brightness of blue colour 0-255
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(SET_ONBOARD_RGB)
 		G=reverse_bits(G);R=reverse_bits(R);B=reverse_bits(B)
-		self.H.__sendByte__(B)
-		self.H.__sendByte__(R)
-		self.H.__sendByte__(G)
+		self.H.__sendCommand__(COMMON,SET_ONBOARD_RGB,'BBB',B,R,G)
 		time.sleep(0.001)
 		self.H.__get_ack__()	
 
@@ -2080,12 +2273,8 @@ class Interface(object):
 		B				brightness of blue colour 0-255
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(SET_RGB)
 		R=reverse_bits(col[0]);G=reverse_bits(col[1]);B=reverse_bits(col[2])
-		self.H.__sendByte__(B)
-		self.H.__sendByte__(R)
-		self.H.__sendByte__(G)
+		self.H.__sendCommand__(COMMON,SET_RGB,'BBB',B,R,G)
 		self.H.__get_ack__()	
 
 	def tune_wavegen(self,tune):
@@ -2111,21 +2300,15 @@ class Interface(object):
 	def fetch_buffer(self,starting_position=0,total_points=100):
 		"""
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(RETRIEVE_BUFFER)
-		self.H.__sendInt__(starting_position)
-		self.H.__sendInt__(total_points)
-		for a in range(total_points): self.buff[a]=self.H.__getInt__()
-		self.H.__get_ack__()
+		request = lambda offset,n:(COMMON,RETRIEVE_BUFFER,'HH',starting_position+offset,n)
+		self.H.__fetchChunked__([(memoryview(self.raw_buffer),total_points,request)])
+		return self.buff[:total_points]
 
 	def clear_buffer(self,starting_position,total_points):
 		"""
 		returns a section of the buffer
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(CLEAR_BUFFER)
-		self.H.__sendInt__(starting_position)
-		self.H.__sendInt__(total_points)
+		self.H.__sendCommand__(COMMON,CLEAR_BUFFER,'HH',starting_position,total_points)
 		self.H.__get_ack__()
 
 	def start_streaming(self,tg,channel='CH1'):
@@ -2142,20 +2325,36 @@ class Interface(object):
 		"""
 		if(self.streaming):self.stop_streaming()
 		
-		self.H.__sendByte__(ADC)
-		self.H.__sendByte__(START_ADC_STREAMING)
-		self.H.__sendByte__(self.__calcCHOSA__(channel))
-		self.H.__sendInt__(tg)		#Timegap between samples.  8MHz timer clock
+		self.H.__sendCommand__(ADC,START_ADC_STREAMING,'BH',self.__calcCHOSA__(channel),tg)	#Timegap between samples.  8MHz timer clock
 		self.streaming=True
 
+	def stream_reader(self,tg,channel='CH1',**kwargs):
+		"""
+		Starts streaming, and returns a :class:`stream_reader.StreamReader` which collects the samples
+		on a thread of its own, and returns them in volts.
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		tg				timegap. 250KHz clock
+		channel			channel 'CH1'... 'CH9','IN1','SEN'
+		\*\*kwargs		ring_size, block_size, callback. See :class:`stream_reader.StreamReader`
+		==============	============================================================================================
+
+		>>> R = I.stream_reader(25,'CH1')
+		>>> volts = R.read(10000)		#one second at 10 kSPS
+		>>> R.stop()
+		"""
+		import stream_reader
+		return stream_reader.StreamReader(self,tg,channel,**kwargs)
+
 	def stop_streaming(self):
 		"""
 		Instruct the ADC to stop streaming data
 		"""
 		if(self.streaming):
 			self.H.__sendByte__(STOP_STREAMING)
-			self.H.fd.read(20000)
-			self.H.fd.flush()
+			self.H.__drain__()
 		else:
 			print 'not streaming'
 		self.streaming=False
@@ -2183,11 +2382,7 @@ class Interface(object):
 		high_time = wavelength*duty_cycle/100.
 		print wavelength,high_time,prescaler
 		if echo:print wavelength,high_time,prescaler
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_SQR1)
-		self.H.__sendInt__(int(round(wavelength)))
-		self.H.__sendInt__(int(round(high_time)))
-		self.H.__sendByte__(prescaler)
+		self.H.__sendCommand__(WAVEGEN,SET_SQR1,'HHB',int(round(wavelength)),int(round(high_time)),prescaler)
 		self.H.__get_ack__()
 
 
@@ -2214,11 +2409,7 @@ class Interface(object):
 			return
 		high_time = wavelength*duty_cycle/100.
 		print wavelength,high_time,prescaler
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_SQR2)
-		self.H.__sendInt__(int(round(wavelength)))
-		self.H.__sendInt__(int(round(high_time)))
-		self.H.__sendByte__(prescaler)
+		self.H.__sendCommand__(WAVEGEN,SET_SQR2,'HHB',int(round(wavelength)),int(round(high_time)),prescaler)
 		self.H.__get_ack__()
 
 
@@ -2237,13 +2428,7 @@ class Interface(object):
 		==============	============================================================================================
 		
 		"""
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SET_SQRS)
-		self.H.__sendInt__(wavelength)
-		self.H.__sendInt__(phase)
-		self.H.__sendInt__(high_time1)
-		self.H.__sendInt__(high_time2)
-		self.H.__sendByte__(prescaler)
+		self.H.__sendCommand__(WAVEGEN,SET_SQRS,'HHHHB',wavelength,phase,high_time1,high_time2,prescaler)
 		self.H.__get_ack__()
 
 	def sqr4_pulse(self,freq,h0,p1,h1,p2,h2,p3,h3):
@@ -2268,10 +2453,6 @@ class Interface(object):
 		if wavelength>65535:
 			print 'frequency too low.'
 			return
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SQR4)
-		self.H.__sendInt__(wavelength)
-		self.H.__sendInt__(int(wavelength*h0))
 		params = 0
 		if p1==0:p1=1
 		if p2==0:p2=1
@@ -2299,13 +2480,7 @@ class Interface(object):
 			B3 = int((h3+p3)*wavelength)
 
 		print wavelength,A1,B1,A2,B2,A3,B3
-		self.H.__sendInt__(A1)
-		self.H.__sendInt__(B1)
-		self.H.__sendInt__(A2)
-		self.H.__sendInt__(B2)
-		self.H.__sendInt__(A3)
-		self.H.__sendInt__(B3)
-		self.H.__sendByte__(params)
+		self.H.__sendCommand__(WAVEGEN,SQR4,'HHHHHHHHB',wavelength,int(wavelength*h0),A1,B1,A2,B2,A3,B3,params)
 		self.H.__get_ack__()
 
 	def sqr4_continuous(self,freq,h0,p1,h1,p2,h2,p3,h3):
@@ -2341,10 +2516,6 @@ class Interface(object):
 			params=1
 			wavelength = int(64e6/freq/8)
 		params|= (1<<5)
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SQR4)
-		self.H.__sendInt__(wavelength)
-		self.H.__sendInt__(int(wavelength*h0))
 
 		A1 = int(p1%1*wavelength)
 		B1 = int((h1+p1)%1*wavelength)
@@ -2355,13 +2526,7 @@ class Interface(object):
 
 		print p1,h1,p2,h2,p3,h3
 		print wavelength,int(wavelength*h0),A1,B1,A2,B2,A3,B3
-		self.H.__sendInt__(A1)
-		self.H.__sendInt__(B1)
-		self.H.__sendInt__(A2)
-		self.H.__sendInt__(B2)
-		self.H.__sendInt__(A3)
-		self.H.__sendInt__(B3)
-		self.H.__sendByte__(params)
+		self.H.__sendCommand__(WAVEGEN,SQR4,'HHHHHHHHB',wavelength,int(wavelength*h0),A1,B1,A2,B2,A3,B3,params)
 		self.H.__get_ack__()
 
 	def delay_generator(self,**args):
@@ -2384,12 +2549,8 @@ class Interface(object):
 		"""
 		wavelength = 0xFFFF
 		params = (1<<5)|(1<<6)
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SQR4)
-		self.H.__sendInt__(wavelength)
 		h0 = args.get('h0',100);h1 = args.get('h1',100);h2 = args.get('h2',100);h3 = args.get('h3',100);
 		p1 = args.get('p1',0);p2 = args.get('p2',0);p3 = args.get('p3',0);
-		self.H.__sendInt__(int(64*h0))
 
 		A1 = int(p1*64)
 		B1 = int((h1+p1)*64)
@@ -2398,18 +2559,12 @@ class Interface(object):
 		A3 = int(p3*64)
 		B3 = int((h3+p3)*64)
 
-		self.H.__sendInt__(A1)
-		self.H.__sendInt__(B1)
-		self.H.__sendInt__(A2)
-		self.H.__sendInt__(B2)
-		self.H.__sendInt__(A3)
-		self.H.__sendInt__(B3)
-		self.H.__sendByte__(params)
+		self.H.__sendCommand__(WAVEGEN,SQR4,'HHHHHHHHB',wavelength,int(64*h0),A1,B1,A2,B2,A3,B3,params)
 		self.H.__get_ack__()
 
 
 
-	def map_reference_clock(self,scaler,*args):
+	def map_reference_clock(self,scaler,*args,**kwargs):
 		"""
 		Map the internal oscillator output  to SQR1,SQR2,OD1 or OD2
 		The output frequency is 128/(1<<scaler) MHz
@@ -2430,18 +2585,20 @@ class Interface(object):
 		
 		outputs 32 MHz on sqr1, sqr2 pins
 		
+		The command is queued in a packet_handler.Pipeline instead, if one is passed as the pipeline keyword argument
 		"""
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(MAP_REFERENCE)
 		chan=0
 		if 'sqr1' in args:chan|=1
 		if 'sqr2' in args:chan|=2
 		if 'od1' in args:chan|=4
 		if 'od2' in args:chan|=8
 		if 'wavegen' in args:chan|=16
-		self.H.__sendByte__(chan)
-		self.H.__sendByte__(scaler)
 		if 'wavegen' in args: self.DDS_CLOCK = 128e6/(1<<scaler)
+		pipeline = kwargs.get('pipeline',None)
+		if pipeline is not None:
+			pipeline.command(WAVEGEN,MAP_REFERENCE,'BB',chan,scaler)
+			return
+		self.H.__sendCommand__(WAVEGEN,MAP_REFERENCE,'BB',chan,scaler)
 		self.H.__get_ack__()
 
 
@@ -2455,10 +2612,7 @@ class Interface(object):
 		address		Address to read from. Refer to PIC24EP64GP204 programming manual
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(READ_PROGRAM_ADDRESS)
-		self.H.__sendInt__(address&0xFFFF)
-		self.H.__sendInt__((address>>16)&0xFFFF)
+		self.H.__sendCommand__(COMMON,READ_PROGRAM_ADDRESS,'HH',address&0xFFFF,(address>>16)&0xFFFF)
 		v=self.H.__getInt__()
 		self.H.__get_ack__()
 		return v
@@ -2474,11 +2628,7 @@ class Interface(object):
 				Do Not Screw around with this. It won't work anyway.            
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(WRITE_PROGRAM_ADDRESS)
-		self.H.__sendInt__(address&0xFFFF)
-		self.H.__sendInt__((address>>16)&0xFFFF)
-		self.H.__sendInt__(value)
+		self.H.__sendCommand__(COMMON,WRITE_PROGRAM_ADDRESS,'HHH',address&0xFFFF,(address>>16)&0xFFFF,value)
 		self.H.__get_ack__()
 
 	def read_data_address(self,address):
@@ -2491,9 +2641,7 @@ class Interface(object):
 		address		Address to read from.  Refer to PIC24EP64GP204 programming manual|
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(READ_DATA_ADDRESS)
-		self.H.__sendInt__(address&0xFFFF)
+		self.H.__sendCommand__(COMMON,READ_DATA_ADDRESS,'H',address&0xFFFF)
 		v=self.H.__getInt__()
 		self.H.__get_ack__()
 		return v
@@ -2508,10 +2656,7 @@ class Interface(object):
 		address		Address to write to.  Refer to PIC24EP64GP204 programming manual|
 		==============	============================================================================================
 		"""
-		self.H.__sendByte__(COMMON)
-		self.H.__sendByte__(WRITE_DATA_ADDRESS)
-		self.H.__sendInt__(address&0xFFFF)
-		self.H.__sendInt__(value)
+		self.H.__sendCommand__(COMMON,WRITE_DATA_ADDRESS,'HH',address&0xFFFF,value)
 		self.H.__get_ack__()
 
 
@@ -2546,17 +2691,7 @@ class Interface(object):
 		
 		"""
 		params = (1<<5)|2		#continuous waveform.  prescaler 2( 1:64)
-		self.H.__sendByte__(WAVEGEN)
-		self.H.__sendByte__(SQR4)
-		self.H.__sendInt__(10000)		#10mS wavelength
-		self.H.__sendInt__(750+int(a1*1900/180))
-		self.H.__sendInt__(0)
-		self.H.__sendInt__(750+int(a2*1900/180))
-		self.H.__sendInt__(0)
-		self.H.__sendInt__(750+int(a3*1900/180))
-		self.H.__sendInt__(0)
-		self.H.__sendInt__(750+int(a4*1900/180))
-		self.H.__sendByte__(params)
+		self.H.__sendCommand__(WAVEGEN,SQR4,'HHHHHHHHB',10000,750+int(a1*1900/180),0,750+int(a2*1900/180),0,750+int(a3*1900/180),0,750+int(a4*1900/180),params)	#10mS wavelength
 		self.H.__get_ack__()
 
 
@@ -2578,10 +2713,7 @@ class Interface(object):
 				received for a period greater than one second at a time.
 		==============	============================================================================================
 		'''
-		self.H.__sendByte__(PASSTHROUGHS)
-		self.H.__sendByte__(PASS_UART)
-		self.H.__sendByte__(1 if persist else 0)
-		self.H.__sendInt__(int( round(((64e6/baudrate)/4)-1) ))
+		self.H.__sendCommand__(PASSTHROUGHS,PASS_UART,'BH',1 if persist else 0,int( round(((64e6/baudrate)/4)-1) ))
 		print 'BRGVAL:',int( round(((64e6/baudrate)/4)-1) )
 		time.sleep(0.1)
 		print 'junk bytes read:',len(self.H.fd.read(100))
@@ -2604,11 +2736,8 @@ class Interface(object):
 		can cause a measurement error of 25uS which corresponds to 8mm.
 		
 		'''
-		self.H.__sendByte__(NONSTANDARD_IO)
-		self.H.__sendByte__(HCSR04_HEADER)
-
 		timeout_msb = int((0.1*64e6))>>16
-		self.H.__sendInt__(timeout_msb)
+		self.H.__sendCommand__(NONSTANDARD_IO,HCSR04_HEADER,'H',timeout_msb)
 
 		A=self.H.__getLong__()
 		B=self.H.__getLong__()
@@ -2624,8 +2753,7 @@ class Interface(object):
 		'''
 		read from AM2302
 		'''
-		self.H.__sendByte__(NONSTANDARD_IO)
-		self.H.__sendByte__(AM2302_HEADER)
+		self.H.__sendCommand__(NONSTANDARD_IO,AM2302_HEADER)
 
 		self.H.__get_ack__()
 		self.digital_channels_in_buffer=1
@@ -2635,12 +2763,7 @@ class Interface(object):
 		read from AM2302
 		'''
 		samples=3694
-		self.H.__sendByte__(NONSTANDARD_IO)
-		self.H.__sendByte__(TCD1304_HEADER)
-		self.H.__sendByte__(self.__calcCHOSA__('CH5'))
-		self.H.__sendByte__(int(tg*8))
-		self.H.__sendInt__(delay)
-		self.H.__sendInt__(tp)
+		self.H.__sendCommand__(NONSTANDARD_IO,TCD1304_HEADER,'BBHH',self.__calcCHOSA__('CH5'),int(tg*8),delay,tp)
 		self.achans[0].gain = self.sensor_gain
 		self.achans[0].set_params(channel='CH5',length=samples,timebase=1,resolution=TWELVE_BIT)
 		self.samples=samples
@@ -1,24 +1,226 @@
 from commands_proto import *
-import serial,fcntl
+import serial,fcntl,struct,re,collections,os,threading,thread,heapq,functools,types
+import numpy as np
 
 class Singleton(type):
+    """
+    One instance per device. Instances are keyed by the transport, port or devnum keyword arguments.
+    A call without any of these returns the first instance that was created, so that widgets
+    can simply call Interface() to get hold of the device the application opened.
+    """
     _instances = {}
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
+        instances = Singleton._instances.setdefault(cls,collections.OrderedDict())
+        key = Singleton.key(kwargs)
+        if key is None:
+            if instances: return instances.values()[0]
+            key = ('devnum',1)
+        if key not in instances:
+            instances[key] = super(Singleton, cls).__call__(*args, **kwargs)
+        return instances[key]
+
+    @staticmethod
+    def key(kwargs):
+        if kwargs.get('transport',None) is not None: return ('transport',id(kwargs['transport']))
+        if kwargs.get('port',None): return ('port',kwargs['port'])
+        if kwargs.get('devnum',None): return ('devnum',int(kwargs['devnum']))
+        return None
+
+    def instances(cls):
+        """
+        returns the instances of this class that are currently open
+        """
+        return Singleton._instances.get(cls,{}).values()
+
+    def forget(cls,instance):
+        """
+        removes an instance from the registry, so that the next call with the same arguments opens the device afresh
+        """
+        instances = Singleton._instances.get(cls,{})
+        for key in [a for a in instances if instances[a] is instance]:
+            del instances[key]
+
+class CommunicationError(IOError):
+	"""
+	The device did not respond as expected
+	"""
+	pass
+
+class ChunkTuner(object):
+	"""
+	Picks the number of items requested per chunk by bulk transfers.
+	Goodput (bytes delivered per second, including time lost to failed attempts) is measured for each
+	chunk size. The chunk size grows while this keeps improving, and goes back to the previous size if it drops.
+	Two failures in a row halve it, and the size that failed is not exceeded until a few hundred chunks
+	have gone through without trouble.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	size			initial chunk size. default 2500
+	minimum			smallest chunk size. default 64
+	maximum			largest chunk size. default 10000
+	==============	============================================================================================
+	"""
+	def __init__(self,size=2500,minimum=64,maximum=10000):
+		self.size = size
+		self.minimum = minimum
+		self.maximum = maximum
+		self.goodput = {}		#chunk size -> [bytes,seconds], decaying sums
+		self.previous = None	#size before the last increase
+		self.ceiling = None		#smallest size which failed repeatedly
+		self.settled = 0		#chunks transferred at the current size
+		self.successes = 0		#chunks transferred since the ceiling was set
+		self.consecutive = 0	#failures in a row
+		self.error_rate = 0.	#fraction of chunks which failed, averaged over recent chunks
+		self.chunks = 0
+		self.failures = 0
+
+	def next(self,remaining):
+		return min(self.size,remaining)
+
+	def rate(self,size):
+		b,t = self.goodput.get(size,(0.,0.))
+		return b/t if t else None
+
+	def __account__(self,size,nbytes,dt):
+		b,t = self.goodput.get(size,(0.,0.))
+		self.goodput[size] = (0.8*b+nbytes,0.8*t+dt)
+
+	def success(self,size,nbytes,dt):
+		self.chunks+=1
+		self.error_rate*=0.9
+		self.consecutive = 0
+		self.successes+=1
+		if self.successes>=200:self.ceiling = None	#probe larger sizes again
+		if size!=self.size:return	#the last piece of a transfer
+		self.__account__(size,nbytes,dt)
+		self.settled+=1
+		if self.settled<4:return
+		current,previous = self.rate(size),self.rate(self.previous)
+		if previous and previous>1.1*current:	#larger chunks made things worse
+			self.size,self.previous,self.settled = self.previous,None,0
+			return
+		bigger = min(self.maximum,int(size*1.5))
+		if self.ceiling:bigger = min(bigger,self.ceiling-1)
+		if bigger>size and (self.rate(bigger) is None or self.rate(bigger)>=current):
+			self.size,self.previous,self.settled = bigger,size,0
+
+	def failure(self,size,dt=0):
+		self.chunks+=1
+		self.failures+=1
+		self.error_rate = 0.9*self.error_rate+0.1
+		self.consecutive+=1
+		if size==self.size:self.__account__(size,0,dt)
+		if self.consecutive<2:return	#retry once at the same size
+		self.ceiling = min(self.ceiling or size,size)
+		self.successes = 0
+		self.size = max(self.minimum,min(self.size,size)/2)
+		self.previous,self.settled,self.consecutive = None,0,0
+
+class PriorityLock(object):
+	"""
+	A re-entrant lock. When it is released, it is handed to the waiting thread with the highest priority,
+	and to the one that has waited longest among those with equal priority.
+	"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.owner = None
+		self.count = 0
+		self.waiting = []	#heap of (-priority,arrival,thread id,lock the thread is blocked on)
+		self.arrivals = 0
+
+	def acquire(self,priority=0):
+		me = thread.get_ident()
+		with self.lock:
+			if self.owner == me or self.owner is None:
+				self.owner = me
+				self.count+=1
+				return True
+			wake = threading.Lock()
+			wake.acquire()
+			self.arrivals+=1
+			heapq.heappush(self.waiting,(-priority,self.arrivals,me,wake))
+		wake.acquire()		#released by release() once this thread owns the lock
+		return True
+
+	def release(self):
+		with self.lock:
+			if self.owner != thread.get_ident():raise RuntimeError('cannot release un-acquired lock')
+			self.count-=1
+			if self.count:return
+			if self.waiting:
+				priority,arrival,self.owner,wake = heapq.heappop(self.waiting)
+				self.count = 1
+				wake.release()
+			else:
+				self.owner = None
+
+class Transaction(object):
+	"""
+	Context manager returned by :func:`Handler.transaction`
+	"""
+	def __init__(self,lock,priority):
+		self.lock = lock
+		self.priority = priority
+
+	def __enter__(self):
+		self.lock.acquire(self.priority)
+		return self
+
+	def __exit__(self,exc_type,exc_value,traceback):
+		self.lock.release()
+
+def atomic(fn):
+	"""
+	method decorator. The method is carried out as a single transaction on self.H
+	"""
+	@functools.wraps(fn)
+	def wrapper(self,*args,**kwargs):
+		H = self.H
+		H.lock.acquire(H.priority())
+		try:
+			return fn(self,*args,**kwargs)
+		finally:
+			H.lock.release()
+	return wrapper
+
+def transactions(cls):
+	"""
+	class decorator. Every method of cls that uses the Handler (self.H) is made :func:`atomic`,
+	so that commands issued by other threads cannot be interleaved with its own.
+	Methods may call each other, since the lock is re-entrant.
+	"""
+	for name,fn in cls.__dict__.items():
+		if isinstance(fn,types.FunctionType) and name!='__init__' and 'H' in fn.func_code.co_names:
+			setattr(cls,name,atomic(fn))
+	return cls
 
 
 class Handler(object):
 	__metaclass__ = Singleton
+	BASE_PORT_NAME = "/dev/ttyACM"
+	PORT_CACHE = os.path.expanduser('~/.labtools_port')	#USB serial number and port of the last device connected to
+	FORMAT_FIELD = re.compile(r'(\d*)([xcbB?hHiIlLqQfdsp])')	#count, and type of each field of a struct format
 	def __init__(self,timeout=1.0,**kwargs):
 		self.burstBuffer=''
 		self.loadBurst=False
 		self.inputQueueSize=0
-		self.BASE_PORT_NAME = "/dev/ttyACM"
+		self.lock=PriorityLock()	#held for the duration of each transaction. See transaction()
+		self.local=threading.local()
+		self.stats=None		#wire_stats.WireStats, while instrumentation is enabled. See enable_stats()
+		self.chunks=ChunkTuner()	#chunk sizes for bulk transfers. See __fetchChunked__
 		self.timeout=timeout
 		self.version_string=''
-		if kwargs.has_key('port'):
+		self.devnum=int(kwargs.get('devnum',None) or 1)	#picks the n'th free device found while scanning ports
+		self.transport=kwargs.get('transport',None)
+		if self.transport is not None:	#an already open, file-like transport. e.g. simulator.SimulatedDevice
+				self.fd = self.transport
+				self.portname = getattr(self.fd,'portname','transport')
+				version = self.get_version(self.fd)
+				print 'Connected to device at ',self.portname,' ,Version:',version
+				self.version_string=version
+		elif kwargs.has_key('port'):
 				self.portname=kwargs.get('port',None)
 				if not self.portname:
 					print 'device not found'
@@ -34,33 +236,111 @@ class Handler(object):
 				print 'Connected to device at ',self.portname,' ,Version:',version
 				self.version_string=version
 		else:	#Scan and pick a port	
-			for a in range(10):
-				try:
-					self.fd = serial.Serial(self.BASE_PORT_NAME+str(a), 9600, stopbits=1, timeout = 0.02)
-					self.fd.read(100)
-					self.fd = serial.Serial(self.BASE_PORT_NAME+str(a), 1000000, stopbits=1, timeout = 1)
-					fcntl.flock(self.fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-					self.portname=self.BASE_PORT_NAME+str(a)
-					if(self.fd.inWaiting()):
-						self.fd.read(1000)
-						self.fd.flush()
-					version = self.get_version(self.fd)
-					self.version_string=version
-					if(version[:3]=='LTS'):
-						print 'Connected to device at ',self.portname,' ,Version:',version
-						return
-				except IOError:
-					print self.BASE_PORT_NAME+str(a)+' is taken '
-					pass
+			self.portname,self.fd,version = self.__discover__()
+			self.version_string=version
+			if self.fd is None:
+				print 'device not found'
+			else:
+				print 'Connected to device at ',self.portname,' ,Version:',version
 			
-		
+	def __probe__(self,port):
+		"""
+		opens and locks port, and checks if a device is connected to it.
+		Returns (serial port, version string) , or (None, reason for failure)
+		"""
+		try:
+			fd = serial.Serial(port, 9600, stopbits=1, timeout = 0.02)
+		except (IOError,OSError):
+			return None,'unavailable'
+		try:
+			fcntl.flock(fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)	#fails right away if another process holds the port
+		except IOError:
+			fd.close()
+			return None,'is taken'
+		try:
+			fd.read(100)
+			fd.baudrate = 1000000	#changed in place, so that the lock is retained
+			fd.timeout = 0.1
+			if(fd.inWaiting()):
+				fd.read(1000)
+				fd.flush()
+			version = self.get_version(fd)
+		except (IOError,OSError):
+			version = ''
+		if version[:3]!='LTS':
+			fd.close()
+			return None,'not a device'
+		fd.timeout = self.timeout
+		return fd,version
+
+	def __serial_numbers__(self):
+		"""
+		returns a dictionary of port name -> USB serial number for the ports listed by the OS
+		"""
+		try:
+			from serial.tools import list_ports
+			ports = {}
+			for a in list_ports.comports():
+				sn = re.search('SER=(\S+)',a[2])
+				if sn:ports[a[0]] = sn.group(1)
+			return ports
+		except Exception:
+			return {}
+
+	def __cached_port__(self,serials):
+		"""
+		returns the port that the last used device is now connected to, or None
+		"""
+		try:
+			sn,port = open(self.PORT_CACHE).read().split()
+		except (IOError,ValueError):
+			return None
+		for a in serials:
+			if serials[a]==sn:return a	#it may have been re-enumerated on a different port
+		return port
+
+	def __discover__(self):
+		"""
+		Finds a device. The port used last time is tried first, and all the other ports are then probed concurrently.
+		Ports locked by other processes are skipped.
+
+		:return: port name, serial port, version string
+		"""
+		ports = [self.BASE_PORT_NAME+str(a) for a in range(10) if os.path.exists(self.BASE_PORT_NAME+str(a))]
+		serials = self.__serial_numbers__()
+		if self.devnum==1:
+			port = self.__cached_port__(serials)
+			if port in ports:
+				fd,version = self.__probe__(port)
+				if fd is not None:return port,fd,version
+
+		results={}
+		def probe(port):results[port] = self.__probe__(port)
+		threads = [threading.Thread(target=probe,args=(a,)) for a in ports]
+		for a in threads:a.start()
+		for a in threads:a.join()
+
+		found = [a for a in ports if results[a][0] is not None]
+		for a in ports:
+			if results[a][1]=='is taken':print a+' is taken '
+		port = found[self.devnum-1] if len(found)>=self.devnum else None
+		for a in found:
+			if a!=port:results[a][0].close()
+		if port is None:return None,None,''
+		if self.devnum==1:
+			try:open(self.PORT_CACHE,'w').write('%s %s\n'%(serials.get(port,'-'),port))
+			except IOError:pass
+		return port,results[port][0],results[port][1]
+
 	def get_version(self,fd):
-		fd.write(chr(COMMON))
-		fd.write(chr(GET_VERSION))
+		fd.write(struct.pack('BB',COMMON,GET_VERSION))
 		x=fd.readline()
 		return x
 
 	def reconnect(self):
+		if self.transport is not None:
+			self.fd.flushInput()
+			return
 		try:
 			self.fd = serial.Serial(self.portname, 9600, stopbits=1, timeout = 0.1)
 			self.fd.close()
@@ -69,7 +349,7 @@ class Handler(object):
 			print 'connected TestBench'
 		except serial.SerialException as ex:
 			print "failed to connect. Check device connections ,Or\nls /dev/TestBench\nOr, check if symlink has been created in /etc/udev/rules.d/proto.rules for the relevant Vid,Pid"
-			sys.exit(1)
+			raise CommunicationError('failed to connect to '+self.portname)
 			
 		if(self.fd.inWaiting()):
 			self.fd.read(1000)
@@ -80,6 +360,14 @@ class Handler(object):
 		try:self.fd.close()
 		except: pass
 
+	def close(self):
+		"""
+		closes the port, and releases this instance so that the device can be opened again
+		"""
+		try:self.fd.close()
+		except: pass
+		Handler.forget(self)
+
 	def __get_ack__(self):
 		"""
 		fetches the response byte
@@ -88,33 +376,134 @@ class Handler(object):
 		 3 FAILED
 		used as a handshake
 		"""
-		if not self.loadBurst:x=self.fd.read(1)
+		if not self.loadBurst:
+			x=self.fd.read(1)
+			if self.stats is not None:self.stats.ack(x)
 		else:
 			self.inputQueueSize+=1
 			x=1
 		#print x
 		return ord(x)
 
+	def __write__(self,data):
+		"""
+		transmits a string in a single write, or appends it to the burstBuffer if loadBurst is set
+		"""
+		if not self.loadBurst:self.fd.write(data)
+		else: self.burstBuffer+=data
+
+	def __sendCommand__(self,header,command,fmt='',*args):
+		"""
+		assembles the header, command and arguments of a command with struct, and transmits them with a single write.
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		header			command group. e.g. ADC
+		command			command. e.g. CAPTURE_ONE
+		fmt				struct format of the arguments. B : byte , H : integer(2 bytes) , I : long ,16s : string
+		\*args			arguments
+		==============	============================================================================================
+
+		>>> self.H.__sendCommand__(ADC,CAPTURE_ONE,'BHH',chosa,samples,tg)
+		"""
+		if self.stats is not None:self.stats.begin(header,command)
+		self.__write__(self.__packCommand__(header,command,fmt,*args))
+
+	def __packCommand__(self,header,command,fmt='',*args):
+		"""
+		returns the string that __sendCommand__ would transmit
+		"""
+		try:
+			return struct.pack('<BB'+fmt,header,command,*args)
+		except struct.error:	#integers sent as H are truncated to two bytes, as __sendInt__ does
+			args,fixed = list(args),[]
+			for count,code in self.FORMAT_FIELD.findall(fmt):
+				n = 0 if code=='x' else 1 if code in 'sp' else int(count or 1)	#arguments taken by the field
+				fixed+=[a&0xFFFF for a in args[:n]] if code=='H' else args[:n]
+				del args[:n]
+			return struct.pack('<BB'+fmt,header,command,*(fixed+args))
+
+	def transaction(self,priority=None):
+		"""
+		Returns a context manager which gives the calling thread exclusive use of the device.
+		Methods of Interface, I2C etc. are already carried out as transactions. This is
+		required only for grouping several calls, or for talking to the Handler directly.
+
+		>>> with I.H.transaction():
+		... 	I.set_state(SQR1=1)
+		... 	v = I.get_average_voltage('CH5')
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		priority		Threads waiting for the device are served in order of priority, highest first.
+						default: the value set for this thread via :func:`set_priority`
+		==============	============================================================================================
+		"""
+		return Transaction(self.lock,self.priority() if priority is None else priority)
+
+	def set_priority(self,priority):
+		"""
+		sets the default priority of transactions started by the calling thread. default 0.
+		e.g. a GUI timer that polls the device could use -1 , so that it never holds up a capture being fetched by another thread
+		"""
+		self.local.priority = priority
+
+	def priority(self):
+		return getattr(self.local,'priority',0)
+
+	def enable_stats(self):
+		"""
+		Starts recording call counts, bytes transferred, round trip times, acknowledge failures and timeouts
+		for each command. Returns the :class:`wire_stats.WireStats` instance, which is also available as self.stats
+		"""
+		import wire_stats
+		if self.stats is None:
+			self.stats = wire_stats.WireStats()
+			self.fd = wire_stats.MeteredPort(self.fd,self.stats)
+		return self.stats
+
+	def disable_stats(self):
+		"""
+		stops recording, and returns the :class:`wire_stats.WireStats` instance with the data recorded so far
+		"""
+		stats,self.stats = self.stats,None
+		if stats is not None:self.fd = self.fd.fd
+		return stats
+
+	def pipeline(self,max_pending=4096):
+		"""
+		returns a :class:`Pipeline` which queues commands for this device, and transmits them back to back.
+		See :class:`Pipeline` for max_pending
+		"""
+		return Pipeline(self,max_pending)
+
 	def __sendInt__(self,val):
 		"""
 		transmits an integer packaged as two characters
 		:params int val: int to send
 		"""
-		if not self.loadBurst:self.fd.write(InttoString(val))
-		else: self.burstBuffer+=InttoString(val)
+		self.__write__(InttoString(val))
 
 	def __sendByte__(self,val):
 		"""
 		transmits a BYTE
 		val - byte to send
 		"""
-		if(type(val)==int):
-			if not self.loadBurst:self.fd.write(chr(val))
-			else:self.burstBuffer+=chr(val)
-		else:
-			if not self.loadBurst:self.fd.write(val)
-			else:self.burstBuffer+=val
+		if(type(val)==int):self.__write__(chr(val))
+		else:self.__write__(val)
 			
+	def __drain__(self,settle=0.02):
+		"""
+		discards incoming data until none has arrived for settle seconds. e.g. the tail of a stream after it has been stopped
+		"""
+		while True:
+			time.sleep(settle)
+			n = self.fd.inWaiting()
+			if not n:return
+			self.fd.read(n)
+
 	def __getByte__(self):
 		"""
 		reads a byte from the serial port and returns it
@@ -122,8 +511,7 @@ class Handler(object):
 		ss=self.fd.read(1)
 		if len(ss): return ord(ss)
 		else:
-			print 'communication error.'
-			sys.exit(1)
+			raise CommunicationError('no response from the device')
 	
 	def __getInt__(self):
 		"""
@@ -133,8 +521,7 @@ class Handler(object):
 		ss = self.fd.read(2)
 		if len(ss)==2: return ord(ss[0])|(ord(ss[1])<<8)
 		else:
-			print 'communication error.'
-			sys.exit(1)
+			raise CommunicationError('received %d of 2 bytes'%len(ss))
 
 	def __getLong__(self):
 		"""
@@ -146,7 +533,98 @@ class Handler(object):
 		else:
 			print '.'
 			return -1
-	
+
+	def __readInto__(self,view):
+		"""
+		reads len(view) bytes from the serial port straight into a preallocated buffer.
+		view - a writable memoryview (or bytearray) which receives the data
+		returns the number of bytes actually received
+		"""
+		try:
+			n = self.fd.readinto(view)
+		except AttributeError:	#transport without readinto support
+			ss = self.fd.read(len(view))
+			n = len(ss)
+			view[:n] = ss
+		return n
+
+	def __accountChunks__(self,chunks,elapsed,itemsize=2):
+		"""
+		reports chunks fetched through a :class:`Pipeline` to self.chunks , as __fetchChunked__ does for its own.
+		chunks is a list of (items requested,:class:`Reply`). elapsed, the duration of the flush, is shared among them by size
+		"""
+		total = float(sum([reply.size for n,reply in chunks])) or 1.
+		for n,reply in chunks:
+			if reply.value is not None:self.chunks.success(n,n*itemsize,elapsed*reply.size/total)
+			else:self.chunks.failure(n,elapsed*reply.size/total)
+
+	def __fetchChunked__(self,blocks,itemsize=2,retries=3,window=2):
+		"""
+		Reads blocks of items, for instance all the channels of a capture, in chunks sized by self.chunks .
+		The request for the next chunk is transmitted before the current one has been read, so that the device
+		does not sit idle for a round trip between chunks. At most window chunks are outstanding at a time.
+		Replies to outstanding requests are not self delimiting. If one of them is cut short, the next chunk appears to
+		complete using bytes of the reply that followed it, and the shortfall only shows up as a timeout later on.
+		A chunk is therefore trusted only once a chunk read after it arrived intact with no requests outstanding.
+		After a timeout, everything since the last such point is requested again, one chunk at a time, after
+		clearing the input buffer.
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		blocks			list of (view,count,request). view is a writable memoryview which receives count items.
+						request(offset,n) returns the (header,command,fmt,\*args) of the command which fetches n items
+						starting at offset. The device must reply with the items, followed by an acknowledge
+		itemsize		bytes per item. default 2
+		retries			attempts per chunk before giving up. default 3
+		window			maximum number of chunks requested ahead. default 2
+		==============	============================================================================================
+
+		:return: nothing. Raises CommunicationError if a chunk could not be fetched
+
+		>>> request = lambda offset,n:(COMMON,RETRIEVE_BUFFER,'HH',offset,n)
+		>>> self.H.__fetchChunked__([(memoryview(self.raw_buffer),5000,request)])
+		"""
+		pending = collections.deque([[view,count,request,0] for view,count,request in blocks if count])	#block, and offset of the next request
+		outstanding = collections.deque()
+		unverified = []	#chunks read while others were outstanding
+		failures,last = 0,0
+		while pending or outstanding:
+			while pending and len(outstanding)<window:
+				block = pending[0]
+				view,count,request,offset = block
+				n = self.chunks.next(count-offset)
+				args = request(offset,n)
+				if self.stats is not None:self.stats.begin(*args[:2])
+				self.fd.write(self.__packCommand__(*args))
+				outstanding.append((block,offset,n,args[:2],time.time()))
+				block[3]+=n
+				if block[3]>=count:pending.popleft()
+			block,offset,n,key,sent = outstanding.popleft()
+			if self.stats is not None:self.stats.current,self.stats.started = self.stats.record(key),sent
+			received = self.__readInto__(block[0][offset*itemsize:(offset+n)*itemsize])
+			ack = self.fd.read(1) if received==n*itemsize else ''
+			if self.stats is not None:self.stats.ack(ack)
+			if len(ack):
+				now = time.time()
+				self.chunks.success(n,n*itemsize,now-max(sent,last))
+				failures,last = 0,now
+				if outstanding:unverified.append((block,offset))
+				else:unverified = []
+				continue
+			self.chunks.failure(n,time.time()-max(sent,last))
+			failures+=1
+			if failures>retries:
+				raise CommunicationError('received %d of %d bytes'%(offset*itemsize+received,block[1]*itemsize))
+			print 'communication error. received %d of %d bytes. retrying'%(received,n*itemsize)
+			self.fd.flushInput()
+			lost = unverified+[(block,offset)]+[(a[0],a[1]) for a in outstanding]	#rewind the blocks to the first suspect chunk
+			unverified = []
+			outstanding.clear()
+			for block,offset in reversed(lost):
+				if not any(a is block for a in pending):pending.appendleft(block)
+				block[3] = offset
+			window,last = 1,0
 
 	def sendBurst(self):
 		"""
@@ -185,9 +663,162 @@ class Handler(object):
 
 		:return: nothing
 		"""
-		self.__sendByte__(UART_2)
-		self.__sendByte__(SEND_CHAR)
-		self.__sendByte__(c)
+		self.__sendCommand__(UART_2,SEND_CHAR,'B',c)
 		self.__get_ack__()
 
-		
+
+
+class Reply(object):
+	"""
+	Response to a command queued in a :class:`Pipeline`.
+	value and ack are filled in when the pipeline is flushed.
+
+	==============	============================================================================================
+	**Attributes** 
+	==============	============================================================================================
+	value			the unpacked reply. A single number, a tuple for mixed formats such as 'HII',
+					or a numpy array for blocks such as '2500H'. None if there was no reply, or it was not received
+	ack				the acknowledge byte. None if the command has no acknowledge
+	done			True once the pipeline has been flushed
+	==============	============================================================================================
+	"""
+	BLOCK = re.compile(r'^(\d+)([BHIbhi])$')
+	DTYPES = {'B':'<u1','H':'<u2','I':'<u4','b':'<i1','h':'<i2','i':'<i4'}
+	def __init__(self,pipeline,fmt,ack):
+		self.pipeline = pipeline
+		self.fmt = fmt
+		self.has_ack = ack
+		self.size = struct.calcsize('<'+fmt)+(1 if ack else 0)
+		self.value = None
+		self.ack = None
+		self.done = False
+
+	def __decode__(self,data):
+		if self.fmt:
+			block = self.BLOCK.match(self.fmt)
+			if block and int(block.group(1))>1:
+				self.value = np.frombuffer(data,dtype=np.dtype(self.DTYPES[block.group(2)]),count=int(block.group(1))).copy()
+			else:
+				self.value = struct.unpack_from('<'+self.fmt,data)
+				if len(self.value)==1:self.value = self.value[0]
+		if self.has_ack:self.ack = ord(data[self.size-1])
+		self.done = True
+
+	def result(self):
+		"""
+		flushes the pipeline if required, and returns the value
+		"""
+		if not self.done:self.pipeline.flush()
+		return self.value
+
+
+class Pipeline(object):
+	"""
+	Queues commands, transmits them back to back with a single write, and then reads their replies in order.
+	This saves one round trip per command compared to calling them one after the other.
+
+	>>> P = I.H.pipeline()
+	>>> states = P.command(DIN,GET_STATES,reply='B')
+	>>> summed = P.command(ADC,GET_VOLTAGE_SUMMED,'B',3,reply='HH')
+	>>> P.flush()
+	>>> print states.value,summed.value
+
+	It can also be used as a context manager, which flushes it on exit
+
+	>>> with I.H.pipeline() as P:
+	... 	data = P.command(COMMON,RETRIEVE_BUFFER,'HH',0,2500,reply='2500H')
+	>>> print data.value[:10]
+
+	When flushed, commands are written as long as the replies outstanding ahead of them come to no more than
+	max_pending bytes, so that the device never blocks on a full transmit buffer while the host is still writing.
+	The rest are written as the replies are read, without waiting for the outstanding ones to complete.
+	A command is therefore written together with the ones before it only if their replies fit in max_pending .
+	Pass max_pending=None to write all of them at once, for instance to send a command right behind large transfers.
+	Unlike loadBurst/sendBurst, replies with data are supported.
+
+	==============	============================================================================================
+	**Arguments** 
+	==============	============================================================================================
+	H				:class:`Handler`
+	max_pending		bytes of replies which may be outstanding when a command is written. default 4096. None for no limit
+	==============	============================================================================================
+	"""
+	def __init__(self,H,max_pending=4096):
+		self.H = H
+		self.max_pending = max_pending
+		self.commands = []
+		self.replies = []
+		self.keys = []
+		self.pending = 0
+		self.elapsed = 0.	#duration of the last flush, in seconds
+
+	def command(self,header,command,fmt='',*args,**kwargs):
+		"""
+		Queues a command, and returns a :class:`Reply`
+
+		==============	============================================================================================
+		**Arguments** 
+		==============	============================================================================================
+		header			command group. e.g. ADC
+		command			command. e.g. GET_VOLTAGE_SUMMED
+		fmt				struct format of the arguments, as used by Handler.__sendCommand__
+		\*args			arguments
+		\*\*kwargs
+		reply			struct format of the reply, excluding the acknowledge. e.g. 'B','HII','2500H'. default ''
+		ack				False for the few commands which do not return an acknowledge. default True
+		==============	============================================================================================
+		"""
+		reply = Reply(self,kwargs.get('reply',''),kwargs.get('ack',True))
+		self.commands.append(self.H.__packCommand__(header,command,fmt,*args))
+		self.keys.append((header,command))
+		self.replies.append(reply)
+		self.pending+=reply.size
+		return reply
+
+	def flush(self):
+		"""
+		transmits the queued commands, and resolves their replies in order.
+		returns the list of values
+		"""
+		if not self.commands:return []
+		replies,pending = self.replies,self.pending
+		commands,keys = self.commands,self.keys
+		self.commands,self.replies,self.keys,self.pending = [],[],[],0
+		sizes = np.array([a.size for a in replies])
+		ends = np.cumsum(sizes)
+		starts = ends-sizes
+		limit = pending if self.max_pending is None else self.max_pending
+		data = bytearray(pending)
+		view = memoryview(data)
+		sent,received = 0,0
+		with self.H.transaction():
+			stats = self.H.stats
+			if stats is not None:stats.current = None	#accounted for separately
+			started = time.time()
+			while True:
+				first = sent
+				while sent<len(commands) and (ends[sent]-received<=limit or starts[sent]==received):sent+=1	#always one, once the replies ahead of it have been read
+				if sent>first:self.H.fd.write(''.join(commands[first:sent]))
+				if sent==len(commands):target = pending
+				else:target = min(ends[sent-1],max(ends[sent]-limit,received+1))	#enough to let the next one go
+				if target>received:
+					got = self.H.__readInto__(view[received:target])
+					received+=got
+					if received<target:break	#the rest is not sent. It would only be answered once the missing bytes have gone by
+				if sent==len(commands) and received>=pending:break
+			self.elapsed = time.time()-started
+		if received<pending:print 'communication error. received %d of %d bytes'%(received,pending)
+		data = str(data)
+		position = 0
+		for reply in replies:
+			if position+reply.size<=received:reply.__decode__(data[position:position+reply.size])
+			else: reply.done = True
+			position+=reply.size
+		if stats is not None:stats.batch([(k[0],k[1],len(c),r) for k,c,r in zip(keys,commands,replies)],received,self.elapsed)
+		return [a.value for a in replies]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,exc_type,exc_value,traceback):
+		if exc_type is None:self.flush()
@@ -0,0 +1,597 @@
+'''
+Long recordings written straight to disk
+
+A Recorder appends raw samples to a memory-mapped file, which is sized in advance for the whole recording.
+Copying each block into the map is all that the acquisition has to wait for. Flushing to disk happens on a
+thread of its own, and the sample count in the file is only advanced once the samples are on disk.
+The calibration in use is saved in the file, so that a recording made with the streaming ADC or with
+repeated captures can be converted to volts later without the device.
+
+>>> from Labtools import recorder
+>>> R = recorder.record_stream(I,'run1.lts',25,'CH1',samples=36000000)	#one hour at 10 kSPS
+>>> ...
+>>> R.stop()
+
+>>> R = recorder.record_captures(I,'run2.lts',2,1000,10,count=3600,interval=1)	#a pair of traces every second
+>>> R.wait()
+
+Recordings are opened lazily. Only the parts that are sliced are read from disk.
+
+>>> rec = recorder.Recording('run1.lts')
+>>> print len(rec),rec.channels
+>>> v = rec.volts(1000000,1010000)			#calibrated, for the first channel
+>>> t = rec.times(1000000,1010000)			#seconds since the epoch
+>>> start,count,timestamp = rec.index[5]	#the 6th block
+
+File layout: a 64 byte prelude (magic, header length, sample and block counts), a JSON header,
+a calibration table for each channel (float64 voltage for each raw code), the block index
+(first sample, count, timestamp) and the samples, with one column per channel.
+
+The logic analyzer is recorded as a chain of captures, each of which is fetched and restarted as soon as
+a channel fills up. The edges of all captures are placed on one 64-bit timeline, in counts of the 64MHz clock.
+
+>>> R = recorder.record_LA(I,'bus')
+>>> ...
+>>> R.stop()
+>>> rec = recorder.EdgeRecording('bus')
+>>> t = rec.ticks('ID1')			#every edge of ID1
+>>> print rec.gaps()				#(start,end) of the intervals between captures
+>>> frames = decoders.uart(rec.line('ID1',3),9600)	#the 4th capture
+
+An edge recording is a directory with a JSON header, a file of int64 edge times for each channel, and the
+segment table (start, end, host time, initial states, first edge and edge count of each channel) for each capture.
+'''
+import os,json,struct,threading,time
+import numpy as np
+from digital_channel import digital_channel_names
+
+MAGIC = 'LTSREC01'
+PRELUDE = struct.Struct('<8sI4xQQ')	#magic, header length, samples, blocks
+PRELUDE_SIZE = 64
+INDEX = np.dtype([('start','<u8'),('count','<u4'),('time','<f8')])
+
+def align(n,page=4096):
+	return (n+page-1)//page*page
+
+class Flushing(object):
+	'''
+	calls flush() on a thread of its own whenever dirty is set, at most once per flush_interval seconds, until close()
+	'''
+	def __start_flusher__(self,flush_interval):
+		self.error = None
+		self.closed = threading.Event()
+		self.dirty = threading.Event()
+		self.flush_interval = flush_interval
+		self.flusher = threading.Thread(target=self.__flush_loop__)
+		self.flusher.daemon = True
+		self.flusher.start()
+
+	def __flush_loop__(self):
+		while not self.closed.is_set():
+			self.dirty.wait()
+			if self.closed.is_set():break
+			self.dirty.clear()
+			try:
+				self.flush()
+			except Exception as e:
+				self.error = e
+			self.closed.wait(self.flush_interval)	#at most one flush per interval
+
+	def __stop_flusher__(self):
+		'''
+		stops the flushing thread, and writes out whatever is left. Returns False if it was already stopped
+		'''
+		if self.closed.is_set():return False
+		self.closed.set()
+		self.dirty.set()
+		self.flusher.join()
+		self.flush()
+		return True
+
+class Recorder(Flushing):
+	"""
+	Writes blocks of raw samples to a new recording
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	filename		file to create. An existing file is overwritten
+	capacity		number of samples (per channel) that the file has room for
+	channels		list of dictionaries describing each channel. {'name':'CH1','gain':0,'resolution':10}
+	tables			calibration table for each channel. Voltage for each raw code
+	\*\*kwargs
+	timebase		time between samples, in uS. default 1
+	dtype			numpy dtype of the raw samples. default '<u2'
+	max_blocks		room in the block index. default capacity/100
+	flush_interval	seconds between flushes to disk. default 1
+	source			description stored in the header. e.g. 'stream' , 'capture'
+	==============	============================================================================================
+	"""
+	def __init__(self,filename,capacity,channels,tables,**kwargs):
+		self.filename = filename
+		self.capacity = capacity
+		self.channels = channels
+		self.dtype = np.dtype(kwargs.get('dtype','<u2'))
+		max_blocks = kwargs.get('max_blocks',max(capacity/100,1000))
+		header = {'channels':channels,'timebase':kwargs.get('timebase',1.),'dtype':self.dtype.str,
+			'capacity':capacity,'max_blocks':max_blocks,'table_length':len(tables[0]),
+			'source':kwargs.get('source',''),'created':time.time()}
+		offset = align(PRELUDE_SIZE+len(json.dumps(header))+200)	#room for the offsets themselves
+		header['tables_offset'] = offset
+		offset = align(offset+8*len(tables)*len(tables[0]))
+		header['index_offset'] = offset
+		offset = align(offset+INDEX.itemsize*max_blocks)
+		header['data_offset'] = offset
+		text = json.dumps(header)
+		size = offset+capacity*len(channels)*self.dtype.itemsize
+		with open(filename,'wb') as f:
+			f.write(PRELUDE.pack(MAGIC,len(text),0,0).ljust(PRELUDE_SIZE,'\0')+text)
+			f.truncate(size)	#sparse. Disk space is taken up as samples are written
+		self.file = open(filename,'r+b')
+		self.map = np.memmap(self.file,dtype=np.uint8,mode='r+')
+		self.map[header['tables_offset']:header['tables_offset']+8*len(tables)*len(tables[0])] = np.array(tables,dtype='<f8').view(np.uint8).ravel()
+		self.index = self.map[header['index_offset']:header['index_offset']+INDEX.itemsize*max_blocks].view(INDEX)
+		self.data = self.map[offset:size].view(self.dtype).reshape(capacity,len(channels))
+		self.header = header
+		self.samples = 0
+		self.blocks = 0
+		self.__start_flusher__(kwargs.get('flush_interval',1.))
+
+	def full(self):
+		return self.samples>=self.capacity or self.blocks>=len(self.index)
+
+	def append(self,codes,timestamp=None):
+		"""
+		appends a block of raw samples. codes is an array of samples for a single channel, or
+		a 2-D array with one row per channel. Returns the number of samples stored, which is less than
+		the length of the block if the file is full.
+		"""
+		codes = np.asarray(codes)
+		if codes.ndim==1:codes = codes[None,:]
+		n = min(codes.shape[1],self.capacity-self.samples)
+		if n<=0 or self.blocks>=len(self.index):return 0
+		self.data[self.samples:self.samples+n] = codes[:,:n].T
+		self.index[self.blocks] = (self.samples,n,time.time() if timestamp is None else timestamp)
+		self.samples+=n
+		self.blocks+=1
+		self.dirty.set()
+		return n
+
+	def flush(self):
+		"""
+		writes the samples appended so far to disk, and then records their number in the file
+		"""
+		blocks = self.blocks	#samples are stored before their block is, so count them from the index
+		samples = int(self.index[blocks-1]['start']+self.index[blocks-1]['count']) if blocks else 0
+		self.map.flush()
+		os.fsync(self.file.fileno())
+		self.map[:PRELUDE.size] = np.frombuffer(PRELUDE.pack(MAGIC,len(json.dumps(self.header)),samples,blocks),dtype=np.uint8)
+		self.map.flush()
+
+	def close(self):
+		"""
+		stops the flushing thread, and writes out whatever is left
+		"""
+		if not self.__stop_flusher__():return
+		self.data = self.index = self.map = None
+		self.file.close()
+		if self.error is not None:raise self.error
+
+class Recording(object):
+	"""
+	Reads a file written by :class:`Recorder`. The header is read when the file is opened, and samples are
+	read from disk only when they are sliced. len() is the number of samples per channel, and grows as a
+	recording that is still in progress is flushed. Call :func:`refresh` to pick up new samples.
+	"""
+	def __init__(self,filename):
+		self.filename = filename
+		with open(filename,'rb') as f:
+			magic,length,self.samples,self.blocks = PRELUDE.unpack(f.read(PRELUDE.size))
+			if magic!=MAGIC:raise IOError('%s is not a recording'%filename)
+			f.seek(PRELUDE_SIZE)
+			self.header = json.loads(f.read(length))
+		self.channels = [a['name'] for a in self.header['channels']]
+		self.timebase = self.header['timebase']
+		self.__map = None
+
+	def __mapped__(self):
+		if self.__map is None:self.__map = np.memmap(self.filename,dtype=np.uint8,mode='r')
+		return self.__map
+
+	def refresh(self):
+		self.samples,self.blocks = PRELUDE.unpack(self.__mapped__()[:PRELUDE.size].tostring())[2:]
+
+	def __len__(self):
+		return self.samples
+
+	@property
+	def tables(self):
+		h = self.header
+		start,count = h['tables_offset'],len(self.channels)*h['table_length']
+		return self.__mapped__()[start:start+8*count].view('<f8').reshape(len(self.channels),h['table_length'])
+
+	@property
+	def index(self):
+		"""
+		array of (first sample, count, timestamp) for each block
+		"""
+		start = self.header['index_offset']
+		return self.__mapped__()[start:start+INDEX.itemsize*self.blocks].view(INDEX)
+
+	@property
+	def data(self):
+		"""
+		raw samples, with one column per channel
+		"""
+		h = self.header
+		dtype = np.dtype(h['dtype'])
+		start = h['data_offset']
+		return self.__mapped__()[start:start+h['capacity']*len(self.channels)*dtype.itemsize].view(dtype).reshape(h['capacity'],len(self.channels))[:self.samples]
+
+	def raw(self,start=0,stop=None,channel=0):
+		"""
+		raw samples start to stop of a channel (index, or name)
+		"""
+		if not isinstance(channel,int):channel = self.channels.index(channel)
+		return self.data[start:stop,channel]
+
+	def volts(self,start=0,stop=None,channel=0):
+		"""
+		samples start to stop of a channel (index, or name), converted to volts with the calibration saved in the file
+		"""
+		if not isinstance(channel,int):channel = self.channels.index(channel)
+		return np.take(self.tables[channel],self.raw(start,stop,channel),mode='clip')
+
+	def times(self,start=0,stop=None):
+		"""
+		acquisition time of samples start to stop, from the timestamp of the block each of them belongs to
+		"""
+		n = np.arange(*slice(start,stop).indices(self.samples))
+		index = self.index
+		block = np.searchsorted(index['start'],n,side='right')-1
+		return index['time'][block]+(n-index['start'][block])*self.timebase*1e-6
+
+	def block(self,n,channel=0):
+		"""
+		returns the timestamp and voltages of block n
+		"""
+		start,count,timestamp = self.index[n]
+		return timestamp,self.volts(start,start+count,channel)
+
+class Feeder(object):
+	"""
+	Runs fn(feeder) in a loop on a thread of its own until it returns False, the file is full, or stop() is called.
+	Returned by :func:`record_stream` and :func:`record_captures`
+	"""
+	def __init__(self,fn,cleanup=None):
+		self.fn = fn
+		self.cleanup = cleanup
+		self.recorder = None
+		self.stopping = False
+		self.error = None
+		self.thread = threading.Thread(target=self.__run__)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def __run__(self):
+		try:
+			while not self.stopping and self.fn(self) is not False:
+				if self.recorder is not None and self.recorder.full():break
+		except Exception as e:
+			self.error = e
+		finally:
+			try:
+				if self.cleanup:self.cleanup()
+			except Exception as e:
+				if self.error is None:self.error = e
+			if self.recorder is not None:self.recorder.close()
+
+	def wait(self,timeout=None):
+		"""
+		waits until the recording is complete. Returns True if it is
+		"""
+		self.thread.join(timeout)
+		if self.error is not None:raise self.error
+		return not self.thread.is_alive()
+
+	def stop(self):
+		"""
+		ends the recording, and closes the file
+		"""
+		self.stopping = True
+		return self.wait()
+
+def record_stream(I,filename,tg,channel='CH1',samples=1<<24,block_size=4096,**kwargs):
+	"""
+	Streams a channel to filename with a :class:`stream_reader.StreamReader`, until samples have been
+	recorded or stop() is called. Returns a :class:`Feeder`
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	I				:class:`Labtools.interface.Interface`
+	filename		file to create
+	tg				timegap. 250KHz clock
+	channel			channel 'CH1'... 'CH9','IN1','SEN'
+	samples			size of the recording. default 1<<24
+	block_size		samples appended to the file at a time. default 4096
+	\*\*kwargs		passed on to :class:`Recorder`
+	==============	============================================================================================
+	"""
+	S = I.stream_reader(tg,channel)
+	kwargs.setdefault('max_blocks',samples/block_size+1)
+	rec = Recorder(filename,samples,[{'name':channel,'gain':I.__channelGain__(channel),'resolution':8}],[S.table],
+		timebase=S.dt*1e6,dtype='u1',source='stream',**kwargs)
+	def fn(F):
+		first = S.started+S.stream_index(S.consumed)*S.dt	#nominal time of the first sample, counting those lost to overruns
+		codes = S.read_codes(block_size,timeout=0.5)
+		if codes is None:return not S.finished
+		rec.append(codes,first)
+	F = Feeder(fn,S.stop)
+	F.recorder = rec
+	F.stream = S
+	return F
+
+def record_captures(I,filename,num,samples,tg,count=None,interval=0,channel_one_input='CH1',**kwargs):
+	"""
+	Records count captures(default: until the file is full or stop() is called) made with :func:`interface.Interface.capture_traces`,
+	starting one every interval seconds. Returns a :class:`Feeder`
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	I				:class:`Labtools.interface.Interface`
+	filename		file to create
+	num,samples,tg	number of channels, samples per channel and timegap(uS). See :func:`interface.Interface.capture_traces`
+	count			number of captures. default: 1000 , or as many as capacity allows
+	interval		seconds between the start of successive captures. default 0
+	\*\*kwargs		capacity (samples per channel) and others passed on to :class:`Recorder`
+	==============	============================================================================================
+	"""
+	capacity = kwargs.pop('capacity',samples*(count or 1000))
+	kwargs.setdefault('max_blocks',capacity/samples+1)
+	state = {'done':0,'next':time.time()}
+	def fn(F):
+		if count is not None and state['done']>=count:return False
+		time.sleep(max(0,state['next']-time.time()))
+		state['next'] = time.time()+interval
+		started = time.time()
+		I.capture_traces(num,samples,tg,channel_one_input)
+		I.wait_for_capture()
+		I.fetch_traces()
+		chans = I.achans[:num]
+		if F.recorder is None:
+			F.recorder = Recorder(filename,capacity,[{'name':a.name,'gain':a.gain,'resolution':a.resolution} for a in chans],
+				[a.lookup_table() for a in chans],timebase=I.timebase,source='capture',**kwargs)
+		F.recorder.append(I.buff[:num*samples].reshape(num,samples),started)
+		state['done']+=1
+	return Feeder(fn)
+
+CLOCK = 64e6	#edge times are stored in counts of the 64MHz logic analyzer clock
+TICKS = [1,8,64,256]	#clock counts per timer count, for each prescaler
+
+def segment_dtype(channels):
+	return np.dtype([('start','<i8'),('end','<i8'),('time','<f8'),('states','u1'),
+		('first','<u8',(channels,)),('count','<u4',(channels,))])
+
+class EdgeRecorder(Flushing):
+	"""
+	Writes the edges of chained logic analyzer captures to a new directory, with one column per channel.
+	Edge times are 64-bit counts of the 64MHz clock since the start of the recording.
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	path			directory to create. Existing files in it are overwritten
+	channels		names of the channels. e.g. ['ID1','ID2','ID3','ID4']
+	length			number of edges each channel of a capture has room for
+	\*\*kwargs
+	max_segments	number of captures after which the recording is full. default None(no limit)
+	flush_interval	seconds between flushes to disk. default 1
+	source			description stored in the header
+	==============	============================================================================================
+
+	Each capture is a segment, recorded as (start, end, host time, initial states, first edge, edge count).
+	The logic analyzer is blind between the end of one segment and the start of the next.
+	"""
+	def __init__(self,path,channels,length,**kwargs):
+		if not os.path.isdir(path):os.makedirs(path)
+		self.path = path
+		self.channels = channels
+		self.length = length
+		self.max_segments = kwargs.get('max_segments',None)
+		self.header = {'channels':channels,'length':length,'clock':CLOCK,'dtype':'<i8',
+			'source':kwargs.get('source',''),'created':time.time()}
+		with open(os.path.join(path,'header.json'),'w') as f:json.dump(self.header,f)
+		self.files = [open(os.path.join(path,a+'.edges'),'wb') for a in channels]
+		self.segment_file = open(os.path.join(path,'segments'),'wb')
+		self.dtype = segment_dtype(len(channels))
+		self.edges = [0]*len(channels)
+		self.end = 0	#the next segment cannot start before this
+		self.segments = 0
+		self.pending = []	#segment records, held back until their edges are on disk
+		self.lock = threading.Lock()
+		self.__start_flusher__(kwargs.get('flush_interval',1.))
+
+	def full(self):
+		return self.max_segments is not None and self.segments>=self.max_segments
+
+	def append(self,start,end,edges,states,timestamp=None):
+		"""
+		appends a segment.
+
+		==============	============================================================================================
+		**Arguments**
+		==============	============================================================================================
+		start,end		clock counts at which the capture was started and fetched. start is moved forward if
+						it would overlap the previous segment
+		edges			array of edge times for each channel, in clock counts from start
+		states			initial state of each channel. e.g. [1,0,1,1]
+		timestamp		host time at which the capture was started. default now
+		==============	============================================================================================
+
+		Returns the segment record
+		"""
+		record = np.zeros(1,dtype=self.dtype)[0]
+		start = max(int(start),self.end)
+		with self.lock:
+			for n,(f,e) in enumerate(zip(self.files,edges)):
+				e = start+np.asarray(e,dtype='<i8')
+				f.write(e.tostring())
+				record['first'][n],record['count'][n] = self.edges[n],len(e)
+				self.edges[n]+=len(e)
+				if len(e):end = max(end,e[-1])
+			self.end = max(int(end),start)
+			record['start'],record['end'] = start,self.end
+			record['time'] = time.time() if timestamp is None else timestamp
+			record['states'] = sum([(1<<n) for n,a in enumerate(states) if a])
+			self.pending.append(record.copy())
+			self.segments+=1
+		self.dirty.set()
+		return record
+
+	def flush(self):
+		"""
+		writes the edges appended so far to disk, and then the records of their segments
+		"""
+		with self.lock:
+			pending,self.pending = self.pending,[]
+			for f in self.files:f.flush()
+		for f in self.files:os.fsync(f.fileno())
+		if pending:
+			self.segment_file.write(np.array(pending,dtype=self.dtype).tostring())
+			self.segment_file.flush()
+			os.fsync(self.segment_file.fileno())
+
+	def close(self):
+		"""
+		stops the flushing thread, and writes out whatever is left
+		"""
+		if not self.__stop_flusher__():return
+		for f in self.files+[self.segment_file]:f.close()
+		if self.error is not None:raise self.error
+
+class EdgeRecording(object):
+	"""
+	Reads a directory written by :class:`EdgeRecorder`. Edges are read from disk only when they are sliced.
+	len() is the number of segments on disk. Call :func:`refresh` to pick up the segments of a recording in progress.
+	"""
+	def __init__(self,path):
+		self.path = path
+		with open(os.path.join(path,'header.json')) as f:self.header = json.load(f)
+		self.channels = [str(a) for a in self.header['channels']]
+		self.clock = self.header['clock']
+		self.dtype = segment_dtype(len(self.channels))
+		self.refresh()
+
+	def refresh(self):
+		self.segments = np.fromfile(os.path.join(self.path,'segments'),dtype=self.dtype)
+		self.__maps = {}
+
+	def __len__(self):
+		return len(self.segments)
+
+	def __channel__(self,channel):
+		return channel if isinstance(channel,int) else self.channels.index(channel)
+
+	def ticks(self,channel,segment=None):
+		"""
+		edge times of a channel (index, or name), in clock counts since the start of the recording.
+		All segments, or only the given one
+		"""
+		n = self.__channel__(channel)
+		if n not in self.__maps:
+			filename = os.path.join(self.path,self.channels[n]+'.edges')
+			self.__maps[n] = np.memmap(filename,dtype='<i8',mode='r') if os.path.getsize(filename) else np.zeros(0,dtype='<i8')
+		if segment is None:
+			if not len(self.segments):return self.__maps[n][:0]
+			last = self.segments[-1]
+			return self.__maps[n][:last['first'][n]+last['count'][n]]
+		s = self.segments[segment]
+		return self.__maps[n][s['first'][n]:s['first'][n]+s['count'][n]]
+
+	def times(self,channel,segment=None):
+		"""
+		edge times of a channel in seconds since the start of the recording
+		"""
+		return self.ticks(channel,segment)/self.clock
+
+	def gaps(self,channel=None):
+		"""
+		intervals (start,end) in clock counts during which edges were not recorded, between successive segments.
+		For a channel, an interval begins at its last edge if it ran out of room before the segment was fetched
+		"""
+		s = self.segments
+		start,end = s['end'][:-1].copy(),s['start'][1:]
+		if channel is not None and len(s)>1:
+			n = self.__channel__(channel)
+			filled = np.flatnonzero(s['count'][:-1,n]>=self.header['length'])
+			if len(filled):start[filled] = self.ticks(n)[(s['first'][filled,n]+s['count'][filled,n]-1).astype(int)]
+		gaps = np.empty((len(start),2),dtype='<i8')
+		gaps[:,0],gaps[:,1] = start,end
+		return gaps[gaps[:,1]>gaps[:,0]]
+
+	def line(self,channel,segment=None):
+		"""
+		(initial state, edge times in uS since the start of the recording) of a channel, for use with :mod:`Labtools.decoders`.
+		The initial state is that of the first segment, or of the given one. Edges are not recorded in the gaps
+		between segments, so decode one segment at a time unless the gaps are known to be quiet
+		"""
+		n = self.__channel__(channel)
+		if not len(self.segments):return 0,np.zeros(0)
+		initial = (int(self.segments[0 if segment is None else segment]['states'])>>n)&1
+		return initial,self.ticks(n,segment)*(1e6/self.clock)
+
+def record_LA(I,path,start=None,segment=1.,count=None,poll=0.01,**kwargs):
+	"""
+	Records the logic analyzer continuously to path, as a chain of captures. Each capture is fetched as soon as
+	a channel has filled its buffer, or after segment seconds, and the logic analyzer is started again with the same
+	settings in the same write. Returns a :class:`Feeder` . Read the result with :class:`EdgeRecording`
+
+	>>> R = recorder.record_LA(I,'bus',lambda:I.start_four_channel_LA(trigger=0))
+	>>> ...
+	>>> R.stop()
+
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	I				:class:`Labtools.interface.Interface`
+	path			directory to create
+	start			function which starts the logic analyzer, without a trigger.
+					default: all four channels, every edge
+	segment			longest time in seconds between fetches. default 1
+	count			number of captures. default: until stop() is called
+	poll			seconds between checks of the progress of a capture. default 0.01
+	\*\*kwargs		passed on to :class:`EdgeRecorder`
+	==============	============================================================================================
+
+	Edges are placed on the timeline of the host clock, at the time each capture was started. 16-bit timestamps
+	roll over, so in the four channel mode every channel must have an edge at least once per rollover (1mS at 64MHz).
+	"""
+	if start is None:start = lambda:I.start_four_channel_LA(trigger=0)
+	start()
+	origin = armed = time.time()
+	chans = I.dchans[:I.digital_channels_in_buffer]
+	length = chans[0].length
+	R = EdgeRecorder(path,[a.name or digital_channel_names[a.channel_number] for a in chans],length,source='LA',**kwargs)
+	state = {'armed':armed}		#host time at which the running capture was started. None once it has been stopped
+	def store(data,rearm):
+		fetched = time.time()
+		timestamps = I.fetch_LA_rearm(data,rearm)
+		armed,state['armed'] = state['armed'],(time.time() if rearm else None)	#the restart went out with the fetch
+		edges = [np.rint(t*TICKS[a.prescaler]) for a,t in zip(chans,timestamps)]
+		R.append((armed-origin)*CLOCK,(fetched-origin)*CLOCK,edges,data[4][:len(chans)],armed)
+	def fn(F):
+		while True:
+			data = I.get_LA_progress()	#empty channels report 0, rather than a full buffer
+			progress = [data[a.channel_number*2 if a.datatype=='long' else a.channel_number] for a in chans]
+			if max(progress)>=length or time.time()-state['armed']>=segment:break
+			if F.stopping:return False
+			time.sleep(poll)
+		store(data,count is None or R.segments+1<count)
+		return state['armed'] is not None
+	def cleanup():
+		if state['armed'] is not None and not R.full():store(I.get_LA_progress(),False)
+	F = Feeder(fn,cleanup)
+	F.recorder = R
+	return F
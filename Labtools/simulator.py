@@ -0,0 +1,839 @@
+'''
+Simulated LabToolSuite hardware.
+
+SimulatedDevice emulates the firmware command set described in commands_proto so that the
+host side libraries can be exercised without a board. It behaves like a serial port, and can
+be handed to packet_handler.Handler directly,
+
+>>> from Labtools import interface,simulator
+>>> I = interface.Interface(transport=simulator.SimulatedDevice())
+>>> print I.get_average_voltage('CH4')
+
+or exposed as a pseudo terminal for code that insists on opening a port by name
+
+>>> port = simulator.serve_pty(bandwidth=100e3,latency=1e-3)
+>>> I = interface.Interface(port=port)
+
+Link bandwidth (bytes/second) and per-transaction latency (seconds) are configurable, and the
+ADC/logic analyzer timing follows the requested timebases, so capture rates and fetch latencies
+measured against it are meaningful. Analog inputs are functions of time returning volts. Digital
+inputs are square waves described by (frequency,duty cycle).
+'''
+from commands_proto import *
+import numpy as np
+import collections,functools,struct,threading,time,os
+
+def sine(amplitude,frequency,offset=0.,phase=0.):
+	return lambda t: offset+amplitude*np.sin(2*np.pi*frequency*t+phase)
+
+def triangle(amplitude,frequency,offset=0.):
+	return lambda t: offset+amplitude*(4*np.abs((t*frequency)%1-0.5)-1)
+
+def square(amplitude,frequency,offset=0.,duty_cycle=0.5):
+	return lambda t: offset+amplitude*np.where((t*frequency)%1<duty_cycle,1.,-1.)
+
+def dc(value):
+	return lambda t: value+0.*t
+
+DEFAULT_ANALOG_INPUTS = {'CH1':sine(2.,1e3),'CH2':triangle(1.,2e3),'CH3':square(1.5,500.),'CH4':sine(3.,250.,0.5),
+	'CH5':dc(1.),'CH6':dc(1.5),'CH7':dc(2.),'CH8':dc(2.5),'CH9':dc(3.),'5V':dc(5.),'PCS':dc(0.),'9V':dc(9.),
+	'IN1':dc(0.6),'SEN':dc(1.65),'TEMP':dc(0.7365)}
+
+DEFAULT_DIGITAL_INPUTS = {'ID1':(1e3,0.5),'ID2':(2e3,0.25),'ID3':(5e2,0.5),'ID4':(1e4,0.5),'LMETER':(1.5491e6,0.5),'CH4':(250.,0.5)}
+
+BIPOLARS = ['CH1','CH2','CH3','CH4']
+UNIPOLARS = ['CH5','CH6','CH7','CH8','CH9','5V','PCS','9V']
+DIGITAL_INPUTS = ['ID1','ID2','ID3','ID4','LMETER','CH4']
+GAINS = [1,2,4,5,8,10,16,32]
+PGA_CHIP_SELECT = {'CH1':1,'CH2':2,'CH3':3,'CH4':4}
+
+class SimulatedDevice(object):
+	"""
+	Emulates the firmware of the LabToolSuite, and behaves like a serial port object.
+
+	==============	============================================================================================
+	**Arguments**	(all optional keyword arguments)
+	==============	============================================================================================
+	version		version string returned by GET_VERSION. default 'LTS-SIM-1.0'
+	bandwidth	link bandwidth in bytes/second for either direction. default None(unlimited)
+	latency		seconds elapsed before the device replies to a transaction. default 0
+	write_overhead	seconds of link time consumed by every write call (USB transaction overhead). default 0
+	realtime	If False, captures complete immediately, and bandwidth/latency are ignored. default True
+	timeout		read timeout in seconds. default 1.0
+	analog_inputs	dictionary of channel name -> function(time array in S) returning volts
+	digital_inputs	dictionary of 'ID1'..'ID4','LMETER','CH4' -> (frequency,duty cycle)
+	i2c_devices	dictionary of 7-bit address -> bytearray register file. default {0x60:MCP4728}
+	noise		standard deviation of gaussian noise added to analog inputs (V). default 0
+	drop_rate	probability that each kilobyte of a reply longer than 64 bytes is lost, cutting the reply short. default 0
+	max_transfer	replies longer than this many bytes are always cut short (a bad USB hub). default None
+	seed		seed for the noise generator
+	==============	============================================================================================
+
+	Unrecognised commands are logged in self.unknown_commands and otherwise ignored.
+	"""
+	MAX_SAMPLES = 10000
+	TIMER_PERIOD = 65536		#16 bit timers are used by the three and four channel logic analyzer modes
+	LA_CLOCKS = [64e6,8e6,1e6,250e3]	#logic analyzer timer clocks for prescalers 0-3
+	INITIAL_ADDRESS = 0x1000	#address of the shared buffer reported by GET_INITIAL_DIGITAL_STATES
+	TRIGGER_TIMEOUT = 8e-3
+
+	instances = 0
+
+	def __init__(self,**kwargs):
+		self.version = kwargs.get('version','LTS-SIM-1.0')
+		self.portname = kwargs.get('portname','simulator%d'%SimulatedDevice.instances)	#unique names, since device pools are keyed by port
+		SimulatedDevice.instances+=1
+		self.bandwidth = kwargs.get('bandwidth',None)
+		self.latency = kwargs.get('latency',0.)
+		self.write_overhead = kwargs.get('write_overhead',0.)
+		self.realtime = kwargs.get('realtime',True)
+		self.timeout = kwargs.get('timeout',1.0)
+		self.noise = kwargs.get('noise',0.)
+		self.drop_rate = kwargs.get('drop_rate',0.)
+		self.max_transfer = kwargs.get('max_transfer',None)
+		self.random = np.random.RandomState(kwargs.get('seed',0))
+		self.analog_inputs = dict(DEFAULT_ANALOG_INPUTS)
+		self.analog_inputs.update(kwargs.get('analog_inputs',{}))
+		self.digital_inputs = dict(DEFAULT_DIGITAL_INPUTS)
+		self.digital_inputs.update(kwargs.get('digital_inputs',{}))
+		self.i2c_devices = kwargs.get('i2c_devices',{0x60:bytearray(256)})
+
+		self.buffer = np.zeros(self.MAX_SAMPLES,dtype=np.dtype('<u2'))	#shared ADC/logic analyzer buffer
+		self.flash = bytearray('\xff'*2048)
+		self.data_memory = {}
+		self.settings = {}		#last arguments received by commands that only return an acknowledge
+		self.gains = [0]*6		#indexed by PGA chip select
+		self.sensor_channel = 0
+		self.trigger_channel = 0
+		self.trigger_level = 511
+		self.capture = None
+		self.la = None
+		self.stream = None
+		self.i2c = {'address':None,'pointer':0,'first':False}
+		self.nrf_registers = bytearray(32)
+		self.nrf_payload = bytearray()
+		self.unknown_commands = []
+		self.bytes_written = 0
+		self.bytes_read = 0
+		self.closed = False
+
+		self.start_time = time.time()
+		self.condition = threading.Condition()
+		self.input = bytearray()
+		self.output = collections.deque()	#[time at which the bytes reach the host,bytearray]
+		self.rx_free = 0.			#time at which the host->device direction becomes idle
+		self.tx_free = 0.			#time at which the device->host direction becomes idle
+		self.arrival = 0.
+		self.commands = self.__command_table__()
+		self.parser = self.__parse__()
+		self.request = self.parser.next()
+
+	#-------------------------------serial port interface-------------------------------
+
+	def now(self):
+		"""
+		seconds elapsed on the device clock
+		"""
+		return time.time()-self.start_time
+
+	def write(self,data):
+		with self.condition:
+			now = self.now()
+			if self.realtime and (self.bandwidth or self.write_overhead):
+				self.rx_free = max(self.rx_free,now)+self.write_overhead+(len(data)/float(self.bandwidth) if self.bandwidth else 0)
+				now = self.rx_free
+			self.arrival = now+(self.latency if self.realtime else 0.)
+			self.bytes_written += len(data)
+			self.input += bytearray(data)
+			self.__feed__()
+			self.condition.notify_all()
+		return len(data)
+
+	def read(self,size=1):
+		deadline = time.time()+(self.timeout if self.timeout is not None else 1e9)
+		out = bytearray()
+		with self.condition:
+			while len(out)<size:
+				out += self.__take__(size-len(out))
+				if len(out)>=size:break
+				remaining = deadline-time.time()
+				if remaining<=0:break
+				if self.output: remaining = min(remaining,max(self.output[0][0]-self.now(),1e-4))
+				elif self.stream: remaining = min(remaining,self.stream['dt'])
+				self.condition.wait(remaining)
+		self.bytes_read += len(out)
+		return str(out)
+
+	def readinto(self,view):
+		data = self.read(len(view))
+		view[:len(data)] = data
+		return len(data)
+
+	def readline(self):
+		line = ''
+		while True:
+			c = self.read(1)
+			line += c
+			if c in ['','\n']:return line
+
+	def inWaiting(self):
+		with self.condition:
+			self.__generate_stream__()
+			now = self.now()
+			return sum([len(b) for t,b in self.output if t<=now or not self.realtime])
+
+	in_waiting = property(inWaiting)
+
+	def read_available(self):
+		"""
+		non-blocking read of whatever has already reached the host
+		"""
+		with self.condition:
+			data = self.__take__(1<<20)
+		self.bytes_read += len(data)
+		return str(data)
+
+	def flush(self):
+		pass
+
+	def flushInput(self):
+		with self.condition:
+			self.output.clear()
+
+	reset_input_buffer = flushInput
+
+	def close(self):
+		self.closed = True
+
+	#-------------------------------link emulation-------------------------------
+
+	def __take__(self,size):
+		self.__generate_stream__()
+		now = self.now()
+		out = bytearray()
+		while self.output and len(out)<size:
+			t,b = self.output[0]
+			if self.realtime and t>now:break
+			n = size-len(out)
+			out += b[:n]
+			if n>=len(b):self.output.popleft()
+			else: self.output[0][1] = b[n:]
+		return out
+
+	def __send__(self,data,at=None):
+		"""
+		queues data for the host. It becomes readable after the transaction latency,
+		and the time required to push it through the link
+		"""
+		t = self.arrival if at is None else at
+		if len(data)>64 and self.drop_rate and self.random.rand()<1-(1-self.drop_rate)**(len(data)/1000.):
+			data = data[:self.random.randint(len(data))]
+		if self.max_transfer and len(data)>self.max_transfer:
+			data = data[:self.max_transfer]
+		if self.realtime and self.bandwidth:
+			self.tx_free = max(self.tx_free,t)+len(data)/float(self.bandwidth)
+			t = self.tx_free
+		self.output.append([t,bytearray(data)])
+
+	def __reply__(self,fmt,*args):
+		self.__send__(struct.pack('<'+fmt,*args))
+
+	def __ack__(self,status=0):
+		"""
+		1 : SUCCESS . The upper nibble carries command specific status bits (e.g. I2C NACK)
+		"""
+		self.__send__(chr(1|((status&0xF)<<4)))
+
+	def __feed__(self):
+		while True:
+			size = struct.calcsize('<'+self.request)
+			if len(self.input)<size:return
+			value = struct.unpack('<'+self.request,str(self.input[:size]))
+			del self.input[:size]
+			self.request = self.parser.send(value[0] if len(value)==1 else value)
+
+	def __parse__(self):
+		"""
+		generator that receives the incoming stream. Command handlers are generators themselves, which
+		yield the struct format of each argument they expect, and receive its unpacked value.
+		"""
+		while True:
+			header = yield 'B'
+			if header == STOP_STREAMING:
+				self.stream = None
+				continue
+			command = yield 'B'
+			handler = self.commands.get((header,command),None)
+			if handler is None:
+				self.unknown_commands.append((header,command))
+				continue
+			gen = handler()
+			if gen is None:continue
+			try: request = gen.next()
+			except StopIteration: continue
+			while True:
+				value = yield request
+				try: request = gen.send(value)
+				except StopIteration: break
+
+	#-------------------------------signal models-------------------------------
+
+	def __chosa_name__(self,chosa):
+		chosa&=0x0F
+		if chosa<4:return ['CH2','CH3','CH4','CH1'][chosa]
+		elif chosa==4:return UNIPOLARS[self.sensor_channel]
+		return {5:'IN1',7:'SEN',8:'TEMP'}.get(chosa,'IN1')
+
+	def __gain__(self,name):
+		if name in PGA_CHIP_SELECT: return GAINS[self.gains[PGA_CHIP_SELECT[name]]]
+		elif name in UNIPOLARS: return GAINS[self.gains[5]]
+		return 1
+
+	def __volts__(self,name,t):
+		v = self.analog_inputs.get(name,dc(0.))(np.asarray(t,dtype=float))
+		if self.noise: v = v+self.random.normal(0,self.noise,np.shape(v))
+		return v
+
+	def __to_code__(self,name,volts,resolution=10):
+		"""
+		inverse of the default calibration in achan
+		"""
+		g = self.__gain__(name)
+		if name in BIPOLARS: code = (16.5-volts*g)*1023/33.
+		elif name=='5V': code = volts*g*1023/6.6
+		elif name=='9V': code = volts*g*1023/33.
+		else: code = volts*g*1023/3.3
+		if resolution==12: return np.clip(np.round(code*4),0,4095).astype(np.uint16)
+		return np.clip(np.round(code),0,1023).astype(np.uint16)
+
+	def __level__(self,name,t):
+		"""
+		logic level of a digital input at time(s) t
+		"""
+		freq,duty = self.digital_inputs.get(name,(0,0))
+		if not freq:return np.zeros(np.shape(t),dtype=bool)
+		return (np.asarray(t)*freq)%1<duty
+
+	def __edges__(self,name,mode,t0,count):
+		"""
+		times of the first `count` edges after t0 that the input capture module would log in the given mode
+		"""
+		freq,duty = self.digital_inputs.get(name,(0,0))
+		if not freq or mode==DISABLED:return np.zeros(0)
+		per_edge = {EVERY_EDGE:0.5,EVERY_FALLING_EDGE:1,EVERY_RISING_EDGE:1,EVERY_FOURTH_RISING_EDGE:4,EVERY_SIXTEENTH_RISING_EDGE:16}[mode]
+		k = np.arange(int(np.floor(t0*freq)),int(np.floor(t0*freq))+int(count*per_edge)+3)
+		rising = k/float(freq)
+		falling = rising+duty/float(freq)
+		if mode==EVERY_EDGE: edges = np.sort(np.concatenate([rising,falling]))
+		elif mode==EVERY_FALLING_EDGE: edges = falling
+		else: edges = rising
+		edges = edges[edges>t0]
+		if mode==EVERY_FOURTH_RISING_EDGE: edges = edges[::4]
+		elif mode==EVERY_SIXTEENTH_RISING_EDGE: edges = edges[::16]
+		return edges[:count]
+
+	def __period__(self,name):
+		freq,duty = self.digital_inputs.get(name,(0,0))
+		return (1./freq,duty) if freq else (0,0)
+
+	#-------------------------------ADC-------------------------------
+
+	def __capture__(self,num,resolution=10):
+		chosa = yield 'B'
+		samples = yield 'H'
+		tg = (yield 'H')/8e6			#8MHz timer clock
+		names = [self.__chosa_name__(chosa),'CH2','CH3','CH4'][:num]
+		start = self.arrival
+		if chosa&0x80:				#wait for the trigger
+			name = names[min(self.trigger_channel,num-1)]
+			grid = start+np.arange(int(self.TRIGGER_TIMEOUT/tg)+1)*tg
+			codes = self.__to_code__(name,self.__volts__(name,grid),resolution).astype(int)
+			if name in BIPOLARS: crossed = (codes[:-1]>self.trigger_level)&(codes[1:]<=self.trigger_level)	#inverting amplifiers
+			else: crossed = (codes[:-1]<self.trigger_level)&(codes[1:]>=self.trigger_level)
+			hits = np.flatnonzero(crossed)
+			start = grid[hits[0]+1] if len(hits) else grid[-1]
+		t = start+np.arange(samples)*tg
+		codes = np.array([self.__to_code__(names[n],self.__volts__(names[n],t),resolution) for n in range(num)])
+		self.capture = {'start':start,'samples':samples,'timegap':tg,'channels':num,'codes':codes,'stored':0}
+		self.__store_acquired__()
+		self.__ack__()
+
+	def __acquired__(self):
+		c = self.capture
+		if not self.realtime:return c['samples']
+		return int(np.clip((self.arrival-c['start'])/c['timegap'],0,c['samples']))
+
+	def __store_acquired__(self):
+		"""
+		copies the samples converted so far into the buffer. Later samples still hold data from previous captures
+		"""
+		if not self.capture:return 0
+		c = self.capture
+		acquired = self.__acquired__()
+		if acquired>c['stored']:
+			for n in range(c['channels']):
+				self.buffer[n*c['samples']+c['stored']:n*c['samples']+acquired] = c['codes'][n,c['stored']:acquired]
+			c['stored'] = acquired
+		return acquired
+
+	def __capture_status__(self):
+		done,acquired = 1,0
+		if self.capture:
+			acquired = self.__store_acquired__()
+			done = 1 if acquired>=self.capture['samples'] else 0
+		self.__reply__('BH',done,acquired)
+		self.__ack__()
+
+	def __capture_channel__(self):
+		channel = yield 'B'
+		count = yield 'H'
+		offset = yield 'H'
+		self.__store_acquired__()
+		start = offset+(channel*self.capture['samples'] if self.capture else 0)
+		data = np.zeros(count,dtype=np.dtype('<u2'))
+		chunk = self.buffer[start:start+count]
+		data[:len(chunk)] = chunk
+		self.__send__(data.tostring())
+		self.__ack__()
+
+	def __configure_trigger__(self):
+		mask = yield 'B'
+		self.trigger_level = yield 'H'
+		self.trigger_channel = [mask&(1<<a)!=0 for a in range(4)].index(True) if mask&0xF else 0
+		self.__ack__()
+
+	def __set_gain__(self):
+		chip_select = yield 'B'
+		gain = yield 'B'
+		self.gains[chip_select] = gain&7
+		self.__ack__()
+
+	def __select_sensor__(self):
+		self.sensor_channel = (yield 'B')&7
+		self.__ack__()
+
+	def __voltage_summed__(self):
+		name = self.__chosa_name__((yield 'B'))
+		code = self.__to_code__(name,self.__volts__(name,self.arrival),12)
+		self.__reply__('HH',0,16*int(code))
+		self.__ack__()
+
+	def __start_streaming__(self):
+		name = self.__chosa_name__((yield 'B'))
+		tg = yield 'H'
+		self.stream = {'name':name,'dt':max(tg,1)/250e3,'start':self.arrival,'sent':0}
+
+	def __generate_stream__(self):
+		if not self.stream:return
+		s = self.stream
+		due = int((self.now()-s['start'])/s['dt']) if self.realtime else s['sent']+4096
+		due = min(due,s['sent']+(1<<16))
+		if due<=s['sent']:return
+		t = s['start']+np.arange(s['sent'],due)*s['dt']
+		codes = self.__to_code__(s['name'],self.__volts__(s['name'],t))>>2
+		self.__send__(codes.astype(np.uint8).tostring(),at=t[0])
+		s['sent'] = due
+
+	#-------------------------------logic analyzer-------------------------------
+
+	def __load_la__(self,names,modes,count,datatype,prescaler=0,trigger=None):
+		"""
+		log edges on the named inputs into the shared buffer, the way the DMA channels do
+		"""
+		t0 = self.arrival
+		if trigger:
+			edges = self.__edges__(trigger[0],trigger[1],t0,1)
+			if len(edges):t0 = edges[0]
+		clock = self.LA_CLOCKS[prescaler]
+		self.buffer[:] = 0
+		longs = self.buffer.view(np.dtype('<u4'))
+		la = {'start':t0,'edges':[],'datatype':datatype,'states':0}
+		for n in range(len(names)):
+			edges = self.__edges__(names[n],modes[n],t0,count)
+			ticks = np.maximum(np.round((edges-t0)*clock),1).astype(np.int64)
+			if datatype=='long':
+				longs[n*self.MAX_SAMPLES/4:n*self.MAX_SAMPLES/4+len(ticks)] = ticks
+			else:
+				self.buffer[n*self.MAX_SAMPLES/4:n*self.MAX_SAMPLES/4+len(ticks)] = ticks%self.TIMER_PERIOD
+			la['edges'].append(edges)
+		for n in range(4):
+			if self.__level__(DIGITAL_INPUTS[n],t0):la['states']|=1<<n
+		self.la = la
+		self.__ack__()
+
+	def __one_channel_la__(self):
+		count = yield 'H'
+		trigger = yield 'B'
+		chan = (trigger>>2)&3
+		self.__load_la__([DIGITAL_INPUTS[chan]],[EVERY_EDGE],count,'long',
+			trigger=(DIGITAL_INPUTS[chan],EVERY_RISING_EDGE if trigger&2 else EVERY_FALLING_EDGE) if trigger&1 else None)
+
+	def __alternate_one_channel_la__(self):
+		count = yield 'H'
+		aq = yield 'B'
+		tr = yield 'B'
+		self.__load_la__([DIGITAL_INPUTS[aq>>4]],[aq&0xF],count,'long',
+			trigger=(DIGITAL_INPUTS[tr>>4],tr&0xF) if tr&0xF else None)
+
+	def __two_channel_la__(self):
+		count = yield 'H'
+		trigger = yield 'B'
+		modes = yield 'B'
+		self.__load_la__(['ID1','ID2'],[modes&0xF,modes>>4],count,'long',
+			trigger=('ID1',EVERY_RISING_EDGE) if trigger&1 else None)
+
+	def __three_channel_la__(self):
+		count = yield 'H'
+		modes = yield 'H'
+		tr = yield 'B'
+		self.__load_la__(['ID1','ID2','ID3'],[(modes>>(4*a))&0xF for a in range(3)],count,'int',
+			trigger=(DIGITAL_INPUTS[tr>>4],tr&0xF) if tr&0xF else None)
+
+	def __four_channel_la__(self):
+		count = yield 'H'
+		modes = yield 'H'
+		prescaler = yield 'B'
+		trigger = yield 'B'
+		self.__load_la__(['ID1','ID2','ID3','ID4'],[(modes>>(4*a))&0xF for a in range(4)],count,'int',prescaler&3,
+			trigger=('ID1',EVERY_RISING_EDGE if trigger&2 else EVERY_FALLING_EDGE) if trigger&1 else None)
+
+	def __initial_states__(self):
+		pointers = [self.INITIAL_ADDRESS+2*n*self.MAX_SAMPLES/4 for n in range(4)]
+		states = 0
+		if self.la:
+			step = 2 if self.la['datatype']=='long' else 1	#long data occupies twice the space
+			for n in range(len(self.la['edges'])):
+				edges = self.la['edges'][n]
+				if self.realtime: edges = edges[edges<=self.arrival]
+				pointers[n*step]+=2*len(edges)
+			states = self.la['states']
+		self.__reply__('HHHHHB',self.INITIAL_ADDRESS,pointers[0],pointers[1],pointers[2],pointers[3],states)
+		self.__ack__()
+
+	def __fetch_la__(self,datatype):
+		count = yield 'H'
+		chan = yield 'B'
+		src = self.buffer.view(np.dtype('<u4')) if datatype=='long' else self.buffer
+		data = np.zeros(count,dtype=src.dtype)
+		chunk = src[chan*self.MAX_SAMPLES/4:chan*self.MAX_SAMPLES/4+count]
+		data[:len(chunk)] = chunk
+		self.__send__(data.tostring())
+		self.__ack__()
+
+	def __clear_buffer__(self):
+		start = yield 'H'
+		count = yield 'H'
+		self.buffer[start:start+count] = 0
+		self.__ack__()
+
+	def __retrieve_buffer__(self):
+		start = yield 'H'
+		count = yield 'H'
+		self.__store_acquired__()
+		data = np.zeros(count,dtype=self.buffer.dtype)
+		chunk = self.buffer[start:start+count]
+		data[:len(chunk)] = chunk
+		self.__send__(data.tostring())
+		self.__ack__()
+
+	#-------------------------------timing-------------------------------
+
+	def __timeout__(self,period,timeout_msb):
+		return 0 if period and period*64e6<(timeout_msb<<16) else timeout_msb
+
+	def __get_timing__(self):
+		timeout_msb = yield 'H'
+		yield 'B'	#edge type. both edges are one wavelength apart for a square wave
+		period,duty = self.__period__(DIGITAL_INPUTS[(yield 'B')])
+		self.__reply__('HII',self.__timeout__(period,timeout_msb),1000,1000+int(round(period*64e6)))
+		self.__ack__()
+
+	def __pulse_time__(self):
+		timeout_msb = yield 'H'
+		period,duty = self.__period__(DIGITAL_INPUTS[(yield 'B')])
+		self.__reply__('IIH',1000,1000+int(round(period*duty*64e6)),self.__timeout__(period,timeout_msb))
+		self.__ack__()
+
+	def __duty_cycle__(self):
+		timeout_msb = yield 'H'
+		period,duty = self.__period__(DIGITAL_INPUTS[(yield 'B')&0xF])
+		self.__reply__('IIIBH',1000,1000+int(round(period*duty*64e6)),1000+int(round(period*64e6)),1,self.__timeout__(period,timeout_msb))
+		self.__ack__()
+
+	def __interval__(self):
+		timeout_msb = yield 'H'
+		chans = yield 'B'
+		params = yield 'B'
+		modes = {2:EVERY_FALLING_EDGE,3:EVERY_RISING_EDGE,4:EVERY_FOURTH_RISING_EDGE}
+		t0 = self.arrival
+		A = self.__edges__(DIGITAL_INPUTS[chans&0xF],modes.get(params&7,EVERY_RISING_EDGE),t0,1)
+		B = self.__edges__(DIGITAL_INPUTS[chans>>4],modes.get((params>>3)&7,EVERY_RISING_EDGE),t0,1)
+		if len(A) and len(B): self.__reply__('IIH',int((A[0]-t0)*64e6)+20,int((B[0]-t0)*64e6),0)
+		else: self.__reply__('IIH',0,0,timeout_msb)
+		self.__ack__()
+
+	def __frequency__(self):
+		timeout_msb = yield 'H'
+		period,duty = self.__period__(DIGITAL_INPUTS[(yield 'B')])
+		self.__reply__('HII',self.__timeout__(16*period,timeout_msb),1000,1000+int(round(16*period*64e6)))
+		self.__ack__()
+
+	def __high_frequency__(self):
+		freq = self.digital_inputs.get(DIGITAL_INPUTS[(yield 'B')],(0,0))[0]
+		self.__reply__('BI',1,int(round(freq*0.1)))
+		self.__ack__()
+
+	def __states__(self):
+		levels = [self.__level__(a,self.arrival) for a in DIGITAL_INPUTS[:4]]
+		self.__reply__('B',sum([1<<a for a in range(4) if levels[a]]))
+		self.__ack__()
+
+	def __distance__(self):
+		yield 'H'
+		echo = 2*self.settings.get('distance',0.2)/343.
+		self.__reply__('IIH',1000,1000+int(echo*64e6)-20,0)
+		self.__ack__()
+
+	#-------------------------------miscellaneous-------------------------------
+
+	def __version__(self):
+		self.__send__(self.version+'\n')
+
+	def __ctmu__(self):
+		channel = (yield 'B')&0x1F
+		V = self.__volts__('TEMP' if channel==0b11110 else 'IN1',self.arrival)
+		self.__reply__('BH',0,int(np.clip(V*15*4096/3.3,0,65535)))
+		self.__ack__()
+
+	def __capacitance__(self):
+		current_range = yield 'B'
+		yield 'B'	#trim
+		charge_time = yield 'H'
+		current = [0.5775e-3,0.53e-6,0.5775e-5,0.5775e-4][current_range&3]
+		V = current*charge_time*1e-6/self.settings.get('capacitance',1e-9)
+		self.__reply__('H',int(np.clip(V*4095/3.3,0,4095)))
+		self.__ack__()
+
+	def __capacitor_range__(self):
+		ctime = yield 'H'
+		V = 3.3*(1-np.exp(-ctime*1e-6/(1e4*self.settings.get('capacitance',1e-9))))
+		self.__reply__('H',int(16*V*4095/3.3))
+		self.__ack__()
+
+	def __read_address__(self,args):
+		address = 0
+		for n in range(args): address|=(yield 'H')<<(16*n)
+		self.__reply__('H',self.data_memory.get(address,0))
+		self.__ack__()
+
+	def __write_address__(self,args):
+		address = 0
+		for n in range(args): address|=(yield 'H')<<(16*n)
+		self.data_memory[address] = yield 'H'
+		self.__ack__()
+
+	def __read_flash__(self):
+		location = yield 'B'
+		self.__send__(self.flash[location*16:location*16+16])
+		self.__ack__()
+
+	def __write_flash__(self):
+		location = yield 'B'
+		self.flash[location*16:location*16+16] = yield '16s'
+		self.__ack__()
+
+	def __read_bulk_flash__(self):
+		count = yield 'H'
+		self.__send__(self.flash[:count])
+		self.__ack__()
+
+	def __write_bulk_flash__(self):
+		count = yield 'H'
+		self.flash[:count] = yield '%ds'%count
+		self.__ack__()
+
+	def __acknowledge__(self,fmt,key):
+		"""
+		generic handler for commands which only return an acknowledge. Arguments are stored in self.settings
+		"""
+		args = []
+		for f in fmt: args.append((yield f))
+		self.settings[key] = args
+		self.__ack__()
+
+	def __no_reply__(self,fmt,key):
+		args = []
+		for f in fmt: args.append((yield f))
+		self.settings[key] = args
+
+	#-------------------------------I2C-------------------------------
+
+	def __i2c_start__(self):
+		address = yield 'B'
+		present = (address>>1) in self.i2c_devices
+		self.i2c['address'] = (address>>1) if present else None
+		self.i2c['first'] = not (address&1)
+		self.__ack__(0 if present else 1)
+
+	def __i2c_write__(self,acknowledge=True):
+		data = yield 'B'
+		dev = self.i2c_devices.get(self.i2c['address'],None)
+		if dev is not None:
+			if self.i2c['first']: self.i2c['pointer'] = data
+			else:
+				dev[self.i2c['pointer']%len(dev)] = data
+				self.i2c['pointer']+=1
+			self.i2c['first'] = False
+		if acknowledge: self.__ack__(0 if dev is not None else 1)
+
+	def __i2c_read__(self):
+		dev = self.i2c_devices.get(self.i2c['address'],None)
+		val = 0xFF
+		if dev is not None:
+			val = dev[self.i2c['pointer']%len(dev)]
+			self.i2c['pointer']+=1
+		self.__reply__('B',val)
+		self.__ack__()
+
+	def __i2c_status__(self):
+		self.__reply__('H',0)
+		self.__ack__()
+
+	#-------------------------------SPI ( MISO looped back to MOSI )-------------------------------
+
+	def __spi__(self,fmt):
+		value = yield fmt
+		self.__reply__(fmt,value)
+		self.__ack__()
+
+	#-------------------------------NRF24L01-------------------------------
+
+	def __nrf_read_register__(self):
+		self.__reply__('B',self.nrf_registers[(yield 'B')&0x1F])
+		self.__ack__()
+
+	def __nrf_write_register__(self):
+		register = yield 'B'
+		self.nrf_registers[register&0x1F] = yield 'B'
+		self.__ack__()
+
+	def __nrf_reply__(self,value):
+		self.__reply__('B',value)
+		self.__ack__()
+
+	def __nrf_write_payload__(self):
+		length = (yield 'B')&0x7F
+		yield 'B'	#TX_PAYLOAD / ACK_PAYLOAD command
+		self.nrf_payload = bytearray((yield '%ds'%length))
+		self.__ack__()
+
+	def __nrf_read_payload__(self):
+		count = yield 'B'
+		self.__send__((self.nrf_payload+bytearray(count))[:count])
+		self.__ack__()
+
+	def __nrf_transaction__(self):
+		length = yield 'B'
+		yield 'H'	#timeout
+		data = yield '%ds'%length	#nodes echo the payload back
+		self.__reply__('B',len(data))
+		self.__send__(data)
+		self.__ack__()
+
+	def __command_table__(self):
+		P = functools.partial
+		A = self.__acknowledge__
+		N = self.__no_reply__
+		table = {
+		(ADC,CAPTURE_ONE):P(self.__capture__,1),(ADC,CAPTURE_TWO):P(self.__capture__,2),(ADC,CAPTURE_FOUR):P(self.__capture__,4),
+		(ADC,CAPTURE_12BIT):P(self.__capture__,1,12),(ADC,CONFIGURE_TRIGGER):self.__configure_trigger__,
+		(ADC,GET_CAPTURE_STATUS):self.__capture_status__,(ADC,GET_CAPTURE_CHANNEL):self.__capture_channel__,
+		(ADC,SET_PGA_GAIN):self.__set_gain__,(ADC,GET_VOLTAGE_SUMMED):self.__voltage_summed__,
+		(ADC,START_ADC_STREAMING):self.__start_streaming__,(ADC,SELECT_PGA_CHANNEL):self.__select_sensor__,
+
+		(TIMING,GET_TIMING):self.__get_timing__,(TIMING,GET_PULSE_TIME):self.__pulse_time__,(TIMING,GET_DUTY_CYCLE):self.__duty_cycle__,
+		(TIMING,START_ONE_CHAN_LA):self.__one_channel_la__,(TIMING,START_ALTERNATE_ONE_CHAN_LA):self.__alternate_one_channel_la__,
+		(TIMING,START_TWO_CHAN_LA):self.__two_channel_la__,(TIMING,START_THREE_CHAN_LA):self.__three_channel_la__,
+		(TIMING,START_FOUR_CHAN_LA):self.__four_channel_la__,(TIMING,GET_INITIAL_DIGITAL_STATES):self.__initial_states__,
+		(TIMING,FETCH_INT_DMA_DATA):P(self.__fetch_la__,'int'),(TIMING,FETCH_LONG_DMA_DATA):P(self.__fetch_la__,'long'),
+		(TIMING,INTERVAL_MEASUREMENTS):self.__interval__,(TIMING,CONFIGURE_COMPARATOR):P(A,'B',(TIMING,CONFIGURE_COMPARATOR)),
+
+		(COMMON,GET_VERSION):self.__version__,(COMMON,GET_CTMU_VOLTAGE):self.__ctmu__,(COMMON,GET_CAPACITANCE):self.__capacitance__,
+		(COMMON,GET_CAP_RANGE):self.__capacitor_range__,(COMMON,GET_FREQUENCY):self.__frequency__,
+		(COMMON,GET_HIGH_FREQUENCY):self.__high_frequency__,(COMMON,RETRIEVE_BUFFER):self.__retrieve_buffer__,
+		(COMMON,CLEAR_BUFFER):self.__clear_buffer__,(COMMON,READ_PROGRAM_ADDRESS):P(self.__read_address__,2),
+		(COMMON,WRITE_PROGRAM_ADDRESS):P(self.__write_address__,2),(COMMON,READ_DATA_ADDRESS):P(self.__read_address__,1),
+		(COMMON,WRITE_DATA_ADDRESS):P(self.__write_address__,1),
+
+		(FLASH,READ_FLASH):self.__read_flash__,(FLASH,WRITE_FLASH):self.__write_flash__,
+		(FLASH,READ_BULK_FLASH):self.__read_bulk_flash__,(FLASH,WRITE_BULK_FLASH):self.__write_bulk_flash__,
+
+		(DIN,GET_STATES):self.__states__,(NONSTANDARD_IO,HCSR04_HEADER):self.__distance__,
+
+		(I2C_HEADER,I2C_START):self.__i2c_start__,(I2C_HEADER,I2C_RESTART):self.__i2c_start__,
+		(I2C_HEADER,I2C_SEND):self.__i2c_write__,(I2C_HEADER,I2C_SEND_BURST):P(self.__i2c_write__,False),
+		(I2C_HEADER,I2C_READ_MORE):self.__i2c_read__,(I2C_HEADER,I2C_READ_END):self.__i2c_read__,
+		(I2C_HEADER,I2C_STATUS):self.__i2c_status__,
+
+		(SPI_HEADER,SEND_SPI8):P(self.__spi__,'B'),(SPI_HEADER,SEND_SPI16):P(self.__spi__,'H'),
+
+		(NRFL01,NRF_READREG):self.__nrf_read_register__,(NRFL01,NRF_WRITEREG):self.__nrf_write_register__,
+		(NRFL01,NRF_GETSTATUS):P(self.__nrf_reply__,0x0E),(NRFL01,NRF_HASDATA):P(self.__nrf_reply__,0),
+		(NRFL01,NRF_RXCHAR):P(self.__nrf_reply__,0),(NRFL01,NRF_WRITEPAYLOAD):self.__nrf_write_payload__,
+		(NRFL01,NRF_READPAYLOAD):self.__nrf_read_payload__,(NRFL01,NRF_TRANSACTION):self.__nrf_transaction__,
+		}
+		acknowledged = {			#commands that only return an acknowledge, and the format of their arguments
+		(DAC,SET_DAC):'BBH',
+		(WAVEGEN,SET_WG1):'BHH',(WAVEGEN,SET_WG2):'BHH',(WAVEGEN,SET_SQR1):'HHB',(WAVEGEN,SET_SQR2):'HHB',
+		(WAVEGEN,SET_SQRS):'HHHHB',(WAVEGEN,SQR4):'HHHHHHHHB',(WAVEGEN,MAP_REFERENCE):'BB',(WAVEGEN,SET_BOTH_WG):'H',
+		(WAVEGEN,SET_WAVEFORM_TYPE):'B',(WAVEGEN,SELECT_FREQ_REGISTER):'B',
+		(DOUT,SET_STATE):'B',(UART_2,SEND_CHAR):'B',(UART_2,SEND_ADDRESS):'B',
+		(COMMON,SET_RGB):'BBB',(COMMON,SET_ONBOARD_RGB):'BBB',
+		(I2C_HEADER,I2C_STOP):'',(I2C_HEADER,I2C_WAIT):'',(I2C_HEADER,I2C_CONFIG):'H',
+		(SPI_HEADER,SET_SPI_PARAMETERS):'B',
+		(NRFL01,NRF_SETUP):'',(NRFL01,NRF_RXMODE):'',(NRFL01,NRF_TXMODE):'',(NRFL01,NRF_POWER_DOWN):'',(NRFL01,NRF_FLUSH):'',
+		(NRFL01,NRF_TXCHAR):'B',(NRFL01,NRF_WRITECOMMAND):'B',(NRFL01,NRF_WRITEADDRESS):'BBBB',
+		(NONSTANDARD_IO,AM2302_HEADER):'',(NONSTANDARD_IO,TCD1304_HEADER):'BBHH',
+		}
+		for key in acknowledged: table[key] = P(A,acknowledged[key],key)
+		unacknowledged = {(SPI_HEADER,START_SPI):'B',(SPI_HEADER,STOP_SPI):'B',(SPI_HEADER,SEND_SPI8_BURST):'B',(SPI_HEADER,SEND_SPI16_BURST):'H'}
+		for key in unacknowledged: table[key] = P(N,unacknowledged[key],key)
+		return table
+
+
+def serve_pty(device=None,**kwargs):
+	"""
+	Exposes a SimulatedDevice through a pseudo terminal, and returns the name of the slave end.
+	keyword arguments are passed on to SimulatedDevice if no device is supplied.
+
+	>>> port = serve_pty(bandwidth=100e3)
+	>>> H = packet_handler.Handler(port=port)
+	"""
+	import pty,tty,select,atexit
+	if device is None: device = SimulatedDevice(**kwargs)
+	master,slave = pty.openpty()
+	tty.setraw(slave)
+	device.pty = (master,slave)
+	def pump():
+		while not device.closed:
+			r,w,x = select.select([master],[],[],5e-4)
+			if r:
+				try: device.write(os.read(master,4096))
+				except OSError: break
+			data = device.read_available()
+			if data: os.write(master,data)
+	t = threading.Thread(target=pump)
+	t.daemon = True
+	t.start()
+	def stop():
+		device.close()
+		t.join(0.1)
+	atexit.register(stop)
+	return os.ttyname(slave)
+
+def connect(**kwargs):
+	"""
+	Returns an Interface connected to a fresh SimulatedDevice. keyword arguments are passed on to SimulatedDevice
+	"""
+	from Labtools import interface
+	return interface.Interface(transport=SimulatedDevice(**kwargs))
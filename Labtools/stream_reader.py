@@ -0,0 +1,200 @@
+'''
+Continuous acquisition with :func:`Labtools.interface.Interface.start_streaming`
+
+While streaming, the device sends one 8-bit sample per timegap, for as long as it is not told to stop.
+A StreamReader collects these on a thread of its own, so that the port is drained at the full link rate
+regardless of what the rest of the program is doing. Samples are kept in a ring buffer until they are
+read, and are converted to volts a block at a time.
+
+>>> R = I.stream_reader(25,'CH1')		#10 kSPS
+>>> for block in R.blocks(1000):		#arrays of 1000 voltages, as they arrive
+... 	print block.mean()
+... 	if done:break
+>>> R.stop()
+
+or, with a callback which is run on a separate thread
+
+>>> R = I.stream_reader(25,'CH1',callback=lambda v:curve.setData(v),block_size=500)
+
+The device cannot carry out any other command while it streams. Other threads that use the
+Interface wait until the reader has been stopped.
+'''
+import threading,time
+import numpy as np
+from commands_proto import STOP_STREAMING
+from achan import lookup_table
+
+class StreamReader(object):
+	"""
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	I				:class:`Labtools.interface.Interface`
+	tg				timegap between samples, in units of the 250KHz clock
+	channel			channel 'CH1'... 'CH9','IN1','SEN'
+	\*\*kwargs
+	ring_size		number of samples held until they are read. default 1<<20
+	block_size		default number of samples per block returned by read and blocks. default 1000
+	callback		function called with each block of voltages. Runs on a thread of its own. default None
+	==============	============================================================================================
+
+	Samples which arrive while the ring is full are discarded, and recorded in overruns as
+	(sample index,count). Stalls in the stream longer than 50 timegaps are recorded in gaps as
+	(sample index,seconds). :func:`lag` reports how far the stream is behind its nominal rate.
+	"""
+	def __init__(self,I,tg,channel='CH1',**kwargs):
+		self.I = I
+		self.tg = tg
+		self.channel = channel
+		self.dt = max(tg,1)/250e3
+		self.size = kwargs.get('ring_size',1<<20)
+		self.block_size = kwargs.get('block_size',1000)
+		self.ring = np.zeros(self.size,dtype=np.uint8)
+		self.scratch = np.zeros(self.size/4,dtype=np.uint8)	#receives samples that have no room in the ring
+		self.table = lookup_table(channel,I.__channelGain__(channel))[::4]	#8-bit samples are the upper bits of 10-bit codes
+		self.received = 0	#samples read from the port
+		self.written = 0	#samples stored in the ring. Only the reader thread changes this
+		self.consumed = 0	#samples taken from the ring. Only the consumer changes this
+		self.overruns = []
+		self.gaps = []
+		self.started = None
+		self.error = None
+		self.stopping = False	#asks the reader to stop
+		self.finished = False	#the reader has stopped, and will not add any more samples
+		self.running = threading.Event()
+		self.available = threading.Event()
+		self.thread = threading.Thread(target=self.__run__)
+		self.thread.daemon = True
+		self.thread.start()
+		self.running.wait()
+		self.dispatcher = None
+		callback = kwargs.get('callback',None)
+		if callback is not None:
+			self.dispatcher = threading.Thread(target=self.__dispatch__,args=(callback,))
+			self.dispatcher.daemon = True
+			self.dispatcher.start()
+
+	def __run__(self):
+		H = self.I.H
+		with H.transaction():	#the device is ours until the stream is stopped
+			try:
+				self.I.start_streaming(self.tg,self.channel)
+				self.started = time.time()
+			except Exception as e:
+				self.error,self.finished = e,True
+				return
+			finally:
+				self.running.set()
+			try:
+				self.__collect__(H.fd)
+			except Exception as e:
+				self.error = e
+			finally:
+				H.__sendByte__(STOP_STREAMING)
+				H.__drain__()
+				self.I.streaming = False
+				self.finished = True
+				self.available.set()
+
+	def __collect__(self,fd):
+		ring,scratch = memoryview(self.ring),memoryview(self.scratch)
+		minimum = int(min(max(0.005/self.dt,1),len(self.scratch)))	#at least 5mS worth of samples per read
+		quiet = max(50*self.dt,0.05)
+		last = time.time()
+		while not self.stopping:
+			n = min(max(fd.inWaiting(),minimum),len(self.scratch))
+			space = self.size-(self.written-self.consumed)
+			start = self.written%self.size
+			if space>=n:
+				got = fd.readinto(ring[start:start+min(n,self.size-start)])
+				self.written+=got
+			else:		#the consumer is not keeping up. Keep draining the port, but drop the samples
+				got = fd.readinto(scratch[:n])
+				if got:self.overruns.append((self.received,got))
+			now = time.time()
+			if got:
+				if now-last>quiet:self.gaps.append((self.received,now-last))
+				self.received+=got
+				last = now
+				self.available.set()
+
+	def lag(self):
+		"""
+		number of samples by which the stream has fallen behind the nominal rate, since it was started
+		"""
+		return int((time.time()-self.started)/self.dt)-self.received
+
+	def stream_index(self,n):
+		"""
+		position in the stream of sample n of the ring (as counted by consumed), including the samples lost to overruns before it
+		"""
+		overruns = list(self.overruns)
+		if not overruns:return n
+		received,count = np.array(overruns).T
+		position = received-(np.cumsum(count)-count)	#ring samples stored before each overrun
+		return n+int(count[position<=n].sum())
+
+	def pending(self):
+		"""
+		number of samples waiting to be read
+		"""
+		return self.written-self.consumed
+
+	def read(self,count=None,timeout=None):
+		"""
+		waits for count samples (default block_size), and returns them as an array of voltages.
+		Once the stream has been stopped, the remaining samples are returned, followed by None.
+		Returns None if the timeout expires.
+		"""
+		codes = self.read_codes(count,timeout)
+		if codes is None:return None
+		return np.take(self.table,codes)
+
+	def read_codes(self,count=None,timeout=None):
+		"""
+		same as :func:`read`, but returns the raw 8-bit samples
+		"""
+		if count is None:count = self.block_size
+		count = min(count,self.size/2)
+		deadline = None if timeout is None else time.time()+timeout
+		while self.written-self.consumed<count:
+			if self.finished:
+				count = self.written-self.consumed
+				if not count:return None
+				break
+			self.available.clear()
+			if self.written-self.consumed>=count:break
+			remaining = None if deadline is None else deadline-time.time()
+			if remaining is not None and remaining<=0:return None
+			self.available.wait(0.1 if remaining is None else min(remaining,0.1))
+		start = self.consumed%self.size
+		if start+count<=self.size:
+			codes = self.ring[start:start+count].copy()
+		else:
+			codes = np.concatenate((self.ring[start:],self.ring[:start+count-self.size]))
+		self.consumed+=count
+		return codes
+
+	def blocks(self,size=None,timeout=None):
+		"""
+		generator which yields arrays of size voltages(default block_size) as they arrive, until the stream is stopped
+		"""
+		while True:
+			block = self.read(size,timeout)
+			if block is None:return
+			yield block
+
+	__iter__ = blocks
+
+	def __dispatch__(self,callback):
+		for block in self.blocks():callback(block)
+
+	def stop(self):
+		"""
+		stops the stream, and waits for the reader to release the device. Samples already received can still be read.
+		Re-raises any exception that stopped the reader.
+		"""
+		self.stopping = True
+		self.thread.join()
+		if self.dispatcher is not None and self.dispatcher is not threading.current_thread():self.dispatcher.join()
+		if self.error is not None:raise self.error
@@ -887,6 +887,14 @@ class Ui_MainWindow(object):
         self.coord_label.setAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignTrailing|QtCore.Qt.AlignVCenter)
         self.coord_label.setObjectName(_fromUtf8("coord_label"))
         self.horizontalLayout.addWidget(self.coord_label)
+        self.display_mode_box = QtGui.QComboBox(self.frame_9)
+        self.display_mode_box.setObjectName(_fromUtf8("display_mode_box"))
+        self.display_mode_box.addItem(_fromUtf8(""))
+        self.display_mode_box.addItem(_fromUtf8(""))
+        self.display_mode_box.addItem(_fromUtf8(""))
+        self.display_mode_box.addItem(_fromUtf8(""))
+        self.display_mode_box.addItem(_fromUtf8(""))
+        self.horizontalLayout.addWidget(self.display_mode_box)
         self.freezeButton = QtGui.QCheckBox(self.frame_9)
         sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Maximum)
         sizePolicy.setHorizontalStretch(0)
@@ -925,6 +933,7 @@ class Ui_MainWindow(object):
         QtCore.QObject.connect(self.comboBox_5, QtCore.SIGNAL(_fromUtf8("currentIndexChanged(QString)")), MainWindow.remap_CH0)
         QtCore.QObject.connect(self.pushButton, QtCore.SIGNAL(_fromUtf8("clicked()")), MainWindow.plot_liss)
         QtCore.QObject.connect(self.tabWidget, QtCore.SIGNAL(_fromUtf8("currentChanged(int)")), MainWindow.change_scope_type)
+        QtCore.QObject.connect(self.display_mode_box, QtCore.SIGNAL(_fromUtf8("currentIndexChanged(int)")), MainWindow.set_display_mode)
         QtCore.QObject.connect(self.ch1, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.enable_channel)
         QtCore.QObject.connect(self.comboBox_2, QtCore.SIGNAL(_fromUtf8("currentIndexChanged(int)")), MainWindow.set_dchan_mode_ch2)
         QtCore.QObject.connect(self.ch3, QtCore.SIGNAL(_fromUtf8("toggled(bool)")), MainWindow.enable_channel)
@@ -1148,6 +1157,11 @@ class Ui_MainWindow(object):
         self.tabWidget.setTabToolTip(self.tabWidget.indexOf(self.Peripheral), QtGui.QApplication.translate("MainWindow", "Set values for function generators, voltage sources etc.", None, QtGui.QApplication.UnicodeUTF8))
         self.message_label.setText(QtGui.QApplication.translate("MainWindow", "Msg:", None, QtGui.QApplication.UnicodeUTF8))
         self.coord_label.setText(QtGui.QApplication.translate("MainWindow", "TextLabel", None, QtGui.QApplication.UnicodeUTF8))
+        self.display_mode_box.setItemText(0, QtGui.QApplication.translate("MainWindow", "Normal", None, QtGui.QApplication.UnicodeUTF8))
+        self.display_mode_box.setItemText(1, QtGui.QApplication.translate("MainWindow", "Average", None, QtGui.QApplication.UnicodeUTF8))
+        self.display_mode_box.setItemText(2, QtGui.QApplication.translate("MainWindow", "Exp. average", None, QtGui.QApplication.UnicodeUTF8))
+        self.display_mode_box.setItemText(3, QtGui.QApplication.translate("MainWindow", "Envelope", None, QtGui.QApplication.UnicodeUTF8))
+        self.display_mode_box.setItemText(4, QtGui.QApplication.translate("MainWindow", "Persistence", None, QtGui.QApplication.UnicodeUTF8))
         self.freezeButton.setText(QtGui.QApplication.translate("MainWindow", "FREEZE", None, QtGui.QApplication.UnicodeUTF8))
         self.actionSave_as.setText(QtGui.QApplication.translate("MainWindow", "Save as", None, QtGui.QApplication.UnicodeUTF8))
 
@@ -0,0 +1,422 @@
+#!/usr/bin/python
+'''
+Host side micro-benchmarks. These do not need any hardware.
+
+	$ python -m Labtools.tests.benchmarks
+'''
+import timeit
+import numpy as np
+
+def report(name,old,new):
+	print '%-40s %10.3f mS %10.3f mS   x%.1f'%(name,old*1e3,new*1e3,old/new)
+
+def best_of(fn,repeat=5,number=10):
+	return min(timeit.repeat(fn,repeat=repeat,number=number))/number
+
+def bench_sample_decode(samples=10000):
+	"""
+	Compare the per-sample ord() loop that used to decode GET_CAPTURE_CHANNEL payloads
+	against the numpy view of the preallocated receive buffer used by Interface.__fetch_channel__
+	"""
+	raw = bytearray(np.random.randint(0,1024,samples).astype('<u2').tostring())
+	data = str(raw)
+	buff = np.zeros(samples)
+	def loop():
+		for a in range(samples): buff[a] = ord(data[a*2])|(ord(data[a*2+1])<<8)
+		return buff
+	view = np.frombuffer(raw,dtype=np.dtype('<u2'))
+	def vectorized():
+		return view[:samples]
+	assert np.all(loop()==vectorized())
+	report('decode %d samples'%samples,best_of(loop),best_of(vectorized,number=1000))
+
+def bench_la_decode(points=2500):
+	"""
+	Compare the ord() based decode of 32 bit logic analyzer timestamps against np.frombuffer
+	"""
+	raw = bytearray(np.cumsum(np.random.randint(1,5000,points)).astype('<u4').tostring())
+	ss = str(raw)
+	def loop():
+		tmp = np.zeros(points)
+		for a in range(points):
+			tmp[a] = ord(ss[0+a*4])|(ord(ss[1+a*4])<<8)|(ord(ss[2+a*4])<<16)|(ord(ss[3+a*4])<<24)
+		return tmp
+	def vectorized():
+		tmp = np.zeros(points)
+		tmp[:] = np.frombuffer(raw,dtype=np.dtype('<u4'),count=points)
+		return tmp
+	assert np.all(loop()==vectorized())
+	report('decode %d LA timestamps'%points,best_of(loop),best_of(vectorized,number=1000))
+
+def bench_la_rollover(points=10000):
+	"""
+	Correct the 16-bit timer rollovers of a dense logic analyzer channel with the former loop, which adds to all
+	later timestamps at each rollover, against digital_channel.unwrap_timestamps
+	"""
+	from Labtools.digital_channel import unwrap_timestamps
+	raw = (np.cumsum(np.random.randint(1,20000,points))%65536).astype(np.uint16)
+	def loop():
+		t = np.trim_zeros(raw.astype(float))
+		b=1
+		while b<len(t):
+			if(t[b]<t[b-1] and t[b]!=0):t[b:]+=65535
+			b+=1
+		return t
+	assert np.array_equal(loop(),unwrap_timestamps(raw))
+	report('unwrap %d LA timestamps'%points,best_of(loop,3,1),best_of(lambda:unwrap_timestamps(raw),number=100))
+
+def bench_la_axes(edges=5000):
+	"""
+	Build the step plot of a logic analyzer channel one edge at a time, as digital_channel.generate_axes did,
+	against the current generate_axes
+	"""
+	from Labtools.digital_channel import digital_channel
+	D = digital_channel(0)
+	D.load_data([0]*4,np.cumsum(np.random.randint(1,1000,edges)).astype(float))
+	def loop():
+		xaxis,yaxis = np.zeros(2*edges+1),np.zeros(2*edges+1)
+		state,prescale = 9.5,1/64.
+		xaxis[0]=0; yaxis[0]=state
+		n=1
+		for a in range(D.dlength):
+			xaxis[n] = D.timestamps[a]*prescale
+			yaxis[n] = state
+			state = 9.5 if state==12 else 12
+			n+=1
+			xaxis[n] = D.timestamps[a]*prescale
+			yaxis[n] = state
+			n+=1
+		return xaxis,yaxis
+	D.generate_axes()
+	assert np.array_equal(loop()[1],D.get_yaxis())
+	report('step plot of %d LA edges'%edges,best_of(loop,3,3),best_of(D.generate_axes,number=100))
+
+def bench_uart_decode(frames=2000,baud=9600):
+	"""
+	Decode a UART capture frame by frame, following the edges, against decoders.uart
+	"""
+	from Labtools import decoders
+	T = 1e6/baud
+	data = np.random.randint(0,256,frames)
+	levels = np.ones((frames,11),dtype=int)
+	levels[:,1:9] = (data[:,None]>>np.arange(8))&1
+	levels[:,0] = 0
+	line = decoders.from_samples(np.arange(11*frames+1)*T,np.concatenate(([1],levels.ravel())))
+	def loop():
+		initial,times = line
+		values,a = [],0
+		while a<len(times):
+			if initial^((a+1)&1):	#rising edge
+				a+=1;continue
+			start = times[a]
+			value = 0
+			for k in range(8):
+				value|=decoders.level_at(line,start+(1.5+k)*T)<<k
+			values.append(value)
+			a = np.searchsorted(times,start+9.5*T,side='right')
+		return values
+	assert loop()==list(decoders.uart(line,baud)['value'])
+	report('decode %d UART frames'%frames,best_of(loop,3,1),best_of(lambda:decoders.uart(line,baud),number=10))
+
+def bench_simulated_link(samples=10000,bandwidth=100e3,write_overhead=125e-6):
+	"""
+	Commands sent one byte per write, against the same commands framed by Handler.__sendCommand__,
+	through the simulated device over a link with the bandwidth and per-write overhead of the USB-CDC port
+	"""
+	from Labtools import simulator,packet_handler
+	from Labtools.commands_proto import ADC,GET_CAPTURE_CHANNEL,DIN,GET_STATES,WAVEGEN,SET_SQRS
+	H = packet_handler.Handler(transport=simulator.SimulatedDevice(bandwidth=bandwidth,write_overhead=write_overhead))
+	view = memoryview(bytearray(2*samples))
+	def fetch_bytewise():
+		H.__sendByte__(ADC);H.__sendByte__(GET_CAPTURE_CHANNEL);H.__sendByte__(0)
+		H.__sendInt__(samples);H.__sendInt__(0)
+		H.__readInto__(view);H.__get_ack__()
+	def fetch():
+		H.__sendCommand__(ADC,GET_CAPTURE_CHANNEL,'BHH',0,samples,0)
+		H.__readInto__(view);H.__get_ack__()
+	def states_bytewise():
+		H.__sendByte__(DIN);H.__sendByte__(GET_STATES)
+		H.__getByte__();H.__get_ack__()
+	def states():
+		H.__sendCommand__(DIN,GET_STATES)
+		H.__getByte__();H.__get_ack__()
+	def sqrs_bytewise():
+		H.__sendByte__(WAVEGEN);H.__sendByte__(SET_SQRS)
+		for a in [1000,250,500,500]:H.__sendInt__(a)
+		H.__sendByte__(0);H.__get_ack__()
+	def sqrs():
+		H.__sendCommand__(WAVEGEN,SET_SQRS,'HHHHB',1000,250,500,500,0)
+		H.__get_ack__()
+	report('simulated fetch of %d samples'%samples,best_of(fetch_bytewise,3,3),best_of(fetch,3,3))
+	report('simulated get_states round trip',best_of(states_bytewise,3,20),best_of(states,3,20))
+	report('simulated set_sqrs round trip',best_of(sqrs_bytewise,3,20),best_of(sqrs,3,20))
+
+def bench_voltmeter_scan(latency=1e-3):
+	"""
+	One call to get_average_voltage per channel, against a single pipelined get_average_voltages
+	over a simulated link with a round trip latency
+	"""
+	from Labtools import simulator
+	I = simulator.connect(latency=latency)
+	channels = ['CH1','CH2','CH3','CH4','CH5','CH6','CH7','CH8','CH9','5V','9V']
+	report('scan of %d channels'%len(channels),best_of(lambda:[I.get_average_voltage(a) for a in channels],3,3),best_of(lambda:I.get_average_voltages(channels),3,3))
+
+def bench_device_pool(devices=4,latency=1e-3):
+	"""
+	The same capture and voltmeter scan run on each of several simulated devices, one after the other,
+	and then in parallel via a DevicePool
+	"""
+	from Labtools import simulator,device_pool
+	P = device_pool.DevicePool([simulator.SimulatedDevice(latency=latency) for a in range(devices)])
+	channels = ['CH5','CH6','CH7','CH8','CH9']
+	def work(I):
+		I.capture1('CH1',1000,4)
+		return I.get_average_voltages(channels)
+	def one_by_one():
+		for A in P.devices.values():work(A.I)
+	report('capture+scan on %d devices'%devices,best_of(one_by_one,3,1),best_of(lambda:P.gather(P.submit(work)),3,1))
+	P.close()
+
+def bench_startup(latency=1e-3):
+	"""
+	Time taken to import Labtools.interface in a fresh interpreter, and to connect to a simulated device.
+	The start-up configuration is also compared against sending it one command at a time
+	"""
+	import subprocess,sys,time
+	from Labtools import simulator
+	code = 'import time;t=time.time();from Labtools import interface;print time.time()-t'
+	t = min([float(subprocess.check_output([sys.executable,'-c',code]).split()[-1]) for a in range(3)])
+	print '%-40s %10.3f mS'%('import Labtools.interface',t*1e3)
+	def connect():
+		t = time.time()
+		I = simulator.connect(latency=latency)
+		return time.time()-t,I
+	t,I = min([connect() for a in range(3)])
+	print '%-40s %10.3f mS'%('connect to a simulated device',t*1e3)
+	channels = ['CH1','CH2','CH3','CH4','CH5']
+	def one_at_a_time():
+		I.map_reference_clock(4,'wavegen')
+		for a in channels: I.set_gain(a,0)
+	def batched():
+		with I.H.pipeline() as P:
+			I.map_reference_clock(4,'wavegen',pipeline=P)
+			for a in channels: I.set_gain(a,0,P)
+	report('start-up configuration',best_of(one_at_a_time,3,3),best_of(batched,3,3))
+
+def bench_capture_wait(latency=5e-4,captures=20):
+	"""
+	capture1 with a fixed sleep followed by busy polling of oscilloscope_progress, against the predictive WaitScheduler.
+	The number of GET_CAPTURE_STATUS round trips made by each is also shown
+	"""
+	import time
+	from Labtools import simulator
+	I = simulator.connect(latency=latency)
+	def busy():
+		I.capture_traces(1,1000,10,'CH1')
+		time.sleep(1e-6*I.samples*I.timebase+.01)
+		while not I.oscilloscope_progress()[0]:
+			pass
+		I.fetch_trace(1)
+	def predicted():
+		I.capture1('CH1',1000,10)
+	for a in range(5):predicted()	#let it learn the overhead
+	polls = []
+	for fn in [busy,predicted]:
+		stats = I.H.enable_stats()
+		t = time.time()
+		for a in range(captures):fn()
+		polls.append(stats.snapshot()['ADC:GET_CAPTURE_STATUS']['count']/float(captures))
+		polls.append((time.time()-t)/captures)
+		I.H.disable_stats()
+	report('capture1 of 10 mS, polls %.1f vs %.1f'%(polls[0],polls[2]),polls[1],polls[3])
+
+def bench_progressive_fetch(bandwidth=20e3):
+	"""
+	Time from the start of a 0.32 S capture until its data is available, when fetched after completion,
+	and when fetched progressively while it runs. Over a slow link
+	"""
+	from Labtools import simulator
+	I = simulator.connect(bandwidth=bandwidth,latency=1e-3)
+	def after():
+		I.capture_traces(1,3200,100,'CH1')
+		I.wait_for_capture()
+		I.fetch_trace(1)
+	def progressive():
+		I.capture_traces(1,3200,100,'CH1')
+		for n in I.progressive_fetch(0.02):pass
+	report('capture and fetch 3200 samples',best_of(after,3,1),best_of(progressive,3,1))
+
+def bench_fetch_traces(samples=2500,bandwidth=1e6,latency=1e-3):
+	"""
+	Fetch a 4 channel capture one channel at a time, each calibrated separately, against Interface.fetch_traces
+	which pipelines the requests for all channels and calibrates them together
+	"""
+	from Labtools import simulator
+	from Labtools.commands_proto import ADC,GET_CAPTURE_CHANNEL
+	I = simulator.connect(bandwidth=bandwidth,latency=latency)
+	I.capture_traces(4,samples,2)
+	I.wait_for_capture()
+	def per_channel():
+		for a in range(4):
+			request = lambda offset,n:(ADC,GET_CAPTURE_CHANNEL,'BHH',a,n,offset)
+			I.H.__fetchChunked__([(memoryview(I.raw_buffer),samples,request)],window=1)
+			I.achans[a].yaxis = I.achans[a].fix_value(I.buff[:samples])
+	def together():
+		I.fetch_traces()
+	per_channel();together()	#let the chunk size settle
+	report('fetch 4 channels x %d samples'%samples,best_of(per_channel,3,5),best_of(together,3,5))
+
+def bench_calibration(samples=10000):
+	"""
+	Evaluate the calibration polynomial of a channel for each sample, against analog_channel.fix_value
+	which looks the samples up in a precomputed table. Also for a single GET_VOLTAGE_SUMMED reading
+	"""
+	from Labtools.achan import analog_channel,calfacs,lookup_table,TWELVE_BIT,SUMMED
+	A = analog_channel(0)
+	A.set_params(channel='CH1',gain=3,resolution=TWELVE_BIT)
+	codes = np.random.randint(0,4096,samples).astype(np.uint16)
+	poly = lambda:A.calibration_ref196*calfacs['CH1'][3](codes/4.)
+	assert np.array_equal(poly(),A.fix_value(codes))
+	report('calibrate %d samples'%samples,best_of(poly,number=100),best_of(lambda:A.fix_value(codes),number=100))
+	summed = lambda:calfacs['CH5'][0](1023*40000/16./4095)
+	table = lambda:np.take(lookup_table('CH5',0,SUMMED),40000,mode='clip')
+	assert summed()==table()
+	report('calibrate a summed reading',best_of(summed,number=1000),best_of(table,number=1000))
+
+def bench_trace_history(depth=16,samples=2500):
+	"""
+	Recompute the average and envelope of the last depth traces from a list each frame, against
+	achan.trace_history which updates them in place as each trace is added
+	"""
+	from Labtools.achan import trace_history
+	traces = [np.random.randn(samples) for a in range(depth*2)]
+	kept,H = [],trace_history(depth)
+	state = {'n':0}
+	def recompute():
+		kept.append(traces[state['n']%len(traces)].copy())
+		del kept[:-depth]
+		stack = np.array(kept)
+		state['n']+=1
+		return stack.mean(axis=0),stack.min(axis=0),stack.max(axis=0)
+	def incremental():
+		H.add(traces[state['n']%len(traces)])
+		state['n']+=1
+		return H.average(),H.envelope()
+	report('average+envelope of %d x %d'%(depth,samples),best_of(recompute,number=50),best_of(incremental,number=50))
+
+def bench_streaming(samples=10000,bandwidth=1e6,latency=1e-3):
+	"""
+	Time taken to acquire samples continuously at 4uS intervals, by repeated capture and fetch cycles,
+	against a StreamReader collecting 8-bit samples over the same link
+	"""
+	from Labtools import simulator
+	I = simulator.connect(bandwidth=bandwidth,latency=latency)
+	def cycles():
+		I.capture1('CH1',samples,4)
+	old = best_of(cycles,3,3)
+	R = I.stream_reader(1,'CH1')	#the device is taken up by the stream from here on
+	R.read(samples)
+	new = best_of(lambda:R.read(samples),3,3)
+	R.stop()
+	report('acquire %d samples continuously'%samples,old,new)
+
+def bench_capture_batch(count=20,samples=500,bandwidth=1e6,latency=1e-3):
+	"""
+	Repeated 2 channel captures made with capture1 style calls in a loop, against Interface.capture_batch
+	"""
+	from Labtools import simulator
+	I = simulator.connect(bandwidth=bandwidth,latency=latency)
+	def loop():
+		for a in range(count):
+			I.capture_traces(2,samples,2)
+			I.wait_for_capture()
+			I.fetch_trace(1);I.fetch_trace(2)
+	out = np.empty((count,2,samples))
+	def batch():
+		I.capture_batch(count,2,samples,2,out=out)
+	loop();batch()	#let the chunk size and the wait predictions settle
+	report('%d captures of 2 x %d samples'%(count,samples),best_of(loop,3,1),best_of(batch,3,1))
+
+def bench_la_rearm(bandwidth=1e6,latency=1e-3):
+	"""
+	Blind time between two four channel LA captures: fetch_LA_channels followed by start_four_channel_LA,
+	against Interface.fetch_LA_rearm which sends the fetches and the restart in one write
+	"""
+	from Labtools import simulator
+	I = simulator.connect(realtime=False,bandwidth=bandwidth,latency=latency)
+	I.start_four_channel_LA(trigger=0)
+	def loop():
+		I.fetch_LA_channels()
+		I.start_four_channel_LA(trigger=0)
+	def chained():
+		I.fetch_LA_rearm(I.get_LA_progress())
+	report('re-arm the LA after a full buffer',best_of(loop,3,3),best_of(chained,3,3))
+
+def bench_equivalent_time(count=20,samples=1000,frequency=1.2345e6,bandwidth=1e6,latency=1e-3):
+	"""
+	Equivalent-time capture of a MHz signal from capture1 calls in a loop, interleaved one capture at a time,
+	against Interface.capture_equivalent_time which pipelines the captures and interleaves them together
+	"""
+	from Labtools import simulator
+	from Labtools.equivalent_time import fundamental
+	I = simulator.connect(bandwidth=bandwidth,latency=latency,analog_inputs={'CH1':simulator.sine(2.,frequency)})
+	bins = 256
+	def loop():
+		sums,counts,first = np.zeros(bins),np.zeros(bins),None
+		for a in range(count):
+			x,y = I.capture1('CH1',samples,1)
+			t = x*1e-6
+			phase = np.angle(fundamental(t,y,frequency))
+			if first is None:first = phase
+			index = np.rint((t*frequency+(phase-first)/(2*np.pi))%1*bins).astype(int)%bins
+			for i,v in zip(index,y):
+				sums[i]+=v;counts[i]+=1
+		return sums/np.maximum(counts,1)
+	def together():
+		I.capture_equivalent_time('CH1',frequency,count,samples=samples,bins=bins)
+	loop();together()
+	report('%d equivalent-time captures'%count,best_of(loop,3,1),best_of(together,3,1))
+
+def bench_recorder(samples=4096,blocks=200):
+	"""
+	Time taken to store a block of 8-bit stream samples on disk, by writing and syncing a file for each block,
+	against appending to a Recorder which flushes on its own thread
+	"""
+	import tempfile,os
+	from Labtools import recorder
+	codes = np.random.randint(0,256,samples).astype(np.uint8)
+	filename = tempfile.mktemp('.lts')
+	f = open(filename,'wb')
+	def synced():
+		f.write(codes.tostring())
+		f.flush()
+		os.fsync(f.fileno())
+	old = best_of(synced,3,blocks/3)
+	f.close()
+	R = recorder.Recorder(filename,samples*blocks*2,[{'name':'CH1','gain':0,'resolution':8}],[np.arange(256)/77.],dtype='u1')
+	new = best_of(lambda:R.append(codes),3,blocks/3)
+	R.close()
+	os.remove(filename)
+	report('store %d samples'%samples,old,new)
+
+if __name__ == "__main__":
+	print '%-40s %13s %13s'%('','previous','current')
+	bench_startup()
+	bench_sample_decode()
+	bench_la_decode()
+	bench_la_rollover()
+	bench_la_axes()
+	bench_la_rearm()
+	bench_uart_decode()
+	bench_simulated_link()
+	bench_voltmeter_scan()
+	bench_device_pool()
+	bench_capture_wait()
+	bench_progressive_fetch()
+	bench_fetch_traces()
+	bench_calibration()
+	bench_trace_history()
+	bench_streaming()
+	bench_capture_batch()
+	bench_equivalent_time()
+	bench_recorder()
@@ -0,0 +1,400 @@
+#!/usr/bin/python
+import unittest,time
+import numpy as np
+from Labtools import simulator
+
+class TestSimulator(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.I = simulator.connect(realtime=False)
+
+	def test_version(self):
+		self.assertEqual(self.I.H.version_string[:3],'LTS')
+
+	def test_voltmeter(self):
+		self.assertAlmostEqual(self.I.get_average_voltage('CH5'),1.0,2)
+
+	def test_capture(self):
+		x,y = self.I.capture1('CH1',1000,2)
+		self.assertEqual(len(y),1000)
+		self.assertAlmostEqual(y.max(),2.0,1)
+
+	def test_fetch_traces(self):
+		self.I.capture_traces(4,1000,2)
+		self.I.wait_for_capture()
+		x,y = self.I.fetch_traces()
+		self.assertEqual(y.shape,(4,1000))
+		for a in range(4):self.assertTrue(np.array_equal(y[a],self.I.fetch_trace(a+1)[1]))
+		self.assertTrue(np.array_equal(self.I.fetch_traces([3,1])[1],y[[2,0]]))
+
+	def test_calibration_tables(self):
+		from Labtools.achan import analog_channel,calfacs,TWELVE_BIT
+		A = analog_channel(0)
+		A.set_params(channel='CH2',gain=2,resolution=TWELVE_BIT)
+		codes = np.arange(0,4096,7,dtype=np.uint16)
+		self.assertTrue(np.array_equal(A.fix_value(codes),calfacs['CH2'][2](codes/4.)))
+		A.calibration_ref196 = 1.01
+		self.assertTrue(np.array_equal(A.fix_value(codes),1.01*calfacs['CH2'][2](codes/4.)))
+		original = calfacs['CH2']
+		calfacs['CH2'] = [np.poly1d([1.,0])]*8
+		self.assertEqual(A.fix_value(codes)[-1],1.01*codes[-1]/4.)
+		calfacs['CH2'][2] = np.poly1d([2.,0])	#edited in place
+		self.assertEqual(A.fix_value(codes)[-1],2.02*codes[-1]/4.)
+		calfacs['CH2'] = original
+		from Labtools.achan import luts
+		for a in range(100):
+			A.calibration_ref196 = 1+a*1e-4
+			A.fix_value(codes)
+		self.assertTrue(len(luts)<=luts.limit)
+		self.assertEqual(type(self.I.get_average_voltage('CH5')),float)
+
+	def test_trace_history(self):
+		H = self.I.achans[0].enable_history(4)
+		traces = [self.I.capture1('CH1',1000,2)[1].copy() for a in range(6)]
+		self.I.achans[0].disable_history()
+		self.assertEqual(H.count,4)
+		self.assertTrue(np.allclose(H.average(),np.mean(traces[-4:],axis=0)))
+		self.assertTrue(np.array_equal(H.envelope()[1],np.max(traces[-4:],axis=0)))
+		self.assertTrue(np.array_equal(H.persistence()[0],np.min(traces,axis=0)))
+		self.assertTrue(np.array_equal(H.traces()[1],traces[-4:]))
+
+	def test_decimation(self):
+		from Labtools.decimation import minmax,Decimator
+		x = np.arange(10003.)
+		y = np.sin(x/300.)
+		y[5001],y[7777] = 9,-9	#single sample glitches
+		dx,dy = minmax(x,y,800)
+		self.assertTrue(len(dx)<=1600)
+		self.assertEqual((dy.max(),dy.min()),(9,-9))
+		self.assertTrue(np.all(np.diff(dx)>=0))
+		dx,dy = minmax(x,y,800,(4000,4500))
+		self.assertEqual((len(dx),dx[0],dx[-1]),(503,3999,4501))
+		class curve(object):
+			calls = 0
+			def setData(self,x,y):self.calls+=1
+		D = Decimator(curve())
+		D.setData(x,y)
+		D.set_view((0,1000),500);D.set_view((0,1000),500)
+		self.assertEqual(D.curve.calls,2)
+
+	def test_long_capture(self):
+		x,y = self.I.capture1('CH1',10000,1)
+		self.assertEqual(len(x),10000)
+		self.assertEqual(x[-1],9999)
+
+	def test_capture_batch(self):
+		chunks = self.I.H.chunks.chunks
+		x,y,info = self.I.capture_batch(5,2,500,2)
+		self.assertEqual(self.I.H.chunks.chunks-chunks,10)	#reported to the chunk tuner
+		self.assertEqual(y.shape,(5,2,500))
+		self.assertTrue(np.all(info['completed']>=info['started']))
+		self.assertTrue(np.all(np.diff(info['started'])>0))
+		for a in range(2):self.assertTrue(np.array_equal(y[-1,a],self.I.fetch_trace(a+1)[1]))
+		self.assertAlmostEqual(y[:,0].max(),2.0,1)
+		H,writes = self.I.H,[]
+		write = H.fd.write
+		H.fd.write = lambda d:(writes.append(len(d)),write(d))[1]
+		try:
+			self.I.capture_batch(2,2,5000,1)	#replies far larger than the pipeline window
+		finally:
+			del H.fd.write
+		self.assertTrue(max(writes)>=3*7 and max(writes)%7==0)	#the chunk requests for both channels, and the next capture, in one write
+
+	def test_equivalent_time(self):
+		from Labtools.equivalent_time import fundamental
+		f = 1.2345e6
+		I = simulator.connect(realtime=False,analog_inputs={'CH1':simulator.sine(2.,f)})
+		x,y = I.capture_equivalent_time('CH1',f*1.0002,count=10,bins=200)
+		self.assertEqual(len(x),200)
+		self.assertAlmostEqual(x[-1],199/200./f*1e6,5)	#with the refined frequency
+		a = fundamental(x*1e-6,y,f)*2/len(y)
+		self.assertAlmostEqual(np.abs(a),2.0,1)
+		self.assertTrue(np.std(y-y.mean()-np.abs(a)*np.cos(2*np.pi*f*x*1e-6+np.angle(a)))<0.02)
+
+	def test_voltmeter_scan(self):
+		channels = ['CH5','CH9','9V','CH6']
+		self.assertEqual(self.I.get_average_voltages(channels),[self.I.get_average_voltage(a) for a in channels])
+
+	def test_pack_command(self):
+		import struct
+		pack = self.I.H.__packCommand__
+		self.assertEqual(pack(1,2,'BHH',3,70000,-1),struct.pack('<BBBHH',1,2,3,70000&0xFFFF,0xFFFF))	#as __sendInt__ would send them
+		self.assertEqual(pack(1,2,'2HB',70000,4,5),struct.pack('<BB2HB',1,2,70000&0xFFFF,4,5))
+		self.assertEqual(pack(1,2,'16sH','name',-2),struct.pack('<BB16sH',1,2,'name',0xFFFE))
+		self.assertRaises(struct.error,pack,1,2,'BH',300,1)	#bytes are not truncated
+
+	def test_pipeline(self):
+		from Labtools.commands_proto import COMMON,RETRIEVE_BUFFER,DIN,GET_STATES
+		with self.I.H.pipeline() as P:
+			states = P.command(DIN,GET_STATES,reply='B')
+			data = P.command(COMMON,RETRIEVE_BUFFER,'HH',0,2500,reply='2500H')
+		self.assertEqual(states.ack,1)
+		self.assertEqual(len(data.value),2500)
+		H,writes = self.I.H,[]
+		write = H.fd.write
+		H.fd.write = lambda d:(writes.append(len(d)),write(d))[1]
+		try:
+			for limit,expected in [(4096,[6,6,6,2]),(None,[20])]:	#3 replies of 5001 bytes, and one of 2
+				del writes[:]
+				with H.pipeline(limit) as P:
+					data = [P.command(COMMON,RETRIEVE_BUFFER,'HH',a,2500,reply='2500H') for a in (0,2500,5000)]
+					states = P.command(DIN,GET_STATES,reply='B')
+				self.assertEqual(writes,expected)
+				self.assertTrue(all([len(a.value)==2500 for a in data]))
+				self.assertEqual(states.ack,1)
+		finally:
+			del H.fd.write
+
+	def test_async(self):
+		from Labtools import async_interface
+		A = async_interface.AsyncInterface(self.I)
+		trace = A.capture1('CH1',1000,2)
+		volts = A.get_average_voltage('CH5')
+		self.assertEqual(len(trace.result(5)[1]),1000)
+		self.assertAlmostEqual(volts.result(5),1.0,2)
+		A.close()
+
+	def test_frequency(self):
+		self.assertAlmostEqual(self.I.get_freq('ID1'),1e3,3)
+
+	def test_logic_analyzer(self):
+		self.I.start_one_channel_LA(channel='ID1',channel_mode=1)
+		self.I.fetch_LA_channels()
+		self.assertTrue(np.allclose(np.diff(self.I.dchans[0].timestamps[:10]),32000))
+
+	def test_timestamp_rollover(self):
+		from Labtools.digital_channel import unwrap_timestamps
+		raw = np.array([0,0,100,60000,0,5,0,3,65000,10,0,0],dtype=np.uint16)
+		self.assertEqual(list(unwrap_timestamps(raw)),[100,60000,0,5,0,3,65000,65545])
+		self.assertEqual(list(unwrap_timestamps(np.array([100,50,0,20],dtype=np.uint16))),[100,65585,131070,131090])	#a zero counts as a rollover after the first one
+		self.assertEqual(len(unwrap_timestamps(np.zeros(5,dtype=np.uint16))),0)
+
+	def test_la_axes(self):
+		from Labtools.digital_channel import digital_channel
+		from Labtools.commands_proto import EVERY_EDGE,EVERY_FALLING_EDGE
+		D = digital_channel(0)
+		D.load_data([1,0,0,0],64*np.arange(1.,8001))	#more edges than the former fixed size arrays could hold
+		D.generate_axes()
+		x,y = D.get_xaxis(),D.get_yaxis()
+		self.assertEqual(len(x),16001)
+		self.assertEqual(list(x[:5]),[0,1,1,2,2])
+		self.assertEqual(list(y[:5]),[12,12,9.5,9.5,12])
+		D.mode = EVERY_FALLING_EDGE
+		D.generate_axes()
+		self.assertEqual(list(D.get_yaxis()[:4]),[12,12,9.5,12])
+		D.generate_axes(connect=True)
+		self.assertEqual(len(D.get_xaxis()),16002)
+		self.assertEqual(list(D.get_xaxis()[:4]),[0,8000,1,1])
+		self.assertEqual(list(D.connect[:4]),[1,0,1,0])
+
+	def test_decoders(self):
+		from Labtools import decoders
+		T = 1e6/9600
+		levels = [1,1]
+		for b in [0x48,0x69]:levels+=[0]+[(b>>k)&1 for k in range(8)]+[1]
+		levels[-1] = 0	#missing stop bit
+		frames = decoders.uart(decoders.from_samples(np.arange(len(levels))*T,levels),9600)
+		self.assertEqual(list(frames['value']),[0x48,0x69])
+		self.assertEqual(list(frames['error']),[0,decoders.FRAMING])
+		self.assertAlmostEqual(frames['start'][1],12*T)
+		scl,sda = [1,1],[1,0]	#START
+		for b in [0xC0,0x10]:
+			for k in range(9):	#8 bits, and the acknowledge
+				bit = (b>>(7-k))&1 if k<8 else 0
+				scl+=[0,0,1,1];sda+=[sda[-1],bit,bit,bit]
+		scl+=[0,0,1,1];sda+=[sda[-1],0,0,1]	#STOP
+		t = np.arange(len(scl))*2.5
+		frames = decoders.i2c(decoders.from_samples(t,scl),decoders.from_samples(t,sda))
+		self.assertEqual(list(frames['value']),[0xC0,0x10])
+		self.assertEqual(list(frames['address']),[True,False])
+		self.assertTrue(frames['ack'].all())
+		clk,mosi = [0,0],[0,0]
+		for k in range(12):	#one word, and 4 bits of the next
+			clk+=[0,1];mosi+=[(0xA53>>(11-k))&1]*2
+		t = np.arange(len(clk))*0.5
+		frames = decoders.spi(decoders.from_samples(t,clk),decoders.from_samples(t,mosi))
+		self.assertEqual(list(frames['mosi']),[0xA5,0x30])
+		self.assertEqual(list(frames['error']),[0,decoders.INCOMPLETE])
+		self.assertEqual(len(decoders.i2c((0,[1.]),(1,[0.5]))),0)	#SCL does not fall again before the end
+		times = [0.,480.,500.,620.]	#reset, and presence pulse
+		for b in [0xA5,0x3C]:
+			for k in range(8):	#70uS slots, LSB first
+				start = times[-1]+80.
+				times+=[start,start+(6. if (b>>k)&1 else 60.)]
+		frames = decoders.onewire((1,times))
+		self.assertEqual(list(frames['reset']),[True,False,False])
+		self.assertEqual(list(frames['value']),[1,0xA5,0x3C])
+		self.assertEqual(list(frames['error']),[0,0,0])
+
+	def test_i2c(self):
+		self.assertEqual(self.I.I2C.scan(),[0x60])
+
+	def test_device_pool(self):
+		from Labtools import interface,device_pool
+		P = device_pool.DevicePool([simulator.SimulatedDevice(realtime=False,version='LTS-SIM-%d'%a) for a in range(3)])
+		self.assertEqual([a[1] for a in P.keys()],['LTS-SIM-0','LTS-SIM-1','LTS-SIM-2'])
+		self.assertTrue(interface.Interface() is self.I)
+		volts = P.get_average_voltage('CH5')
+		self.assertEqual(volts.keys(),P.keys())
+		for a in volts.values():self.assertAlmostEqual(a,1.0,2)
+		P.close()
+
+	def test_threads(self):
+		import threading
+		errors = []
+		def poll():
+			for a in range(200):
+				if abs(self.I.get_average_voltage('CH9')-3.0)>0.01:errors.append(a)
+		t = threading.Thread(target=poll)
+		t.start()
+		for a in range(20):
+			x,y = self.I.capture1('CH1',500,2)
+			if len(y)!=500 or abs(y.max()-2.0)>0.1:errors.append(a)
+		t.join()
+		self.assertEqual(errors,[])
+
+	def test_priority_lock(self):
+		from Labtools.packet_handler import PriorityLock
+		import threading
+		lock,order = PriorityLock(),[]
+		lock.acquire()
+		def waiter(priority):
+			lock.acquire(priority)
+			order.append(priority)
+			lock.release()
+		threads = [threading.Thread(target=waiter,args=(a,)) for a in [0,-1,2]]
+		for a in threads:
+			a.start()
+			time.sleep(0.05)
+		lock.release()
+		for a in threads:a.join()
+		self.assertEqual(order,[2,0,-1])
+
+	def test_wire_stats(self):
+		from Labtools import wire_stats
+		fd = self.I.H.fd
+		stats = self.I.H.enable_stats()
+		self.I.capture1('CH1',1000,2)
+		self.I.get_average_voltages(['CH5','CH9'])
+		self.assertTrue(self.I.H.disable_stats() is stats)
+		self.assertTrue(self.I.H.fd is fd)
+		snapshot = stats.snapshot()
+		self.assertEqual(snapshot['ADC:GET_CAPTURE_CHANNEL']['bytes_read'],2001)
+		self.assertEqual(snapshot['ADC:GET_VOLTAGE_SUMMED']['count'],2)
+		self.assertEqual(sum([a['ack_failures']+a['timeouts'] for a in snapshot.values() if isinstance(a,dict)]),0)
+		from Labtools import commands_proto as C
+		names = wire_stats.command_names()
+		self.assertEqual(names[(C.TIMING,C.START_THREE_CHAN_LA)],'TIMING:START_THREE_CHAN_LA')
+		self.assertFalse((C.DIN,C.ID1) in names)	#input numbers, not commands
+
+	def test_progressive_fetch(self):
+		I = simulator.connect()
+		I.capture_traces(2,400,100,'CH1')
+		fetched = list(I.progressive_fetch(0.005))
+		self.assertTrue(len(fetched)>2)
+		self.assertEqual(fetched[-1],400)
+		partial = I.achans[1].get_yaxis().copy()
+		self.assertTrue(np.array_equal(partial,I.fetch_trace(2)[1]))
+		I = simulator.connect(realtime=False)
+		I.capture_traces(2,5000,1,'CH1')
+		I.wait_for_capture()
+		I.samples_acquired = 5000	#as reported by an earlier call
+		writes = []
+		write = I.H.fd.write
+		I.H.fd.write = lambda d:(writes.append(len(d)),write(d))[1]
+		self.assertEqual(I.fetch_partial_traces(),(True,5000))
+		self.assertEqual(len(writes),1)		#a single exchange, with the status request behind the fetches
+		self.assertTrue(np.array_equal(I.achans[0].get_yaxis(),I.fetch_trace(1)[1]))
+
+	def test_chunk_retry(self):
+		I = simulator.connect(realtime=False,timeout=0.05,max_transfer=3000)
+		I.capture_traces(1,3000,1,'CH1')
+		I.wait_for_capture()
+		y = I.fetch_buffer(0,10000).copy()
+		self.assertTrue(I.H.chunks.failures>0)
+		self.assertTrue(I.H.chunks.size<=1500)
+		self.assertTrue(np.array_equal(y,I.fetch_buffer(0,10000)))
+		self.assertTrue(np.array_equal(y,I.H.fd.buffer[:10000]))
+
+	def test_stream_reader(self):
+		R = self.I.stream_reader(5,'CH5')
+		blocks = [R.read(1000,timeout=2) for a in range(5)]
+		R.stop()
+		self.assertEqual([len(a) for a in blocks],[1000]*5)
+		self.assertAlmostEqual(np.mean(blocks),1.0,1)
+		self.assertEqual(R.overruns,[])
+		self.assertFalse(self.I.streaming)
+		self.assertAlmostEqual(self.I.get_average_voltage('CH5'),1.0,2)
+		R = self.I.stream_reader(5,'CH5',ring_size=4096)
+		time.sleep(0.2)	#nothing is read, so the ring overflows
+		R.stop()
+		self.assertNotEqual(R.overruns,[])
+		self.assertEqual(R.stream_index(0),0)
+		self.assertEqual(R.stream_index(R.written),R.received)
+		R.overruns = [(100,50),(300,20)]
+		self.assertEqual([R.stream_index(a) for a in [99,100,249,250]],[99,150,299,320])
+
+	def test_recorder(self):
+		import tempfile,os
+		from Labtools import recorder
+		filename = tempfile.mktemp('.lts')
+		try:
+			F = recorder.record_captures(self.I,filename,2,1000,2,count=3)
+			self.assertTrue(F.wait(20))
+			x,y = self.I.fetch_traces()
+			rec = recorder.Recording(filename)
+			self.assertEqual((len(rec),rec.blocks),(3000,3))
+			self.assertEqual(rec.channels,['CH1','CH2'])
+			self.assertTrue(np.array_equal(rec.volts(2000,3000,'CH2'),y[1]))
+			self.assertTrue(np.array_equal(rec.block(2)[1],y[0]))
+			self.assertTrue(np.all(np.diff(rec.times())>=0))
+		finally:
+			os.remove(filename)
+
+	def test_chained_LA(self):
+		import tempfile,shutil
+		from Labtools import recorder
+		path = tempfile.mkdtemp()
+		try:
+			F = recorder.record_LA(self.I,path,count=3)
+			self.assertTrue(F.wait(20))
+			rec = recorder.EdgeRecording(path)
+			self.assertEqual(len(rec),3)
+			self.assertEqual(rec.channels,['ID1','ID2','ID3','ID4'])
+			self.assertTrue(np.all(rec.segments['start'][1:]>=rec.segments['end'][:-1]))
+			for c in rec.channels:
+				self.assertEqual(len(rec.ticks(c)),rec.segments['count'][:,rec.channels.index(c)].sum())
+				self.assertTrue(np.all(np.diff(rec.ticks(c))>0))
+			self.assertTrue(np.all(np.abs(np.diff(rec.ticks('ID1',1))-32000)<=1))	#1KHz, 64MHz clock
+			self.assertEqual(len(rec.gaps('ID4')),2)	#fills up first, before each fetch
+			initial,times = rec.line('ID1',2)
+			self.assertTrue(np.allclose(times,rec.ticks('ID1',2)/64.))
+			H,writes = self.I.H,[]
+			self.I.start_four_channel_LA(trigger=0)
+			write = H.fd.write
+			H.fd.write = lambda d:(writes.append(len(d)),write(d))[1]
+			try:
+				self.I.fetch_LA_rearm(self.I.get_LA_progress())	#2500 edges per channel
+			finally:
+				del H.fd.write
+			self.assertEqual(writes,[2,4*5+6+8])	#the progress, then the fetches, clear and restart together
+			F = recorder.record_LA(self.I,path,segment=0.01)
+			F.stop()	#the capture in progress is fetched
+			self.assertTrue(len(recorder.EdgeRecording(path))>=1)
+			I = simulator.connect(digital_inputs={'ID3':(0.,0.5),'ID4':(100.,0.5)})	#ID3 idle. Neither fills up
+			F = recorder.record_LA(I,path,segment=0.2)
+			time.sleep(0.5)
+			F.stop()
+			rec = recorder.EdgeRecording(path)
+			self.assertTrue(2<=len(rec)<=4)		#one per segment time, not one per poll
+			self.assertEqual(rec.segments['count'][:,2].sum(),0)
+			self.assertTrue(np.all(rec.segments['count'][:,0]<rec.header['length']))
+		finally:
+			shutil.rmtree(path)
+
+	def test_unknown_commands(self):
+		self.assertEqual(self.I.H.fd.unknown_commands,[])
+
+if __name__ == '__main__':
+	unittest.main()
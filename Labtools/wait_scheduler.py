@@ -0,0 +1,104 @@
+'''
+Predicts when a capture running on the device will be complete, so that the host can sleep through it
+instead of repeatedly asking the device with oscilloscope_progress.
+
+The expected duration of a capture is samples x timegap. Channels are converted within each timegap, which
+is why capture_traces enforces a larger minimum timegap for more channels. The time taken in addition
+to this (USB latency, waiting for the trigger, etc.) is learnt from previous captures, separately for
+triggered and free running captures.
+
+>>> W = WaitScheduler()
+>>> W.start(samples*timegap*1e-6,triggered=True)	#as soon as the capture has been started
+>>> W.wait(lambda:I.oscilloscope_progress()[0])
+
+Event driven code such as a GUI can do the same without blocking
+
+>>> timer.singleShot(W.remaining()*1e3,update)
+>>> def update():
+...		delay = W.check(I.oscilloscope_progress()[0])
+...		if delay is not None: timer.singleShot(delay*1e3,update) #not done yet
+'''
+import time
+
+class WaitScheduler(object):
+	"""
+	==============	============================================================================================
+	**Arguments**
+	==============	============================================================================================
+	min_poll		interval before the first re-poll, if the capture was not done when predicted. default 0.2 mS
+	max_poll		upper limit of the exponentially increasing interval between subsequent polls. default 10 mS
+	alpha			weight given to the latest capture when updating the learnt overhead. default 0.25
+	==============	============================================================================================
+	"""
+	def __init__(self,min_poll=2e-4,max_poll=1e-2,alpha=0.25):
+		self.min_poll = min_poll
+		self.max_poll = max_poll
+		self.alpha = alpha
+		self.overhead = {False:1e-3,True:1e-3}	#learnt delay beyond the nominal duration, for free running and triggered captures
+		self.started = None
+		self.duration = 0
+		self.triggered = False
+		self.polls = 0			#polls made for the current capture
+		self.last_miss = None	#time of the last poll which found the capture incomplete
+		self.interval = min_poll
+
+	def start(self,duration,triggered=False):
+		"""
+		call as soon as a capture has been started. duration is its nominal length in seconds
+		"""
+		self.started = time.time()
+		self.duration = duration
+		self.triggered = triggered
+		self.polls = 0
+		self.last_miss = None
+		self.interval = self.min_poll
+
+	def predicted_end(self):
+		return self.started+self.duration+self.overhead[self.triggered]
+
+	def remaining(self):
+		"""
+		seconds until the capture is expected to be complete. 0 if no capture has been started
+		"""
+		if self.started is None:return 0
+		return max(0,self.predicted_end()-time.time())
+
+	def check(self,done):
+		"""
+		report the result of a poll. Returns None if done, or else the delay (S) after which to poll again
+		"""
+		now = time.time()
+		self.polls+=1
+		if not done:
+			self.last_miss = now
+			delay,self.interval = self.interval,min(self.interval*2,self.max_poll)
+			return delay
+		if self.started is not None:self.learn(now)
+		return None
+
+	def learn(self,now):
+		"""
+		update the expected overhead using the interval within which the capture completed
+		"""
+		nominal_end = self.started+self.duration
+		if self.last_miss is None:	#done at the first poll. Completed some time before now, so aim a little earlier next time
+			observed = min(now-nominal_end,self.overhead[self.triggered])*0.8
+		else:
+			observed = (self.last_miss+now)/2.-nominal_end
+		self.overhead[self.triggered] = max(0,(1-self.alpha)*self.overhead[self.triggered]+self.alpha*observed)
+		self.started = None
+
+	def wait(self,poll,timeout=None):
+		"""
+		sleeps until the predicted end of the capture, and then calls poll() until it returns True,
+		backing off exponentially between calls.
+		returns False if the capture is not done after timeout seconds(measured from start), True otherwise
+		"""
+		if self.started is None:self.start(0)
+		started = self.started
+		time.sleep(self.remaining())
+		while True:
+			delay = self.check(poll())
+			if delay is None:return True
+			if timeout is not None and time.time()+delay>started+timeout:return False
+			time.sleep(delay)
@@ -0,0 +1,174 @@
+'''
+Wire level statistics for packet_handler.Handler
+
+Instrumentation is off by default, and costs nothing until it is enabled
+
+>>> stats = I.H.enable_stats()
+>>> x,y = I.capture1('CH1',1000,2)
+>>> stats.report()			#prints a table, sorted by total time spent waiting on each command
+>>> snapshot = stats.snapshot()	#dictionary of 'HEADER:COMMAND' -> counters
+>>> stats.save('wire.json')
+>>> I.H.disable_stats()
+
+For each (header, command) pair the number of calls, bytes written and read, round trip times
+(from transmission of the command until its acknowledge arrives) , acknowledge failures, and
+reads that timed out before the expected number of bytes arrived are recorded.
+Round trip times are also binned into a histogram with logarithmically spaced edges.
+'''
+import time,bisect,json
+import numpy as np
+import commands_proto
+
+LATENCY_EDGES = list(10**np.arange(-5,1.01,0.25))	#10uS to 10S
+
+def command_names():
+	"""
+	returns a dictionary of (header,command) -> 'HEADER:COMMAND' built from commands_proto.COMMAND_GROUPS
+	"""
+	names = {}
+	for header,commands in commands_proto.COMMAND_GROUPS:
+		for name in commands:
+			names[(getattr(commands_proto,header),getattr(commands_proto,name))] = header+':'+name
+	return names
+
+class Record(object):
+	def __init__(self):
+		self.count = 0
+		self.bytes_written = 0
+		self.bytes_read = 0
+		self.ack_failures = 0
+		self.timeouts = 0
+		self.round_trips = 0
+		self.total_time = 0.
+		self.max_time = 0.
+		self.histogram = [0]*(len(LATENCY_EDGES)+1)
+
+	def add_time(self,dt):
+		self.round_trips+=1
+		self.total_time+=dt
+		if dt>self.max_time:self.max_time = dt
+		self.histogram[bisect.bisect(LATENCY_EDGES,dt)]+=1
+
+	def as_dict(self):
+		return {'count':self.count,'bytes_written':self.bytes_written,'bytes_read':self.bytes_read,
+			'ack_failures':self.ack_failures,'timeouts':self.timeouts,'round_trips':self.round_trips,
+			'total_time':self.total_time,'mean_time':self.total_time/self.round_trips if self.round_trips else 0.,
+			'max_time':self.max_time,'histogram':list(self.histogram)}
+
+class WireStats(object):
+	"""
+	Counters for each (header, command) pair. Created by :func:`packet_handler.Handler.enable_stats`
+	"""
+	def __init__(self):
+		self.records = {}
+		self.current = None
+		self.started = 0
+		self.names = command_names()
+		self.since = time.time()
+
+	def record(self,key):
+		if key not in self.records:self.records[key] = Record()
+		return self.records[key]
+
+	def begin(self,header,command):
+		"""
+		a command is about to be transmitted. Bytes passing through the port are attributed to it from now on
+		"""
+		self.current = self.record((header,command))
+		self.current.count+=1
+		self.started = time.time()
+
+	def written(self,n):
+		if self.current is not None:self.current.bytes_written+=n
+
+	def read(self,n,requested):
+		if self.current is None:return
+		self.current.bytes_read+=n
+		if n<requested:self.current.timeouts+=1
+
+	def ack(self,x):
+		"""
+		called with the acknowledge string read from the port. Completes the round trip of the current command
+		"""
+		if self.current is None:return
+		self.current.add_time(time.time()-self.started)
+		if not len(x) or (ord(x)&0x0F)!=1:self.current.ack_failures+=1
+
+	def batch(self,commands,received,dt):
+		"""
+		accounts for the commands sent by a Pipeline flush. commands is a list of (header,command,bytes written,Reply),
+		and the round trip time of the flush is shared equally between them
+		"""
+		position = 0
+		for header,command,n,reply in commands:
+			r = self.record((header,command))
+			r.count+=1
+			r.bytes_written+=n
+			r.bytes_read+=max(0,min(reply.size,received-position))
+			if position+reply.size>received:r.timeouts+=1
+			elif reply.ack is not None and (reply.ack&0x0F)!=1:r.ack_failures+=1
+			position+=reply.size
+			r.add_time(dt/len(commands))
+		self.current = None
+
+	def name(self,key):
+		return self.names.get(key,'%d:%d'%key)
+
+	def snapshot(self):
+		"""
+		returns a dictionary of 'HEADER:COMMAND' -> dictionary of counters, with histogram edges under 'latency_edges'
+		"""
+		data = dict([(self.name(a),b.as_dict()) for a,b in self.records.items()])
+		data['latency_edges'] = LATENCY_EDGES
+		data['duration'] = time.time()-self.since
+		return data
+
+	def save(self,filename):
+		"""
+		writes the snapshot to filename as JSON
+		"""
+		json.dump(self.snapshot(),open(filename,'w'),indent=1,sort_keys=True)
+
+	def reset(self):
+		self.records = {}
+		self.current = None
+		self.since = time.time()
+
+	def report(self):
+		"""
+		prints the counters, starting with the commands that took up the most time
+		"""
+		print '%-36s %8s %10s %10s %10s %10s %6s %6s'%('command','calls','written','read','total mS','mean mS','nack','t/o')
+		for key,r in sorted(self.records.items(),key=lambda a:-a[1].total_time):
+			print '%-36s %8d %10d %10d %10.3f %10.3f %6d %6d'%(self.name(key),r.count,r.bytes_written,r.bytes_read,
+				r.total_time*1e3,r.total_time*1e3/r.round_trips if r.round_trips else 0,r.ack_failures,r.timeouts)
+
+class MeteredPort(object):
+	"""
+	Wraps a serial port, and counts the bytes passing through it
+	"""
+	def __init__(self,fd,stats):
+		self.fd = fd
+		self.stats = stats
+
+	def write(self,data):
+		self.stats.written(len(data))
+		return self.fd.write(data)
+
+	def read(self,size=1):
+		data = self.fd.read(size)
+		self.stats.read(len(data),size)
+		return data
+
+	def readinto(self,view):
+		n = self.fd.readinto(view)
+		self.stats.read(n,len(view))
+		return n
+
+	def readline(self,*args):
+		data = self.fd.readline(*args)
+		self.stats.read(len(data),0)
+		return data
+
+	def __getattr__(self,name):
+		return getattr(self.fd,name)